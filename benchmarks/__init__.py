@@ -0,0 +1 @@
+"""Benchmarks for the export, transfer and decode path, on synthetic data."""
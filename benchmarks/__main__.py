@@ -0,0 +1,145 @@
+"""Run the benchmarks and write the results as JSON.
+
+    python -m benchmarks --rows 100000 --output results.json
+    python -m benchmarks --rows 100000 --compare baseline.json
+
+Run from the repository root. See benchmarks/README.md for the stages and
+the result format.
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from .compare import compare
+from .stages import REQUIRES, SERVER_STAGES, STAGES, Context, PeakRSS, StubServer, environment, export_path, measure
+from .synthetic import make_address_book_db, make_export, make_messages_db
+
+RESULTS_VERSION = 1
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description="Benchmark the export, transfer and decode path on synthetic data.")
+    parser.add_argument("--rows", type=int, default=100_000, help="messages in the synthetic chat.db (default 100000)")
+    parser.add_argument("--handles", type=int, default=500, help="distinct message handles (default 500)")
+    parser.add_argument("--contacts", type=int, default=400, help="AddressBook contacts (default 400)")
+    parser.add_argument("--emails", type=int, default=None, help="email records to chunk (default rows / 10)")
+    parser.add_argument("--seed", type=int, default=0, help="seed for the synthetic data (default 0)")
+    parser.add_argument("--repeat", type=int, default=3, help="runs of each stage, the fastest is reported (default 3)")
+    parser.add_argument("--stages", default=",".join(STAGES), help=f"comma separated stages to run (default all: {','.join(STAGES)})")
+    parser.add_argument("--data-dir", default=None, help="keep the synthetic data here and reuse it on later runs with the same sizes")
+    parser.add_argument("--output", "-o", default=None, help="write the results JSON to this file instead of stdout")
+    parser.add_argument("--compare", default=None, help="results JSON from an earlier run to compare against")
+    parser.add_argument("--threshold", type=float, default=1.10, help="slowdown ratio counted as a regression by --compare (default 1.10)")
+    return parser.parse_args(argv)
+
+
+def selected_stages(names):
+    """The requested stages plus the stages they depend on, in run order."""
+    wanted = set()
+    for name in names:
+        if name not in STAGES:
+            raise SystemExit(f"Unknown stage {name!r}, choose from {', '.join(STAGES)}")
+        while name:
+            wanted.add(name)
+            name = REQUIRES.get(name)
+    return [name for name in STAGES if name in wanted]
+
+
+def prepare_data(data_dir, args):
+    """Generate the synthetic inputs, reusing files already made with the same parameters."""
+    emails = args.emails if args.emails is not None else max(1, args.rows // 10)
+    suffix = f"{args.rows}-{args.handles}-{args.contacts}-{emails}-{args.seed}"
+    paths = {
+        "messages_db": os.path.join(data_dir, f"chat-{suffix}.db"),
+        "address_book_db": os.path.join(data_dir, f"AddressBook-{suffix}.abcddb"),
+        "email_export": os.path.join(data_dir, f"gmail-{suffix}.json"),
+    }
+    timings = {}
+    makers = {
+        "messages_db": lambda path: make_messages_db(path, args.rows, handles=args.handles, seed=args.seed),
+        "address_book_db": lambda path: make_address_book_db(path, args.contacts, seed=args.seed),
+        "email_export": lambda path: make_export(path, "gmail-001", emails, seed=args.seed),
+    }
+    for key, path in paths.items():
+        if os.path.exists(path):
+            continue
+        start = time.perf_counter()
+        makers[key](path + ".part")
+        os.replace(path + ".part", path)
+        timings[key] = time.perf_counter() - start
+    return paths, timings, emails
+
+
+def main(argv=None):
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+    names = selected_stages([name.strip() for name in args.stages.split(",") if name.strip()])
+    rss = PeakRSS()
+
+    work_dir = tempfile.mkdtemp(prefix="surfer-bench-")
+    data_dir = args.data_dir or work_dir
+    os.makedirs(data_dir, exist_ok=True)
+    try:
+        print(f"Generating {args.rows} messages of synthetic data", file=sys.stderr)
+        paths, generate_seconds, emails = prepare_data(data_dir, args)
+
+        runs = {name: [] for name in names}
+        server = StubServer(export_path(work_dir)) if SERVER_STAGES & set(names) else None
+        try:
+            for attempt in range(args.repeat):
+                ctx = Context(work_dir, server=server, **paths)
+                try:
+                    for name in names:
+                        runs[name].append(measure(ctx, name, rss))
+                        print(f"[{attempt + 1}/{args.repeat}] {name}: {runs[name][-1]['seconds']:.3f}s", file=sys.stderr)
+                finally:
+                    ctx.close()
+        finally:
+            if server is not None:
+                server.close()
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    stages = {}
+    for name, results in runs.items():
+        best = min(results, key=lambda result: result["seconds"])
+        stages[name] = {**best, "runs": [result["seconds"] for result in results]}
+
+    results = {
+        "version": RESULTS_VERSION,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "environment": environment(),
+        "params": {
+            "rows": args.rows,
+            "handles": args.handles,
+            "contacts": args.contacts,
+            "emails": emails,
+            "seed": args.seed,
+            "repeat": args.repeat,
+        },
+        "peak_rss_scope": rss.scope,
+        "generate_seconds": generate_seconds,
+        "stages": stages,
+    }
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        report, regressions = compare(baseline, results, args.threshold)
+        print(report, file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""Compare two benchmark result files, for example from two commits.
+
+    python -m benchmarks.compare baseline.json results.json
+
+Exits with status 1 when a stage got slower than the threshold allows.
+"""
+import argparse
+import json
+import sys
+
+
+def compare(baseline: dict, current: dict, threshold: float = 1.10):
+    """A text report of per-stage changes, and the names of stages that regressed.
+
+    A stage regresses when its time grows by more than `threshold` times.
+    Results made with different parameters are compared anyway, with a
+    warning, since their timings aren't comparable.
+    """
+    lines = []
+    if baseline.get("params") != current.get("params"):
+        lines.append(f"warning: parameters differ, {baseline.get('params')} vs {current.get('params')}")
+
+    lines.append(f"{'stage':<18}{'baseline':>12}{'current':>12}{'ratio':>9}{'peak MiB':>11}")
+    regressions = []
+    for name, result in current.get("stages", {}).items():
+        before = baseline.get("stages", {}).get(name)
+        peak = result["peak_rss_bytes"] / (1024 * 1024)
+        if not before:
+            lines.append(f"{name:<18}{'-':>12}{result['seconds']:>11.3f}s{'new':>9}{peak:>11.1f}")
+            continue
+        ratio = result["seconds"] / before["seconds"] if before["seconds"] else float("inf")
+        flag = ""
+        if ratio > threshold:
+            regressions.append(name)
+            flag = "  slower"
+        lines.append(f"{name:<18}{before['seconds']:>11.3f}s{result['seconds']:>11.3f}s{ratio:>8.2f}x{peak:>11.1f}{flag}")
+    return "\n".join(lines), regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.compare", description="Compare two benchmark result files.")
+    parser.add_argument("baseline")
+    parser.add_argument("current")
+    parser.add_argument("--threshold", type=float, default=1.10, help="slowdown ratio counted as a regression (default 1.10)")
+    args = parser.parse_args(argv)
+
+    with open(args.baseline, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    with open(args.current, "r", encoding="utf-8") as f:
+        current = json.load(f)
+
+    report, regressions = compare(baseline, current, args.threshold)
+    print(report)
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,287 @@
+"""The benchmarked stages and how they are measured.
+
+Each stage runs the real code from the desktop exporters, the SDK and the
+cookbook against the synthetic data, and returns how many items it
+processed. Stages run in order and later ones use what earlier ones made:
+the export file written by `serialize` is what the HTTP stages serve.
+"""
+import json
+import os
+import platform
+import sqlite3
+import subprocess
+import sys
+import time
+import tracemalloc
+from typing import Optional
+
+try:
+    import resource
+except ImportError:
+    # Windows
+    resource = None
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# The exporter scripts and cookbook helpers aren't packages, import them by path
+for path in (
+    os.path.join(REPO_ROOT, "desktop", "assets"),
+    os.path.join(REPO_ROOT, "cookbook", "python", "streamlit-chatbot"),
+    os.path.join(REPO_ROOT, "sdk", "python"),
+):
+    if path not in sys.path:
+        sys.path.append(path)
+
+from helpers import chunk_object  # noqa: E402
+from imessage_contacts import build_index, create_handle_names  # noqa: E402
+from imessage_export import BATCH_SIZE, TIMESTAMP_FORMATS, messages_query, timestamp_sql, write_export  # noqa: E402
+from imessage_mac import CONTACTS_QUERY, iter_messages  # noqa: E402
+from surfer_protocol import SurferClient  # noqa: E402
+from surfer_protocol.encoding import decode  # noqa: E402
+
+
+class PeakRSS:
+    """Peak resident memory of this process, per stage where the OS allows it.
+
+    Linux can reset the high-water mark between stages. Elsewhere the peak
+    covers the whole process so far, which `scope` reports. Without the
+    `resource` module, on Windows, the peak of memory allocated by Python
+    during each stage is traced instead.
+    """
+
+    def __init__(self):
+        if self._reset():
+            self.scope = "stage"
+        elif resource is not None:
+            self.scope = "process"
+        else:
+            self.scope = "python"
+            tracemalloc.start()
+
+    def reset(self):
+        if self.scope == "stage":
+            self._reset()
+        elif self.scope == "python":
+            tracemalloc.reset_peak()
+
+    def read(self) -> int:
+        if self.scope == "stage":
+            with open("/proc/self/status") as f:
+                for line in f:
+                    if line.startswith("VmHWM:"):
+                        return int(line.split()[1]) * 1024
+        if self.scope == "python":
+            return tracemalloc.get_traced_memory()[1]
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Kilobytes on Linux, bytes on macOS
+        return peak if sys.platform == "darwin" else peak * 1024
+
+    @staticmethod
+    def _reset() -> bool:
+        try:
+            with open("/proc/self/clear_refs", "w") as f:
+                f.write("5")
+            return True
+        except OSError:
+            return False
+
+
+class StubServer:
+    """The stub desktop API (`benchmarks.stub_server`) in its own process.
+
+    It reads the export file on every request, so one server is started
+    before any stage is measured and shared by every repeat, keeping its
+    startup out of the timings.
+    """
+
+    def __init__(self, export_path: str):
+        self.process = subprocess.Popen(
+            [sys.executable, "-m", "benchmarks.stub_server", export_path],
+            cwd=REPO_ROOT, stdout=subprocess.PIPE, text=True,
+        )
+        self.port = int(self.process.stdout.readline())
+        self.base_url = f"http://127.0.0.1:{self.port}/api"
+
+    def close(self):
+        self.process.terminate()
+        self.process.wait()
+
+
+class Context:
+    """Files, connections and intermediate results shared by the stages."""
+
+    def __init__(self, work_dir: str, messages_db: str, address_book_db: str, email_export: str,
+                 server: Optional[StubServer] = None):
+        self.work_dir = work_dir
+        self.messages_db = messages_db
+        self.address_book_db = address_book_db
+        self.email_export = email_export
+        self.export_path = export_path(work_dir)
+        self.conn = sqlite3.connect(messages_db)
+        self.server = server
+        self.body = None
+        self.records = None
+
+    def close(self):
+        self.conn.close()
+
+
+def export_path(work_dir: str) -> str:
+    """Where `serialize` writes the export file the HTTP stages serve."""
+    return os.path.join(work_dir, "imessage-001.json")
+
+
+def max_rowid(conn) -> int:
+    return conn.execute("SELECT COALESCE(MAX(ROWID), 0) FROM message").fetchone()[0]
+
+
+def stage_contacts(ctx: Context) -> int:
+    """Read the AddressBook, index it and resolve every handle into the temp table."""
+    contacts = sqlite3.connect(ctx.address_book_db)
+    try:
+        index = build_index(contacts.execute(CONTACTS_QUERY))
+    finally:
+        contacts.close()
+    create_handle_names(ctx.conn, index)
+    return ctx.conn.execute("SELECT COUNT(*) FROM temp.handle_name").fetchone()[0]
+
+
+def _timestamps(ctx: Context, timestamp_format: str) -> int:
+    cursor = ctx.conn.execute(
+        f"SELECT {timestamp_sql('date', timestamp_format, localtime=True)} FROM message"
+    )
+    count = 0
+    while True:
+        rows = cursor.fetchmany(BATCH_SIZE)
+        if not rows:
+            return count
+        count += len(rows)
+
+
+def stage_query(ctx: Context) -> int:
+    """Run the export query and build every record, as the exporters do, without writing them."""
+    cursor = ctx.conn.execute(messages_query('iso', localtime=True), (0, max_rowid(ctx.conn)))
+    return sum(1 for _ in iter_messages(cursor))
+
+
+def stage_serialize(ctx: Context) -> dict:
+    """Write the export file, timing only the JSON encoding and writing.
+
+    Time spent inside the record generator, which is the query, is
+    measured separately and subtracted.
+    """
+    cursor = ctx.conn.execute(messages_query('iso', localtime=True), (0, max_rowid(ctx.conn)))
+    producing = [0.0]
+
+    def timed(records):
+        records = iter(records)
+        while True:
+            start = time.perf_counter()
+            try:
+                record = next(records)
+            except StopIteration:
+                producing[0] += time.perf_counter() - start
+                return
+            producing[0] += time.perf_counter() - start
+            yield record
+
+    header = {'company': 'Apple', 'name': 'iMessage', 'runID': 'imessage-001-1700000000000', 'timestamp': 1700000000000}
+    start = time.perf_counter()
+    count = write_export(ctx.export_path, header, timed(iter_messages(cursor)), progress_every=sys.maxsize)
+    total = time.perf_counter() - start
+    ctx.records = count
+    return {"items": count, "seconds": total - producing[0], "bytes": os.path.getsize(ctx.export_path)}
+
+
+def stage_transfer(ctx: Context) -> dict:
+    """Fetch the export over HTTP from the stub server, without decoding it."""
+    import requests
+
+    with requests.Session() as session:
+        response = session.post(f"{ctx.server.base_url}/get", json={"platformId": "imessage-001"})
+        response.raise_for_status()
+        ctx.body = (response.headers.get("Content-Type", ""), response.content)
+    return {"items": ctx.records, "bytes": len(ctx.body[1])}
+
+
+def stage_decode(ctx: Context) -> int:
+    """Decode the transferred body the way the SDK does."""
+    content_type, body = ctx.body
+    data = decode(content_type, body)
+    ctx.body = None
+    return len(data['data']['content'])
+
+
+def stage_client_get(ctx: Context) -> int:
+    """`SurferClient.get()` end to end against the stub server."""
+    client = SurferClient(host="127.0.0.1", port=ctx.server.port)
+    return len(client.get("imessage-001")['data']['content'])
+
+
+def stage_chunk(ctx: Context) -> int:
+    """Chunk long email bodies with the chatbot cookbook's `chunk_object`, after loading them."""
+    with open(ctx.email_export, "r", encoding="utf-8") as f:
+        records = json.load(f)['content']
+    start = time.perf_counter()
+    count = sum(len(chunk_object(record)) for record in records)
+    return {"items": count, "seconds": time.perf_counter() - start}
+
+
+STAGES = {
+    "contacts": stage_contacts,
+    **{
+        f"timestamps_{timestamp_format}": (lambda ctx, timestamp_format=timestamp_format: _timestamps(ctx, timestamp_format))
+        for timestamp_format in TIMESTAMP_FORMATS
+    },
+    "query": stage_query,
+    "serialize": stage_serialize,
+    "transfer": stage_transfer,
+    "decode": stage_decode,
+    "client_get": stage_client_get,
+    "chunk": stage_chunk,
+}
+
+# Stages that make requests to the stub server
+SERVER_STAGES = {"transfer", "client_get"}
+
+# Stages that need another stage to have run first
+REQUIRES = {
+    "query": "contacts",
+    "serialize": "contacts",
+    "transfer": "serialize",
+    "decode": "transfer",
+    "client_get": "serialize",
+}
+
+
+def measure(ctx: Context, name: str, rss: PeakRSS) -> dict:
+    """Run one stage and return its timing, throughput and peak memory."""
+    rss.reset()
+    start = time.perf_counter()
+    result = STAGES[name](ctx)
+    seconds = time.perf_counter() - start
+    if not isinstance(result, dict):
+        result = {"items": result}
+    result.setdefault("seconds", seconds)
+    result["items_per_second"] = result["items"] / result["seconds"] if result["seconds"] else None
+    if "bytes" in result:
+        result["bytes_per_second"] = result["bytes"] / result["seconds"] if result["seconds"] else None
+    result["peak_rss_bytes"] = rss.read()
+    return result
+
+
+def environment() -> dict:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=REPO_ROOT, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "git_commit": commit,
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+    }
@@ -0,0 +1,76 @@
+"""A stand-in for the desktop app's API that serves one export file.
+
+`/api/get` answers every platform with the export file wrapped the way the
+desktop app wraps it, streamed from disk, so transfer timings measure HTTP
+and not the server. Run it in its own process so it doesn't compete with
+the benchmark for the GIL:
+
+    python -m benchmarks.stub_server <export.json> [port]
+
+The port it listens on is printed as the first line of output.
+"""
+import shutil
+import sys
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+PREFIX = b'{"success":true,"data":'
+SUFFIX = b'}'
+
+
+def make_handler(export_path):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            if self.path != "/api/health":
+                return self._send(404, b'{"success":false,"error":"Not found"}')
+            self._send(200, b'{"status":"ok"}')
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("Content-Length") or 0))
+            if self.path != "/api/get":
+                return self._send(404, b'{"success":false,"error":"Not found"}')
+
+            with open(export_path, "rb") as f:
+                f.seek(0, 2)
+                size = f.tell()
+                f.seek(0)
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json; charset=utf-8")
+                self.send_header("Content-Length", str(len(PREFIX) + size + len(SUFFIX)))
+                self.end_headers()
+                self.wfile.write(PREFIX)
+                shutil.copyfileobj(f, self.wfile, 1024 * 1024)
+                self.wfile.write(SUFFIX)
+
+        def _send(self, status, body):
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def main():
+    if len(sys.argv) < 2:
+        print("Usage: python -m benchmarks.stub_server <export.json> [port]")
+        sys.exit(1)
+
+    port = int(sys.argv[2]) if len(sys.argv) > 2 else 0
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(sys.argv[1]))
+    print(server.server_address[1], flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
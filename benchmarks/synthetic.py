@@ -0,0 +1,231 @@
+"""Generators for synthetic Messages, AddressBook and platform export data.
+
+Everything is derived from a seeded random generator, so the same arguments
+always produce the same files. Rows are produced lazily and inserted in
+batches, so databases with millions of messages can be made without holding
+them in memory.
+"""
+import itertools
+import json
+import os
+import random
+import sqlite3
+
+# Apple nanosecond timestamp of 2020-01-01, the start of the synthetic history
+START_DATE = 599616000 * 1_000_000_000
+# Rows inserted per executemany call
+INSERT_BATCH = 50000
+
+WORDS = (
+    "the a to and of in is you that it for on with this be are was have not "
+    "at we can what but so just like get your all if do will about out up one "
+    "time lunch tomorrow meeting call later tonight thanks sounds good okay "
+    "running late see soon weekend plans dinner coffee project deadline "
+    "review draft send photo link address flight train ticket 🙂 👍 ❤️ café"
+).split()
+FIRST_NAMES = "Ada Ben Cleo Dev Eli Fay Gus Hana Ivo June Kai Lena Max Nia Omar Pia Quinn Ravi Sol Tess".split()
+LAST_NAMES = "Ng Ortiz Park Quist Reyes Singh Tan Ueda Vance Wu Xu Young Zhou Adler Brink Cole".split()
+
+MESSAGES_SCHEMA = """
+CREATE TABLE handle (ROWID INTEGER PRIMARY KEY, id TEXT, service TEXT);
+CREATE TABLE message (
+    ROWID INTEGER PRIMARY KEY,
+    guid TEXT,
+    text TEXT,
+    attributedBody BLOB,
+    date INTEGER,
+    handle_id INTEGER,
+    is_from_me INTEGER,
+    cache_has_attachments INTEGER DEFAULT 0
+);
+CREATE TABLE chat (ROWID INTEGER PRIMARY KEY, chat_identifier TEXT, display_name TEXT, style INTEGER);
+CREATE TABLE chat_message_join (chat_id INTEGER, message_id INTEGER);
+CREATE TABLE attachment (ROWID INTEGER PRIMARY KEY, filename TEXT, mime_type TEXT, transfer_name TEXT, total_bytes INTEGER);
+CREATE TABLE message_attachment_join (message_id INTEGER, attachment_id INTEGER);
+"""
+
+ADDRESS_BOOK_SCHEMA = """
+CREATE TABLE ZABCDRECORD (Z_PK INTEGER PRIMARY KEY, ZFIRSTNAME TEXT, ZLASTNAME TEXT);
+CREATE TABLE ZABCDPHONENUMBER (ZOWNER INTEGER, ZFULLNUMBER TEXT);
+CREATE TABLE ZABCDEMAILADDRESS (ZOWNER INTEGER, ZADDRESS TEXT);
+"""
+
+
+def sentence(rng, min_words=3, max_words=24):
+    return " ".join(rng.choice(WORDS) for _ in range(rng.randint(min_words, max_words)))
+
+
+def phone_number(index):
+    """A distinct US phone number per index, in a format that varies like real handles."""
+    digits = f"555{index:07d}"
+    style = index % 3
+    if style == 0:
+        return f"+1{digits}"
+    if style == 1:
+        return f"({digits[:3]}) {digits[3:6]}-{digits[6:]}"
+    return f"+1 {digits[:3]} {digits[3:6]} {digits[6:]}"
+
+
+def email_address(index):
+    return f"{FIRST_NAMES[index % len(FIRST_NAMES)].lower()}.{index}@example.com"
+
+
+def _insert(conn, sql, rows):
+    rows = iter(rows)
+    while True:
+        batch = list(itertools.islice(rows, INSERT_BATCH))
+        if not batch:
+            break
+        conn.executemany(sql, batch)
+
+
+def _fresh(path):
+    for suffix in ("", "-wal", "-shm", "-journal"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode = OFF")
+    conn.execute("PRAGMA synchronous = OFF")
+    return conn
+
+
+def make_messages_db(path, rows, handles=500, chats=200, seed=0, attachment_every=20, missing_text_every=40):
+    """Write a Messages `chat.db` with `rows` messages from `handles` handles.
+
+    About one message in `missing_text_every` has no text, as messages whose
+    body only exists in attributedBody do, and one in `attachment_every` has
+    an attachment.
+    """
+    rng = random.Random(seed)
+    conn = _fresh(path)
+    conn.executescript(MESSAGES_SCHEMA)
+
+    # Two thirds of the handles are phone numbers, the rest email addresses
+    _insert(conn, "INSERT INTO handle VALUES (?, ?, ?)", (
+        (i, phone_number(i) if i % 3 else email_address(i), "iMessage")
+        for i in range(1, handles + 1)
+    ))
+    _insert(conn, "INSERT INTO chat VALUES (?, ?, ?, ?)", (
+        (i, f"chat{i}", f"Group {i}" if i % 4 == 0 else None, 43 if i % 4 == 0 else 45)
+        for i in range(1, chats + 1)
+    ))
+
+    def messages():
+        date = START_DATE
+        for rowid in range(1, rows + 1):
+            date += rng.randint(1, 600) * 1_000_000_000
+            has_text = rowid % missing_text_every != 0
+            yield (
+                rowid,
+                f"msg-{rowid}",
+                sentence(rng) if has_text else None,
+                None,
+                date,
+                rng.randint(1, handles),
+                rng.random() < 0.45,
+                1 if rowid % attachment_every == 0 else 0,
+            )
+
+    _insert(conn, "INSERT INTO message VALUES (?, ?, ?, ?, ?, ?, ?, ?)", messages())
+    _insert(conn, "INSERT INTO chat_message_join VALUES (?, ?)", (
+        ((rowid * 7919) % chats + 1, rowid) for rowid in range(1, rows + 1)
+    ))
+    attachment_ids = range(attachment_every, rows + 1, attachment_every)
+    _insert(conn, "INSERT INTO attachment VALUES (?, ?, ?, ?, ?)", (
+        (rowid, f"~/Library/Messages/Attachments/{rowid % 256:02x}/IMG_{rowid}.jpeg", "image/jpeg", f"IMG_{rowid}.jpeg", 100000 + rowid % 50000)
+        for rowid in attachment_ids
+    ))
+    _insert(conn, "INSERT INTO message_attachment_join VALUES (?, ?)", ((rowid, rowid) for rowid in attachment_ids))
+    conn.execute("CREATE INDEX chat_message_join_message ON chat_message_join (message_id)")
+    conn.execute("CREATE INDEX message_attachment_join_message ON message_attachment_join (message_id)")
+    conn.commit()
+    conn.close()
+    return path
+
+
+def make_address_book_db(path, contacts=400, seed=0):
+    """Write a macOS AddressBook database whose contacts match most message handles.
+
+    Contact i owns the phone number or email of handle i, so with the default
+    500 handles four in five resolve to a name.
+    """
+    rng = random.Random(seed)
+    conn = _fresh(path)
+    conn.executescript(ADDRESS_BOOK_SCHEMA)
+    _insert(conn, "INSERT INTO ZABCDRECORD VALUES (?, ?, ?)", (
+        (i, rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES) if i % 5 else None)
+        for i in range(1, contacts + 1)
+    ))
+    _insert(conn, "INSERT INTO ZABCDPHONENUMBER VALUES (?, ?)", (
+        (i, phone_number(i)) for i in range(1, contacts + 1) if i % 3
+    ))
+    _insert(conn, "INSERT INTO ZABCDEMAILADDRESS VALUES (?, ?)", (
+        (i, email_address(i).upper() if i % 2 else email_address(i)) for i in range(1, contacts + 1) if not i % 3
+    ))
+    conn.commit()
+    conn.close()
+    return path
+
+
+def _imessage_record(rng, index):
+    return {
+        'id': index,
+        'text': sentence(rng),
+        'timestamp': f"2024-{index % 12 + 1:02d}-{index % 28 + 1:02d}T{index % 24:02d}:{index % 60:02d}:00.000",
+        'contact': f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}",
+        'is_from_me': rng.random() < 0.45,
+    }
+
+
+def _bookmark_record(rng, index):
+    return {
+        'id': str(1800000000000000000 + index),
+        'text': sentence(rng, 8, 50),
+        'username': f"{rng.choice(FIRST_NAMES).lower()}{index % 997}",
+        'timestamp': f"2024-{index % 12 + 1:02d}-{index % 28 + 1:02d}T12:00:00.000Z",
+    }
+
+
+def _email_record(rng, index):
+    # Long bodies, several paragraphs each, to exercise chunking
+    paragraphs = ["{}.".format(". ".join(sentence(rng) for _ in range(rng.randint(2, 6)))) for _ in range(rng.randint(1, 8))]
+    return {
+        'id': f"{index:016x}",
+        'subject': sentence(rng, 2, 8),
+        'from': email_address(index % 500),
+        'timestamp': f"2024-{index % 12 + 1:02d}-{index % 28 + 1:02d}T09:30:00.000Z",
+        'text': "\n\n".join(paragraphs),
+    }
+
+
+RECORD_FACTORIES = {
+    'imessage-001': _imessage_record,
+    'bookmarks-001': _bookmark_record,
+    'gmail-001': _email_record,
+}
+
+
+def make_export(path, platform_id, rows, seed=0, run_id=None):
+    """Write a platform export JSON file in the layout the desktop app produces.
+
+    Records are written one at a time, like the exporters do.
+    """
+    company, name = {
+        'imessage-001': ('Apple', 'iMessage'),
+        'bookmarks-001': ('X Corp', 'Bookmarks'),
+        'gmail-001': ('Google', 'Gmail'),
+    }[platform_id]
+    make_record = RECORD_FACTORIES[platform_id]
+    rng = random.Random(seed)
+    run_id = run_id or f"{platform_id}-1700000000000"
+    header = {'company': company, 'name': name, 'runID': run_id, 'timestamp': int(run_id.split('-')[-1])}
+
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(json.dumps(header, ensure_ascii=False, separators=(',', ':'))[:-1])
+        f.write(',"content":[')
+        for index in range(rows):
+            if index:
+                f.write(',')
+            f.write(json.dumps(make_record(rng, index), ensure_ascii=False, separators=(',', ':')))
+        f.write(']}')
+    return path
@@ -1,16 +1,38 @@
 import networkx as nx
 from pyvis.network import Network
 import matplotlib.pyplot as plt
-from surfer_protocol import SurferClient
-from helpers import extract_nodes, extract_edges
+from surfer_protocol import SurferClient, ResponseCache
+from helpers import PROMPT_VERSION
+from pipeline import PIPELINE_PROMPT_VERSION, run_pipeline, run_serial
+from retrieval import LabelIndex, dedupe_nodes, relevant_edges
+from checkpoint import GraphCheckpoint
+from extraction_cache import ExtractionCache
+import argparse
+import asyncio
 import json
 from datetime import datetime
 
-surfer_client = SurferClient()
+parser = argparse.ArgumentParser(description="Build a knowledge graph from your Surfer bookmarks")
+parser.add_argument('--pipeline', action='store_true', help="extract several bookmarks per request with concurrent workers")
+parser.add_argument('--concurrency', type=int, default=8, help="requests in flight at once in pipeline mode")
+parser.add_argument('--batch-size', type=int, default=5, help="bookmarks per request in pipeline mode")
+parser.add_argument('--context-size', type=int, default=30, help="most related nodes and edges sent with each request")
+parser.add_argument('--render-every', type=int, default=1, help="update graph_current.html after this many bookmarks, 0 to only render at the end")
+parser.add_argument('--checkpoint', default='graph_checkpoint.db', help="SQLite file the graph is saved to as it grows, to resume after a crash")
+parser.add_argument('--cache', default='extraction_cache.db', help="SQLite file extraction results are cached in across runs")
+parser.add_argument('--cache-size-mb', type=int, default=100, help="size the extraction cache is trimmed to, least recently used entries first")
+parser.add_argument('--no-cache', action='store_true', help="always ask the model, without reading or writing the extraction cache")
+parser.add_argument('--fresh', action='store_true', help="ignore the checkpoint and build the graph from scratch")
+args = parser.parse_args()
+
+# Cache the export locally so reruns don't re-download it
+surfer_client = SurferClient(cache=ResponseCache())
 data = surfer_client.get('bookmarks-001')
 
 # Initialize both NetworkX and Pyvis graphs
 G = nx.Graph()
+# Finds the existing nodes related to a bookmark, so prompts stay the same size as the graph grows
+index = LabelIndex()
 net = Network(height="750px", width="100%", bgcolor="#ffffff", font_color="black", select_menu=True, filter_menu=True)
 net.barnes_hut()
 net.toggle_physics(True)
@@ -30,7 +52,7 @@ def display_graph(G, title):
             'label': G.nodes[node['id']].get('label', ''),
             'title': G.nodes[node['id']].get('text', ''),  # Hover text
             'color': '#6AACF0',
-            'value': len([n for n in G.neighbors(node['id'])])  # Node size based on connections
+            'value': G.degree(node['id'])  # Node size based on connections
         })
     
     for edge in net.edges:
@@ -72,35 +94,100 @@ def save_graph(G):
     
     print(f"\nFinal graph saved as:\ngraph_{timestamp}.html\ngraph_{timestamp}.json")
 
+def context(text):
+    """The existing nodes and edges most related to a text."""
+    node_ids = index.search(text, args.context_size)
+    return index.nodes(node_ids), relevant_edges(G, node_ids, args.context_size)
+
+def edge_nodes(new_nodes):
+    """New nodes to relate, with repeated labels replaced by the existing node."""
+    unique, id_map = dedupe_nodes(new_nodes, index)
+    return unique + index.nodes(dict.fromkeys(id_map.values()))
+
+def add_to_graph(bookmarks, nodes, edges):
+    # Nodes repeating a known label are merged into the existing node
+    unique, id_map = dedupe_nodes(nodes, index)
+    for node in unique:
+        G.add_node(node['id'], label=node['label'], text=node['text'])
+        index.add(node['id'], node['label'])
+    
+    added_edges = []
+    for edge in edges:
+        source = id_map.get(edge['from'], edge['from'])
+        target = id_map.get(edge['to'], edge['to'])
+        if source != target and source in G and target in G:
+            G.add_edge(source, target, label=edge['label'])
+            added_edges.append({"from": source, "to": target, "label": edge['label']})
+    
+    checkpoint.save([bookmark['id'] for bookmark in bookmarks], unique, added_edges)
+    
+    # Display updated graph every --render-every bookmarks
+    progress['processed'] += len(bookmarks)
+    progress['rendered'] = False
+    if args.render_every and progress['processed'] // args.render_every > (progress['processed'] - len(bookmarks)) // args.render_every:
+        render()
+
+def render():
+    display_graph(G, f'Knowledge Graph (Nodes: {len(G.nodes())}, Edges: {len(G.edges())})')
+    progress['rendered'] = True
+
+def build_serial(bookmarks):
+    run_serial(
+        bookmarks,
+        context=lambda batch: context(batch[0]['text']),
+        on_result=add_to_graph,
+        edge_nodes=edge_nodes,
+        cache=cache,
+        graph_size=lambda: len(G.nodes()),
+    )
+
+def build_pipeline(bookmarks):
+    asyncio.run(run_pipeline(
+        bookmarks,
+        context=lambda batch: context(" ".join(bookmark['text'] for bookmark in batch)),
+        on_result=add_to_graph,
+        concurrency=args.concurrency,
+        batch_size=args.batch_size,
+        edge_nodes=edge_nodes,
+        cache=cache,
+    ))
+
+# Bookmarks whose text hasn't changed since an earlier run reuse its extractions
+cache = None
+if not args.no_cache:
+    cache = ExtractionCache(
+        args.cache,
+        PIPELINE_PROMPT_VERSION if args.pipeline else PROMPT_VERSION,
+        max_bytes=args.cache_size_mb * 1024 * 1024,
+    )
+
+# Resume from the checkpoint of an earlier run that didn't finish
+checkpoint = GraphCheckpoint(args.checkpoint)
+if args.fresh:
+    checkpoint.clear()
+progress = {'processed': checkpoint.load(G), 'rendered': False}
+for node_id in G.nodes():
+    index.add(node_id, G.nodes[node_id].get('label'))
+done = checkpoint.processed_ids()
+
+if done:
+    print(f"Resuming from {args.checkpoint}: {len(done)} bookmarks already processed")
+
 try:
-    for bookmark in data['data']['content']:
-        # Extract and add nodes
-        new_nodes = extract_nodes(bookmark, [{"id": n, "label": G.nodes[n].get('label')} for n in G.nodes()])
-        
-        for node in new_nodes:
-            G.add_node(node['id'], label=node['label'], text=node['text'])
-        
-        # Extract and add edges
-        if len(G.nodes()) > 1:
-            edges_data = {
-                "newNodes": new_nodes,
-                "currentEdges": [
-                    {"from": u, "to": v, "label": G.edges[u, v].get('label')} 
-                    for u, v in G.edges()
-                ]
-            }
-            
-            new_edges = extract_edges(edges_data)
-            
-            for edge in new_edges:
-                G.add_edge(edge['from'], edge['to'], label=edge['label'])
-        
-        # Display updated graph
-        display_graph(G, f'Knowledge Graph (Nodes: {len(G.nodes())}, Edges: {len(G.edges())})')
+    bookmarks = [bookmark for bookmark in data['data']['content'] if str(bookmark['id']) not in done]
+    if args.pipeline:
+        build_pipeline(bookmarks)
+    else:
+        build_serial(bookmarks)
 
 except Exception as e:
     print(f"\nAn error occurred: {e}")
-    save_graph(G)
 
 finally:
-    save_graph(G)
\ No newline at end of file
+    if not progress['rendered']:
+        render()
+    save_graph(G)
+    checkpoint.close()
+    if cache:
+        print(f"Extraction cache: {cache.hits} hits, {cache.misses} misses")
+        cache.close()
\ No newline at end of file
@@ -0,0 +1,53 @@
+import sqlite3
+
+class GraphCheckpoint:
+    """Append-only SQLite record of the graph and of the bookmarks already processed.
+
+    Every processed bookmark is saved in the same transaction as the nodes and
+    edges extracted from it, so after a crash the graph can be reloaded and
+    the build picks up with the first unprocessed bookmark.
+    """
+
+    def __init__(self, path: str):
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript("""
+            PRAGMA journal_mode = WAL;
+            CREATE TABLE IF NOT EXISTS nodes (id TEXT PRIMARY KEY, label TEXT, text TEXT);
+            CREATE TABLE IF NOT EXISTS edges (source TEXT, target TEXT, label TEXT, PRIMARY KEY (source, target));
+            CREATE TABLE IF NOT EXISTS processed (bookmark_id TEXT PRIMARY KEY);
+        """)
+
+    def processed_ids(self) -> set:
+        return {row[0] for row in self.conn.execute("SELECT bookmark_id FROM processed")}
+
+    def load(self, G):
+        """Add the saved nodes and edges to G and return how many bookmarks were processed."""
+        for node_id, label, text in self.conn.execute("SELECT id, label, text FROM nodes ORDER BY rowid"):
+            G.add_node(node_id, label=label, text=text)
+        for source, target, label in self.conn.execute("SELECT source, target, label FROM edges ORDER BY rowid"):
+            G.add_edge(source, target, label=label)
+        return self.conn.execute("SELECT COUNT(*) FROM processed").fetchone()[0]
+
+    def save(self, bookmark_ids: list, nodes: list, edges: list):
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO nodes (id, label, text) VALUES (?, ?, ?)",
+                [(node['id'], node['label'], node['text']) for node in nodes],
+            )
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO edges (source, target, label) VALUES (?, ?, ?)",
+                [(edge['from'], edge['to'], edge['label']) for edge in edges],
+            )
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO processed (bookmark_id) VALUES (?)",
+                [(str(bookmark_id),) for bookmark_id in bookmark_ids],
+            )
+
+    def clear(self):
+        with self.conn:
+            self.conn.execute("DELETE FROM nodes")
+            self.conn.execute("DELETE FROM edges")
+            self.conn.execute("DELETE FROM processed")
+
+    def close(self):
+        self.conn.close()
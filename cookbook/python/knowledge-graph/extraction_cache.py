@@ -0,0 +1,76 @@
+import hashlib
+import json
+import sqlite3
+import time
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256((text or "").encode("utf-8")).hexdigest()
+
+class ExtractionCache:
+    """Persistent store of model extraction results, keyed by bookmark and prompt.
+
+    Entries are keyed by the kind of extraction, the bookmark ID, a hash of
+    the bookmark text and the prompt version, so a bookmark is only sent to
+    the model again when its text or the prompts change. When the cache grows
+    past `max_bytes` the least recently used entries are evicted.
+    """
+
+    def __init__(self, path: str, prompt_version: str, max_bytes: int = 100 * 1024 * 1024):
+        self.prompt_version = prompt_version
+        self.max_bytes = max_bytes
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript("""
+            PRAGMA journal_mode = WAL;
+            CREATE TABLE IF NOT EXISTS entries (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                accessed REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed);
+        """)
+        self.size = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, kind: str, bookmark: dict) -> str:
+        return f"{kind}:{self.prompt_version}:{bookmark['id']}:{text_hash(bookmark.get('text'))}"
+
+    def get(self, kind: str, bookmark: dict):
+        """The cached result for a bookmark, or None."""
+        key = self.key(kind, bookmark)
+        row = self.conn.execute("SELECT value FROM entries WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        with self.conn:
+            self.conn.execute("UPDATE entries SET accessed = ? WHERE key = ?", (time.time(), key))
+        return json.loads(row[0])
+
+    def put(self, kind: str, bookmark: dict, value):
+        key = self.key(kind, bookmark)
+        data = json.dumps(value, ensure_ascii=False)
+        size = len(data.encode("utf-8"))
+        with self.conn:
+            previous = self.conn.execute("SELECT size FROM entries WHERE key = ?", (key,)).fetchone()
+            self.conn.execute(
+                "INSERT OR REPLACE INTO entries (key, value, size, accessed) VALUES (?, ?, ?, ?)",
+                (key, data, size, time.time()),
+            )
+        self.size += size - (previous[0] if previous else 0)
+        if self.size > self.max_bytes:
+            self.evict()
+
+    def evict(self):
+        """Drop least recently used entries until the cache is back under 90% of its limit."""
+        target = self.max_bytes * 0.9
+        with self.conn:
+            for key, size in self.conn.execute("SELECT key, size FROM entries ORDER BY accessed").fetchall():
+                if self.size <= target:
+                    break
+                self.conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                self.size -= size
+
+    def close(self):
+        self.conn.close()
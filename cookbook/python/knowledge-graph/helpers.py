@@ -1,19 +1,16 @@
 from openai import OpenAI
+import hashlib
 import json
-import logging
 from dotenv import load_dotenv
 load_dotenv()
 import os
 
+# OPENAI_BASE_URL is read by the client too, so a local mock endpoint can stand in for the API
 client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 
-def extract_nodes(data: any, current_nodes: any) -> str:
-    try:
-        response = client.chat.completions.create(
-            messages=[
-                {
-                    "role": "system",
-                    "content": """
+MODEL = "gpt-4o-mini"
+
+NODES_SYSTEM_PROMPT = """
     You are an AI assistant that extracts new entity nodes from text. Your task is to identify and extract significant entities mentioned in the tweet, focusing on people, ideas, and concepts.
 
     Return the extracted nodes in the following JSON format:
@@ -30,45 +27,8 @@ def extract_nodes(data: any, current_nodes: any) -> str:
     - Only extract nodes that are not already in the current nodes.
     - Only extract 5 nodes MAXIUMUM
                     """
-                },
-                {
-                    "role": "user",
-                    "content": f"""
-    Given the current nodes, extract new nodes from the following text:
-
-    Current nodes:
-
-    {current_nodes}
-
-    Current Text:
-
-    {data['text']}
 
-    Consider people, ideas, and concepts. Avoid creating nodes for actions or temporal information.
-                    """
-                }
-            ],
-            model="gpt-4o-mini",
-            response_format={ "type": "json_object" }
-        )
-        
-        nodes = response.choices[0].message.content
-        nodes = json.loads(nodes)['nodes']
-        
-        nodes = [{"id": f"{data['id']}_{i}", "text": data['text'], **node} for i, node in enumerate(nodes)]
-        
-        return nodes
-    except Exception as e:
-        logging.error(f"Error extracting nodes: {str(e)}")
-        return []
-
-def extract_edges(data: dict) -> list:
-    try:
-        response = client.chat.completions.create(
-            messages=[
-                {
-                    "role": "system",
-                    "content": """
+EDGES_SYSTEM_PROMPT = """
     You are an AI assistant that extracts new relationships (edges) between nodes. Your task is to identify connections between the given nodes based on their content.
 
     Return the extracted edges in the following JSON format:
@@ -89,26 +49,79 @@ def extract_edges(data: dict) -> list:
     - Maximum 5 edges per analysis
     - Use the node IDs exactly as provided in the input
     """
-                },
-                {
-                    "role": "user",
-                    "content": f"""
+
+# Cached extractions are only reused while the model and prompts stay the same
+PROMPT_VERSION = hashlib.sha256((MODEL + NODES_SYSTEM_PROMPT + EDGES_SYSTEM_PROMPT).encode("utf-8")).hexdigest()[:12]
+
+def nodes_user_prompt(text: str, current_nodes: any) -> str:
+    return f"""
+    Given the current nodes, extract new nodes from the following text:
+
+    Current nodes:
+
+    {current_nodes}
+
+    Current Text:
+
+    {text}
+
+    Consider people, ideas, and concepts. Avoid creating nodes for actions or temporal information.
+                    """
+
+def edges_user_prompt(new_nodes: list, current_edges: list) -> str:
+    return f"""
     New nodes:
-    {json.dumps(data['newNodes'], indent=2)}
+    {json.dumps(new_nodes, indent=2)}
 
     Current edges:
-    {json.dumps(data['currentEdges'], indent=2)}
+    {json.dumps(current_edges, indent=2)}
 
     Create edges between these nodes if meaningful relationships exist.
     """
-                }
-            ],
-            model="gpt-4o-mini",
-            response_format={ "type": "json_object" }
-        )
-        
-        edges = json.loads(response.choices[0].message.content)['edges']
-        return edges
-    except Exception as e:
-        logging.error(f"Error extracting edges: {str(e)}")
-        return []
+
+def to_graph_nodes(data: dict, nodes: list) -> list:
+    """Give extracted nodes IDs derived from the bookmark they came from."""
+    return [{"id": f"{data['id']}_{i}", "text": data['text'], **node} for i, node in enumerate(nodes)]
+
+def extract_nodes(data: any, current_nodes: any, cache=None) -> list:
+    """Extract nodes from a bookmark. Raises if the request or its response fails."""
+    cached = cache.get("nodes", data) if cache else None
+    if cached is not None:
+        return to_graph_nodes(data, cached)
+    response = client.chat.completions.create(
+        messages=[
+            {"role": "system", "content": NODES_SYSTEM_PROMPT},
+            {"role": "user", "content": nodes_user_prompt(data['text'], current_nodes)}
+        ],
+        model=MODEL,
+        response_format={ "type": "json_object" }
+    )
+
+    nodes = response.choices[0].message.content
+    nodes = json.loads(nodes)['nodes']
+    if cache:
+        cache.put("nodes", data, nodes)
+
+    return to_graph_nodes(data, nodes)
+
+def extract_edges(data: dict, cache=None, bookmark: dict = None) -> list:
+    """Extract edges for new nodes. Results are cached per `bookmark` when both are given.
+
+    Raises if the request or its response fails.
+    """
+    cached = cache.get("edges", bookmark) if cache and bookmark else None
+    if cached is not None:
+        return cached
+    response = client.chat.completions.create(
+        messages=[
+            {"role": "system", "content": EDGES_SYSTEM_PROMPT},
+            {"role": "user", "content": edges_user_prompt(data['newNodes'], data['currentEdges'])}
+        ],
+        model=MODEL,
+        response_format={ "type": "json_object" }
+    )
+
+    edges = json.loads(response.choices[0].message.content)['edges']
+    if cache and bookmark:
+        cache.put("edges", bookmark, edges)
+    return edges
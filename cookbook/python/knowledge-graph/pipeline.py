@@ -0,0 +1,219 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import random
+from dotenv import load_dotenv
+from openai import AsyncOpenAI, APIConnectionError, APITimeoutError, InternalServerError, RateLimitError
+from helpers import MODEL, EDGES_SYSTEM_PROMPT, PROMPT_VERSION, edges_user_prompt, extract_edges, extract_nodes, to_graph_nodes
+load_dotenv()
+
+# Errors worth waiting out: rate limits, overloaded servers and dropped connections
+RETRYABLE_ERRORS = (RateLimitError, APITimeoutError, APIConnectionError, InternalServerError)
+
+BATCH_NODES_SYSTEM_PROMPT = """
+    You are an AI assistant that extracts new entity nodes from several texts at once. Your task is to identify and extract significant entities mentioned in each tweet, focusing on people, ideas, and concepts.
+
+    Return the extracted nodes for every text, using the text's id, in the following JSON format:
+    {
+      "texts": [
+        {
+          "id": "text id",
+          "nodes": [
+            { "label": "string" }
+          ]
+        }
+      ]
+    }
+
+    Ensure that each node has a concise label that provides more context about the node.
+
+    Rules:
+    - Only extract nodes that are relevant to their tweet.
+    - Only extract nodes that are not already in the current nodes.
+    - Only extract 5 nodes MAXIUMUM per text
+                    """
+
+# Batched prompts differ from the serial ones, so their cached results are kept apart
+PIPELINE_PROMPT_VERSION = hashlib.sha256((PROMPT_VERSION + BATCH_NODES_SYSTEM_PROMPT).encode("utf-8")).hexdigest()[:12]
+
+def batch_nodes_user_prompt(batch: list, current_nodes: list) -> str:
+    texts = [{"id": str(bookmark['id']), "text": bookmark['text']} for bookmark in batch]
+    return f"""
+    Given the current nodes, extract new nodes from each of the following texts:
+
+    Current nodes:
+
+    {current_nodes}
+
+    Texts:
+
+    {json.dumps(texts, indent=2)}
+
+    Consider people, ideas, and concepts. Avoid creating nodes for actions or temporal information.
+                    """
+
+def batches(items: list, batch_size: int):
+    for start in range(0, len(items), batch_size):
+        yield items[start:start + batch_size]
+
+def retry_delay(error: Exception, attempt: int) -> float:
+    """Seconds to wait before retrying, preferring the server's Retry-After header."""
+    response = getattr(error, 'response', None)
+    retry_after = response.headers.get('retry-after') if response is not None else None
+    try:
+        if retry_after is not None:
+            return float(retry_after)
+    except ValueError:
+        pass
+    # Exponential backoff with jitter so workers don't retry in lockstep
+    return min(60, 2 ** attempt) * (0.5 + random.random())
+
+class Backoff:
+    """A pause shared by concurrent workers.
+
+    When one worker is told to back off, every worker waits until the pause
+    is over before its next request, instead of only the one that hit it.
+    """
+
+    def __init__(self):
+        self.resume_at = 0.0
+
+    def pause(self, delay: float):
+        loop = asyncio.get_running_loop()
+        self.resume_at = max(self.resume_at, loop.time() + delay)
+
+    async def wait(self):
+        loop = asyncio.get_running_loop()
+        # Another worker may extend the pause while this one sleeps
+        while (remaining := self.resume_at - loop.time()) > 0:
+            await asyncio.sleep(remaining)
+
+async def with_retry(call, max_retries: int, backoff: Backoff = None):
+    backoff = backoff or Backoff()
+    for attempt in range(max_retries + 1):
+        await backoff.wait()
+        try:
+            return await call()
+        except RETRYABLE_ERRORS as e:
+            if attempt == max_retries:
+                raise
+            delay = retry_delay(e, attempt)
+            logging.warning(f"{type(e).__name__}, retrying in {delay:.1f}s")
+            backoff.pause(delay)
+
+async def complete_json(client: AsyncOpenAI, system_prompt: str, user_prompt: str, max_retries: int, backoff: Backoff = None) -> dict:
+    response = await with_retry(
+        lambda: client.chat.completions.create(
+            messages=[
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt}
+            ],
+            model=MODEL,
+            response_format={ "type": "json_object" }
+        ),
+        max_retries,
+        backoff,
+    )
+    return json.loads(response.choices[0].message.content)
+
+async def extract_batch(client: AsyncOpenAI, batch: list, current_nodes: list, current_edges: list, max_retries: int = 6, edge_nodes=None, cache=None, backoff: Backoff = None):
+    """Extract nodes for a batch of bookmarks in one request, then edges between them in another.
+
+    `edge_nodes(new_nodes)` picks the nodes to relate in the edge request,
+    for example to swap repeated labels for the existing nodes. With a
+    `cache`, only bookmarks without cached results are sent to the model.
+    Retries wait out `backoff`, which can be shared with other batches.
+    """
+    extracted = {str(bookmark['id']): cache.get("nodes", bookmark) for bookmark in batch} if cache else {}
+    missing = [bookmark for bookmark in batch if extracted.get(str(bookmark['id'])) is None]
+    if missing:
+        result = await complete_json(client, BATCH_NODES_SYSTEM_PROMPT, batch_nodes_user_prompt(missing, current_nodes), max_retries, backoff)
+        nodes_by_id = {str(text.get('id')): text.get('nodes', []) for text in result.get('texts', [])}
+        for bookmark in missing:
+            extracted[str(bookmark['id'])] = nodes_by_id.get(str(bookmark['id']), [])
+            if cache:
+                cache.put("nodes", bookmark, extracted[str(bookmark['id'])])
+
+    new_nodes = []
+    owners = {}
+    for bookmark in batch:
+        for node in to_graph_nodes(bookmark, extracted[str(bookmark['id'])]):
+            new_nodes.append(node)
+            owners[node['id']] = bookmark
+    if not new_nodes:
+        return [], []
+
+    if cache and not missing:
+        cached_edges = [cache.get("edges", bookmark) for bookmark in batch]
+        if all(edges is not None for edges in cached_edges):
+            return new_nodes, [edge for edges in cached_edges for edge in edges]
+
+    candidates = edge_nodes(new_nodes) if edge_nodes else new_nodes
+    result = await complete_json(client, EDGES_SYSTEM_PROMPT, edges_user_prompt(candidates, current_edges), max_retries, backoff)
+    edges = result.get('edges', [])
+
+    if cache:
+        # Each edge is cached with the bookmark its new node came from
+        edges_by_bookmark = {str(bookmark['id']): [] for bookmark in batch}
+        for edge in edges:
+            owner = owners.get(edge.get('from')) or owners.get(edge.get('to')) or batch[0]
+            edges_by_bookmark[str(owner['id'])].append(edge)
+        for bookmark in batch:
+            cache.put("edges", bookmark, edges_by_bookmark[str(bookmark['id'])])
+    return new_nodes, edges
+
+def run_serial(bookmarks: list, context, on_result, edge_nodes=None, cache=None, graph_size=None):
+    """Extract nodes and then edges for one bookmark at a time.
+
+    Takes the same callbacks as `run_pipeline`. `graph_size()` returns the
+    number of nodes already in the graph, and edges are only extracted once
+    there are two nodes to relate. A bookmark whose extraction fails is logged
+    and not passed to `on_result`, so it isn't checkpointed and the next run
+    tries it again.
+    """
+    for bookmark in bookmarks:
+        current_nodes, current_edges = context([bookmark])
+        try:
+            new_nodes = extract_nodes(bookmark, current_nodes, cache)
+            new_edges = []
+            candidates = edge_nodes(new_nodes) if edge_nodes else new_nodes
+            if (graph_size() if graph_size else 0) + len(candidates) > 1:
+                new_edges = extract_edges({"newNodes": candidates, "currentEdges": current_edges}, cache, bookmark)
+        except Exception as e:
+            logging.error(f"Error extracting bookmark {bookmark['id']}: {str(e)}")
+            continue
+        on_result([bookmark], new_nodes, new_edges)
+
+async def run_pipeline(bookmarks: list, context, on_result, concurrency: int = 8, batch_size: int = 5, max_retries: int = 6, edge_nodes=None, cache=None):
+    """Extract nodes and edges for all bookmarks with bounded concurrency.
+
+    `context(batch)` returns the (current_nodes, current_edges) to send with a
+    batch, and is called when the batch is picked up so it sees results that
+    finished earlier. `on_result(batch, nodes, edges)` is called as each batch
+    finishes. `edge_nodes` and `cache` are passed on to `extract_batch`. Batches that
+    still fail after retrying are logged and skipped.
+    """
+    # Retries are handled here, with backoff shared across the workers
+    client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"), max_retries=0)
+    backoff = Backoff()
+    queue = asyncio.Queue()
+    for batch in batches(bookmarks, batch_size):
+        queue.put_nowait(batch)
+
+    async def worker():
+        while not queue.empty():
+            batch = queue.get_nowait()
+            current_nodes, current_edges = context(batch)
+            try:
+                nodes, edges = await extract_batch(client, batch, current_nodes, current_edges, max_retries, edge_nodes, cache, backoff)
+            except Exception as e:
+                logging.error(f"Error extracting batch starting at bookmark {batch[0]['id']}: {str(e)}")
+                continue
+            on_result(batch, nodes, edges)
+
+    try:
+        await asyncio.gather(*(worker() for _ in range(min(concurrency, queue.qsize()))))
+    finally:
+        await client.close()
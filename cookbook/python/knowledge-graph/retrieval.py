@@ -0,0 +1,91 @@
+import math
+import re
+from collections import defaultdict
+
+# Words too common to say anything about which nodes a bookmark relates to
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "has", "have", "he", "her", "his",
+    "i", "in", "is", "it", "its", "me", "my", "of", "on", "or", "our", "she", "so", "that", "the",
+    "their", "them", "they", "this", "to", "was", "we", "were", "what", "will", "with", "you", "your",
+    "https", "http", "www", "com", "co", "rt", "amp",
+}
+
+def normalize_label(label: str) -> str:
+    """Labels that only differ in case or spacing name the same node."""
+    return " ".join((label or "").casefold().split())
+
+def tokenize(text: str) -> set:
+    return {token for token in re.findall(r"\w+", (text or "").casefold()) if len(token) > 1 and token not in STOPWORDS}
+
+class LabelIndex:
+    """Lexical index over node labels, used to pick the nodes worth sending to the model."""
+
+    def __init__(self):
+        self.labels = {}
+        self.exact = {}
+        self.postings = defaultdict(set)
+
+    def __len__(self):
+        return len(self.labels)
+
+    def add(self, node_id, label: str):
+        self.labels[node_id] = label
+        self.exact.setdefault(normalize_label(label), node_id)
+        for token in tokenize(label):
+            self.postings[token].add(node_id)
+
+    def lookup(self, label: str):
+        """ID of the node with exactly this label, ignoring case and spacing."""
+        return self.exact.get(normalize_label(label))
+
+    def search(self, text: str, k: int) -> list:
+        """The k nodes whose labels share the most distinctive words with the text."""
+        scores = defaultdict(float)
+        for token in tokenize(text):
+            node_ids = self.postings.get(token)
+            if not node_ids:
+                continue
+            # Rare words count for more, like in TF-IDF
+            weight = math.log(1 + len(self.labels) / len(node_ids))
+            for node_id in node_ids:
+                scores[node_id] += weight
+        return sorted(scores, key=lambda node_id: -scores[node_id])[:k]
+
+    def nodes(self, node_ids) -> list:
+        return [{"id": node_id, "label": self.labels[node_id]} for node_id in node_ids]
+
+def dedupe_nodes(nodes: list, index: LabelIndex):
+    """Split extracted nodes into new ones and ones that repeat a known label.
+
+    Returns the new nodes and a map from the IDs of the repeated ones to the
+    existing node with the same label. Repeats within `nodes` are merged too.
+    """
+    unique = []
+    id_map = {}
+    seen = {}
+    for node in nodes:
+        key = normalize_label(node['label'])
+        existing = index.lookup(node['label']) or seen.get(key)
+        if existing is not None:
+            id_map[node['id']] = existing
+        else:
+            seen[key] = node['id']
+            unique.append(node)
+    return unique, id_map
+
+def relevant_edges(G, node_ids: list, k: int) -> list:
+    """Up to k edges touching the given nodes, most connected nodes first."""
+    edges = []
+    seen = set()
+    for node_id in node_ids:
+        if node_id not in G:
+            continue
+        for neighbor in sorted(G.neighbors(node_id), key=lambda n: -G.degree(n)):
+            key = frozenset((node_id, neighbor))
+            if key in seen:
+                continue
+            seen.add(key)
+            edges.append({"from": node_id, "to": neighbor, "label": G.edges[node_id, neighbor].get('label')})
+            if len(edges) >= k:
+                return edges
+    return edges
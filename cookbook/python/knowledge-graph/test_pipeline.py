@@ -0,0 +1,115 @@
+import asyncio
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
+import pipeline
+
+RETRY_AFTER = 0.5
+COMPLETION = json.dumps({
+    "id": "chatcmpl-test",
+    "object": "chat.completion",
+    "created": 0,
+    "model": pipeline.MODEL,
+    "choices": [{
+        "index": 0,
+        "message": {"role": "assistant", "content": json.dumps({"texts": []})},
+        "finish_reason": "stop",
+    }],
+}).encode("utf-8")
+
+
+class CompletionServer(ThreadingHTTPServer):
+    """A chat completions endpoint that rate limits the first `limited` requests.
+
+    Successful responses are slowed down a little, so the other workers are
+    still busy when the first request is turned away.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, limited: int):
+        super().__init__(("127.0.0.1", 0), CompletionHandler)
+        self.limited = limited
+        self.lock = threading.Lock()
+        # (time received, status) of every request
+        self.requests = []
+
+
+class CompletionHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        self.rfile.read(int(self.headers["Content-Length"]))
+        with self.server.lock:
+            status = 429 if len(self.server.requests) < self.server.limited else 200
+            self.server.requests.append((time.monotonic(), status))
+        if status == 429:
+            body = json.dumps({"error": {"message": "Rate limit reached", "type": "requests"}}).encode("utf-8")
+            self.send_response(429)
+            self.send_header("Retry-After", str(RETRY_AFTER))
+        else:
+            time.sleep(0.1)
+            body = COMPLETION
+            self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def run(server, bookmarks, concurrency, max_retries=6):
+    finished = []
+    asyncio.run(pipeline.run_pipeline(
+        bookmarks,
+        context=lambda batch: ([], []),
+        on_result=lambda batch, nodes, edges: finished.extend(bookmark["id"] for bookmark in batch),
+        concurrency=concurrency,
+        batch_size=1,
+        max_retries=max_retries,
+    ))
+    return finished
+
+
+def serve(monkeypatch, limited):
+    server = CompletionServer(limited)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setenv("OPENAI_BASE_URL", f"http://127.0.0.1:{server.server_port}/v1")
+    return server
+
+
+def test_rate_limit_pauses_every_worker(monkeypatch):
+    server = serve(monkeypatch, limited=1)
+    bookmarks = [{"id": i, "text": f"Bookmark {i}"} for i in range(8)]
+    try:
+        finished = run(server, bookmarks, concurrency=4)
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    # The rate limited batch was retried, and every batch finished once
+    assert sorted(finished) == list(range(8))
+    assert len(server.requests) == 9
+    limited_at = server.requests[0][0]
+    # Requests sent by the other workers before the 429 arrive with it, the rest wait it out
+    later = [received for received, _ in server.requests[1:] if received > limited_at + 0.05]
+    assert later
+    assert all(received >= limited_at + RETRY_AFTER * 0.9 for received in later)
+
+
+def test_batch_is_skipped_after_max_retries(monkeypatch):
+    server = serve(monkeypatch, limited=3)
+    monkeypatch.setattr(pipeline, "retry_delay", lambda error, attempt: 0.01)
+    try:
+        finished = run(server, [{"id": 1, "text": "Bookmark 1"}], concurrency=1, max_retries=2)
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    assert finished == []
+    assert [status for _, status in server.requests] == [429, 429, 429]
@@ -0,0 +1,45 @@
+import os
+
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
+import pipeline
+from checkpoint import GraphCheckpoint
+
+BOOKMARKS = [
+    {"id": 1, "text": "Ada Lovelace wrote the first program"},
+    {"id": 2, "text": "Alan Turing described the universal machine"},
+    {"id": 3, "text": "Grace Hopper built the first compiler"},
+]
+
+
+def build(checkpoint, failing_ids, monkeypatch):
+    """One run of the serial build, resuming from the checkpoint, with extraction failing for `failing_ids`."""
+    def extract_nodes(bookmark, current_nodes, cache=None):
+        if bookmark["id"] in failing_ids:
+            raise ConnectionError("API unavailable")
+        return [{"id": f"{bookmark['id']}_0", "text": bookmark["text"], "label": bookmark["text"].split()[1]}]
+
+    monkeypatch.setattr(pipeline, "extract_nodes", extract_nodes)
+    monkeypatch.setattr(pipeline, "extract_edges", lambda data, cache=None, bookmark=None: [])
+
+    done = checkpoint.processed_ids()
+    pending = [bookmark for bookmark in BOOKMARKS if str(bookmark["id"]) not in done]
+    extracted = []
+
+    def on_result(batch, nodes, edges):
+        checkpoint.save([bookmark["id"] for bookmark in batch], nodes, edges)
+        extracted.extend(bookmark["id"] for bookmark in batch)
+
+    pipeline.run_serial(pending, context=lambda batch: ([], []), on_result=on_result)
+    return extracted
+
+
+def test_failed_extraction_is_retried_on_resume(tmp_path, monkeypatch):
+    checkpoint = GraphCheckpoint(str(tmp_path / "checkpoint.db"))
+
+    assert build(checkpoint, {2}, monkeypatch) == [1, 3]
+    assert checkpoint.processed_ids() == {"1", "3"}
+
+    assert build(checkpoint, set(), monkeypatch) == [2]
+    assert checkpoint.processed_ids() == {"1", "2", "3"}
+    checkpoint.close()
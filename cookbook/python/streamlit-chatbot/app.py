@@ -2,10 +2,11 @@ import streamlit as st
 import weaviate
 from weaviate.classes.init import Auth
 from weaviate.classes.config import Configure
-from surfer_protocol import SurferClient
+from surfer_protocol import SurferClient, ResponseCache
 from openai import OpenAI
-from helpers import chunk_object
-surfer = SurferClient()
+from ingest import Manifest, sync_records
+# Streamlit reruns this script on every interaction, so cache exports locally
+surfer = SurferClient(cache=ResponseCache())
 
 openai_client = OpenAI(api_key=st.secrets["OPENAI_API_KEY"])
 
@@ -69,15 +70,27 @@ with tab_intro:
             - OPENAI_API_KEY
         """)
 
-# Set up Weaviate Cloud: https://weaviate.io/developers/wcs/quickstart
-weaviate_client = weaviate.connect_to_weaviate_cloud(
-    cluster_url=st.secrets["WEAVIATE_URL"],
-    auth_credentials=Auth.api_key(st.secrets["WEAVIATE_API_KEY"]),
-    headers={"X-OpenAI-API-Key": st.secrets["OPENAI_API_KEY"]}
-)
+if st.secrets.get("WEAVIATE_EMBEDDED"):
+    # Local Weaviate run by the client itself, handy for testing without a cloud instance
+    weaviate_client = weaviate.connect_to_embedded(
+        persistence_data_path=".weaviate",
+        headers={"X-OpenAI-API-Key": st.secrets["OPENAI_API_KEY"]}
+    )
+else:
+    # Set up Weaviate Cloud: https://weaviate.io/developers/wcs/quickstart
+    weaviate_client = weaviate.connect_to_weaviate_cloud(
+        cluster_url=st.secrets["WEAVIATE_URL"],
+        auth_credentials=Auth.api_key(st.secrets["WEAVIATE_API_KEY"]),
+        headers={"X-OpenAI-API-Key": st.secrets["OPENAI_API_KEY"]}
+    )
+
+# Content hashes of what's already in Weaviate, so only new or changed chunks are re-embedded
+manifest = Manifest()
 
 current_collections = weaviate_client.collections.list_all()
 if "Data" not in current_collections:
+    # A new collection holds none of the chunks the manifest remembers
+    manifest.clear()
     data_collection = weaviate_client.collections.create(
         name="Data",
         vectorizer_config=Configure.Vectorizer.text2vec_openai(),
@@ -105,38 +118,44 @@ with tab_data:
 
     if delete_data_button:
         weaviate_client.collections.delete("Data")
+        manifest.clear()
         st.write("Data deleted from Weaviate!")
 
+    def to_properties(obj):
+        return {
+            # choose the specific properties to add to the vector db
+
+            # to get the properties, check out the schema for the specific platform here:
+
+            # https://docs.surferprotocol.org/desktop/platforms
+
+            # example for bookmarks-001:
+            # "tweet_id": obj['id'],
+            # "text": obj['text'],
+            # "username": obj['username'],
+
+            # example for connections-001:
+            # "first_name": obj['first_name'],
+            # "last_name": obj['last_name'],
+            # "headline": obj['headline'],
+        }
+
     if add_data_button:
         # replace with the platform ID you want to add data for
-        all_data = surfer.get('platform-001')
-        with data_collection.batch.dynamic() as batch:
-            for data in all_data['data']['content']:
-                    try:
-                        chunked_objects = chunk_object(data)
-                        for obj in chunked_objects:
-                            batch.add_object(
-                                properties={
-                                    # choose the specific properties to add to the vector db
-
-                                    # to get the properties, check out the schema for the specific platform here:
-
-                                    # https://docs.surferprotocol.org/desktop/platforms
-
-                                    # example for bookmarks-001:
-                                    # "tweet_id": obj['id'],
-                                    # "text": obj['text'],
-                                    # "username": obj['username'],
-
-                                    # example for connections-001:
-                                    # "first_name": obj['first_name'],
-                                    # "last_name": obj['last_name'],
-                                    # "headline": obj['headline'],
-                                },
-                            )
-                    except Exception as e:
-                        st.error(f"Error adding data: {str(e)}")
-        st.success("Data added successfully!")
+        platform_id = 'platform-001'
+        all_data = surfer.get(platform_id)
+        try:
+            # Objects get IDs derived from the platform, record and chunk, so
+            # unchanged chunks are skipped and changed ones replaced in place
+            stats = sync_records(data_collection, platform_id, all_data['data']['content'], manifest, to_properties)
+            if stats["failed"]:
+                st.error(f"{stats['failed']} chunks couldn't be added, they will be retried next time")
+            st.success(
+                f"Data added successfully! {stats['added']} new or changed chunks, "
+                f"{stats['unchanged']} unchanged, {stats['deleted']} removed."
+            )
+        except Exception as e:
+            st.error(f"Error adding data: {str(e)}")
 
     if existing_data and not delete_data_button:
         data_count = sum(1 for _ in existing_data)
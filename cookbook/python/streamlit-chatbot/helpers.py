@@ -1,42 +1,168 @@
+import re
+from collections import deque
+from typing import Callable, Iterable, Iterator, NamedTuple, Optional
+
+# Where a sentence ends: after ., ! or ? followed by whitespace, or at a blank line
+SENTENCE_END = re.compile(r'(?<=[.!?])\s+|\n\s*\n')
+WORD_END = re.compile(r'\s+')
+
+
+class Chunk(NamedTuple):
+    """A view of part of a record's text, by offsets into the original string.
+
+    Nothing is copied until `text` or `properties()` is read, and every chunk
+    of a record shares that record's metadata.
+    """
+    source: dict
+    index: int
+    start: int
+    end: int
+    field: str = 'text'
+
+    @property
+    def source_id(self):
+        return self.source.get('id')
+
+    @property
+    def text(self) -> Optional[str]:
+        value = self.source.get(self.field)
+        return value[self.start:self.end] if isinstance(value, str) else value
+
+    def properties(self) -> dict:
+        """The record's properties with the text replaced by this chunk's text."""
+        if self.field not in self.source:
+            return dict(self.source)
+        return {**self.source, self.field: self.text}
+
+
+def iter_chunks(obj: dict, chunk_size: int = 1000, overlap: int = 200,
+                tokenizer: Optional[Callable[[str], int]] = None, field: str = 'text') -> Iterator[Chunk]:
+    """
+    Lazily split the text property of an object into overlapping chunks.
+
+    Chunks end on sentence boundaries where possible, then on whitespace.
+    Only a sentence longer than a whole chunk is cut mid-word, and only
+    when sizes are measured in characters. Each chunk starts with the end
+    of the previous one: whole sentences when they fit in the overlap,
+    otherwise the last words of the sentence the previous chunk ended with.
+
+    Args:
+        obj (dict): The input object containing properties including 'text'
+        chunk_size (int): Maximum size of each chunk, in characters or tokens
+        overlap (int): At most how much of the end of a chunk is repeated at the start of the next
+        tokenizer (callable): Optional function returning the number of tokens in a string.
+            When given, chunk_size and overlap are measured in tokens instead of characters
+        field (str): The property to chunk
+
+    Yields:
+        Chunk: Views of the text, in order
+    """
+    text = obj.get(field)
+    if not isinstance(text, str) or (len(text) <= chunk_size and tokenizer is None):
+        yield Chunk(obj, 0, 0, len(text) if isinstance(text, str) else 0, field)
+        return
+
+    def size(start, end):
+        return tokenizer(text[start:end]) if tokenizer else end - start
+
+    # Sentences (and pieces of over-long ones) waiting to be emitted, as (start, end, size)
+    window = deque()
+    total = 0
+    index = 0
+    by_chars = tokenizer is None
+    for start, end in _spans(text, chunk_size, overlap, size, by_chars):
+        span_size = size(start, end)
+        if window and total + span_size > chunk_size:
+            yield Chunk(obj, index, window[0][0], window[-1][1], field)
+            index += 1
+            # Keep the trailing sentences that fit in the overlap for the next chunk
+            while window and (total > overlap or total + span_size > chunk_size):
+                popped = window.popleft()
+                total -= popped[2]
+            # And the end of the sentence before them, when it is too long to keep whole
+            room = min(overlap, chunk_size - span_size) - total
+            tail_start = _tail(text, popped[0], popped[1], room, size, by_chars) if room > 0 else None
+            if tail_start is not None:
+                tail_size = size(tail_start, popped[1])
+                window.appendleft((tail_start, popped[1], tail_size))
+                total += tail_size
+        window.append((start, end, span_size))
+        total += span_size
+
+    if window:
+        yield Chunk(obj, index, window[0][0], window[-1][1], field)
+
+
+def iter_record_chunks(records: Iterable[dict], **kwargs) -> Iterator[Chunk]:
+    """Chunk every record in turn, without holding more than one record's chunks."""
+    for record in records:
+        yield from iter_chunks(record, **kwargs)
+
+
 def chunk_object(obj, chunk_size=1000, overlap=200):
     """
     Chunks the text property of an object into smaller pieces with overlap.
-    
+
     Args:
         obj (dict): The input object containing properties including 'text'
         chunk_size (int): Maximum size of each chunk
         overlap (int): Number of characters to overlap between chunks
-        
+
     Returns:
         list: List of objects with the same properties but chunked text
     """
-    # If there's no text property or text is shorter than chunk_size, return original
-    if 'text' not in obj or len(obj['text']) <= chunk_size:
-        return [obj]
-    
-    text = obj['text']
-    chunks = []
+    return [chunk.properties() for chunk in iter_chunks(obj, chunk_size, overlap)]
+
+
+def _spans(text: str, chunk_size: int, overlap: int, size: Callable[[int, int], int],
+           by_chars: bool) -> Iterator[tuple]:
+    """Contiguous (start, end) spans covering the text, each at most chunk_size where possible."""
     start = 0
-    
-    while start < len(text):
-        # Get chunk of text
-        end = start + chunk_size
-        
-        # If this isn't the first chunk, include the overlap from the previous chunk
-        if start > 0:
-            start = start - overlap
-            
-        # Get the chunk
-        chunk = text[start:end]
-        
-        # Create new object with same properties but chunked text
-        new_obj = obj.copy()
-        new_obj['text'] = chunk
-
-        
-        chunks.append(new_obj)
-        
-        # Move start position for next chunk
-        start = end
-    
-    return chunks
\ No newline at end of file
+    for match in SENTENCE_END.finditer(text):
+        yield from _split_long(text, start, match.end(), chunk_size, overlap, size, by_chars)
+        start = match.end()
+    if start < len(text):
+        yield from _split_long(text, start, len(text), chunk_size, overlap, size, by_chars)
+
+
+def _split_long(text, start, end, chunk_size, overlap, size, by_chars):
+    if size(start, end) <= chunk_size:
+        yield (start, end)
+        return
+    # Sentence too long for one chunk, fall back to words
+    word_start = start
+    for match in WORD_END.finditer(text, start, end):
+        yield from _split_word(word_start, match.end(), chunk_size, overlap, by_chars)
+        word_start = match.end()
+    if word_start < end:
+        yield from _split_word(word_start, end, chunk_size, overlap, by_chars)
+
+
+def _split_word(start, end, chunk_size, overlap, by_chars):
+    # Only cut inside a word when sizes are characters, leaving room for the overlap
+    if by_chars and end - start > chunk_size:
+        step = chunk_size - overlap if 0 <= overlap < chunk_size else chunk_size
+        for piece in range(start, end, step):
+            yield (piece, min(piece + step, end))
+    else:
+        yield (start, end)
+
+
+def _tail(text, start, end, room, size, by_chars):
+    """Where the longest end of text[start:end] no larger than room starts, at a word where possible.
+
+    Returns None when nothing fits, which only happens when sizes are tokens:
+    in characters the cut falls inside the last word instead.
+    """
+    if by_chars:
+        cut = max(start, end - room)
+        if cut == start or text[cut - 1].isspace():
+            return cut
+        match = WORD_END.search(text, cut, end)
+        return match.end() if match and match.end() < end else cut
+    tail_start = None
+    for word_start in reversed([start] + [m.end() for m in WORD_END.finditer(text, start, end) if m.end() < end]):
+        if size(word_start, end) > room:
+            break
+        tail_start = word_start
+    return tail_start
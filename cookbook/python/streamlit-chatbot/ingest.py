@@ -0,0 +1,119 @@
+import hashlib
+import json
+import os
+import uuid
+from typing import Callable, Iterable
+
+from helpers import iter_chunks
+
+# Fixed namespace, so the same record chunk always gets the same object ID
+SURFER_NAMESPACE = uuid.uuid5(uuid.NAMESPACE_URL, "https://docs.surferprotocol.org")
+
+
+def object_uuid(platform_id: str, record_id: str, chunk_index: int) -> str:
+    """Deterministic Weaviate object ID for one chunk of one record."""
+    return str(uuid.uuid5(SURFER_NAMESPACE, f"{platform_id}/{record_id}/{chunk_index}"))
+
+
+# Fields exporters set to the time of the export, so they change on every
+# re-export of the same record. Left out of record keys and change detection,
+# like recordKey in the desktop app's since.ts
+VOLATILE_FIELDS = ("added_to_db",)
+
+
+def content_hash(properties: dict) -> str:
+    """Hash of the properties that identify a record's content, without `VOLATILE_FIELDS`."""
+    stable = {key: value for key, value in properties.items() if key not in VOLATILE_FIELDS}
+    return hashlib.sha256(json.dumps(stable, sort_keys=True, ensure_ascii=False, default=str).encode("utf-8")).hexdigest()
+
+
+def record_id(record: dict) -> str:
+    """The record's own ID, or a hash of its content when it has none."""
+    if record.get('id') is not None:
+        return str(record['id'])
+    return content_hash(record)[:32]
+
+
+class Manifest:
+    """Content hashes of the chunks already in Weaviate, per platform and record.
+
+    Stored as a local JSON file: {platform_id: {record_id: [chunk hashes]}}.
+    """
+
+    def __init__(self, path: str = ".surfer_manifest.json"):
+        self.path = path
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                self.entries = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            self.entries = {}
+
+    def chunks(self, platform_id: str, record_key: str) -> list:
+        return self.entries.get(platform_id, {}).get(record_key, [])
+
+    def set_chunks(self, platform_id: str, record_key: str, hashes: list):
+        self.entries.setdefault(platform_id, {})[record_key] = hashes
+
+    def clear(self):
+        self.entries = {}
+        self.save()
+
+    def save(self):
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.entries, f, separators=(",", ":"))
+        os.replace(tmp_path, self.path)
+
+
+def sync_records(collection, platform_id: str, records: Iterable[dict], manifest: Manifest,
+                 to_properties: Callable[[dict], dict], **chunk_kwargs) -> dict:
+    """Upsert only the new or changed chunks of records into a Weaviate collection.
+
+    Every chunk gets a deterministic UUID, so a changed chunk replaces its old
+    object instead of adding a duplicate, and unchanged chunks are never
+    re-embedded. Objects for chunks a record no longer has are deleted. The
+    manifest is only updated for chunks Weaviate accepted.
+
+    Returns counts of added, unchanged, deleted and failed chunks.
+    """
+    stats = {"added": 0, "unchanged": 0, "deleted": 0, "failed": 0}
+    pending = {}
+    stale = []
+
+    with collection.batch.dynamic() as batch:
+        for record in records:
+            key = record_id(record)
+            known = manifest.chunks(platform_id, key)
+            hashes = []
+            for chunk in iter_chunks(record, **chunk_kwargs):
+                properties = to_properties(chunk.properties())
+                digest = content_hash(properties)
+                hashes.append(digest)
+                if chunk.index < len(known) and known[chunk.index] == digest:
+                    stats["unchanged"] += 1
+                    continue
+                object_id = object_uuid(platform_id, key, chunk.index)
+                batch.add_object(properties=properties, uuid=object_id)
+                pending[object_id] = (key, chunk.index)
+                stats["added"] += 1
+
+            stale.extend(object_uuid(platform_id, key, index) for index in range(len(hashes), len(known)))
+            manifest.set_chunks(platform_id, key, hashes)
+
+    # Forget failed chunks so the next sync sends them again
+    for failed in collection.batch.failed_objects:
+        object_id = str(failed.original_uuid or failed.object_.uuid)
+        if object_id not in pending:
+            continue
+        key, index = pending[object_id]
+        manifest.chunks(platform_id, key)[index] = None
+        stats["failed"] += 1
+        stats["added"] -= 1
+
+    if stale:
+        from weaviate.classes.query import Filter
+        collection.data.delete_many(where=Filter.by_id().contains_any(stale))
+        stats["deleted"] = len(stale)
+
+    manifest.save()
+    return stats
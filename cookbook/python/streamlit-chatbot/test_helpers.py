@@ -0,0 +1,40 @@
+from helpers import iter_chunks
+
+SENTENCES = " ".join(
+    f"Sentence {i} is long enough that no two of them fit in the overlap together." for i in range(40)
+)
+
+
+def spans(text, chunk_size, overlap, tokenizer=None):
+    return [(chunk.start, chunk.end) for chunk in iter_chunks({"text": text}, chunk_size, overlap, tokenizer)]
+
+
+def assert_overlapping(chunks, overlap, size):
+    for (start, end), (next_start, next_end) in zip(chunks, chunks[1:]):
+        assert next_start < end < next_end
+        assert size(next_start, end) <= overlap
+
+
+def test_sentences_longer_than_the_overlap_still_overlap():
+    chunks = spans(SENTENCES, 250, 60)
+
+    assert len(chunks) > 2
+    assert_overlapping(chunks, 60, lambda start, end: end - start)
+
+
+def test_unbroken_text_overlaps():
+    chunks = spans("x" * 2500, 1000, 200)
+
+    assert chunks[0][0] == 0 and chunks[-1][1] == 2500
+    assert all(end - start <= 1000 for start, end in chunks)
+    assert_overlapping(chunks, 200, lambda start, end: end - start)
+
+
+def test_token_overlap_starts_on_a_word():
+    def words(text):
+        return len(text.split())
+
+    chunks = spans(SENTENCES, 40, 8, tokenizer=words)
+
+    assert_overlapping(chunks, 8, lambda start, end: words(SENTENCES[start:end]))
+    assert all(SENTENCES[start - 1] == " " for start, _ in chunks[1:])
@@ -0,0 +1,55 @@
+from contextlib import contextmanager
+
+from ingest import Manifest, sync_records
+
+EMAILS = [
+    {"accountID": "0", "subject": "Lunch", "body": "Noon at the usual place?", "added_to_db": "2024-11-01T10:00:00.000Z"},
+    {"accountID": "0", "subject": "Flights", "body": "Your booking is confirmed.", "added_to_db": "2024-11-01T10:00:00.000Z"},
+]
+
+
+class FakeCollection:
+    """Records the objects a sync sends, in place of a Weaviate collection."""
+
+    def __init__(self):
+        self.added = []
+        self.deleted = []
+        self.batch = self
+        self.data = self
+        self.failed_objects = []
+
+    @contextmanager
+    def dynamic(self):
+        yield self
+
+    def add_object(self, properties, uuid):
+        self.added.append(uuid)
+
+    def delete_many(self, where):
+        self.deleted.append(where)
+
+
+def test_reexport_with_new_added_to_db_sends_nothing(tmp_path):
+    manifest = Manifest(str(tmp_path / "manifest.json"))
+    first = FakeCollection()
+    assert sync_records(first, "gmail-001", EMAILS, manifest, dict)["added"] == 2
+
+    reexported = [dict(email, added_to_db="2024-11-02T10:00:00.000Z") for email in EMAILS]
+    second = FakeCollection()
+    stats = sync_records(second, "gmail-001", reexported, Manifest(manifest.path), dict)
+
+    assert second.added == []
+    assert second.deleted == []
+    assert stats == {"added": 0, "unchanged": 2, "deleted": 0, "failed": 0}
+
+
+def test_changed_record_without_id_is_sent_again(tmp_path):
+    manifest = Manifest(str(tmp_path / "manifest.json"))
+    sync_records(FakeCollection(), "gmail-001", EMAILS, manifest, dict)
+
+    edited = [EMAILS[0], dict(EMAILS[1], body="Your booking changed.")]
+    collection = FakeCollection()
+    stats = sync_records(collection, "gmail-001", edited, manifest, dict)
+
+    assert stats["added"] == 1
+    assert len(collection.added) == 1
@@ -0,0 +1,133 @@
+"""Contact resolution shared by the macOS and Windows iMessage exporters.
+
+Handles are resolved once per export into a temporary handle -> name table
+that the messages query joins, so matching costs nothing per message and
+works the same way on both platforms.
+"""
+import hashlib
+import json
+import os
+
+INDEX_FILE = 'contacts_index.json'
+INDEX_VERSION = 1
+
+# Phone number suffix lengths tried after the full number, most specific first
+PHONE_SUFFIXES = (11, 10, 7)
+# Shorter suffixes match too loosely to be trusted when several contacts share them
+MIN_UNAMBIGUOUS_SUFFIX = 10
+
+
+def phone_digits(value):
+    """Digits of a phone number, or '' for handles that aren't phone numbers."""
+    if not value or '@' in value:
+        return ''
+    digits = ''.join(c for c in value if c.isdigit())
+    return digits if len(digits) >= 7 else ''
+
+
+def phone_keys(digits):
+    """Lookup keys for a phone number, most specific first."""
+    keys = [digits]
+    for length in PHONE_SUFFIXES:
+        if len(digits) > length and digits[-length:] not in keys:
+            keys.append(digits[-length:])
+    return keys
+
+
+def build_index(rows):
+    """Build a key -> name index from (name, phone, email) rows.
+
+    The first contact seen for a key wins. Short phone suffixes shared by
+    different contacts are dropped since they can't identify anyone.
+    """
+    index = {}
+    ambiguous = set()
+    for name, phone, email in rows:
+        name = (name or '').strip()
+        if not name:
+            continue
+
+        if email:
+            index.setdefault(email.strip().lower(), name)
+
+        digits = phone_digits(phone)
+        if digits:
+            for key in phone_keys(digits):
+                if len(key) < MIN_UNAMBIGUOUS_SUFFIX and index.get(key, name) != name:
+                    ambiguous.add(key)
+                index.setdefault(key, name)
+
+    for key in ambiguous:
+        index.pop(key, None)
+    return index
+
+
+def resolve(handle, index):
+    """Resolve a handle ID (phone number or email) to a contact name, or None."""
+    if not handle:
+        return None
+    if '@' in handle:
+        return index.get(handle.strip().lower())
+
+    digits = phone_digits(handle)
+    if not digits:
+        return None
+    for key in phone_keys(digits):
+        if key in index:
+            return index[key]
+    return None
+
+
+def load_index(platform_dir, contacts_db_path, read_rows):
+    """Return the contact index for an address book, reusing the cached one.
+
+    The cache in the platform folder is keyed by a hash of the address book
+    files, so it is rebuilt only when contacts change. `read_rows` is called
+    to produce the (name, phone, email) rows on a cache miss.
+    """
+    fingerprint = _fingerprint(contacts_db_path)
+    cache_path = os.path.join(platform_dir, INDEX_FILE)
+    try:
+        with open(cache_path, 'r', encoding='utf-8') as f:
+            cached = json.load(f)
+        if cached.get('version') == INDEX_VERSION and cached.get('fingerprint') == fingerprint:
+            return cached['index']
+    except (FileNotFoundError, json.JSONDecodeError, KeyError):
+        pass
+
+    index = build_index(read_rows())
+
+    os.makedirs(platform_dir, exist_ok=True)
+    tmp_path = cache_path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({'version': INDEX_VERSION, 'fingerprint': fingerprint, 'index': index}, f, ensure_ascii=False)
+    os.replace(tmp_path, cache_path)
+    return index
+
+
+def create_handle_names(messages_db, index):
+    """Resolve every handle once into the temp table `handle_name(ROWID, name)`.
+
+    Join it in the messages query with
+    `LEFT JOIN temp.handle_name ON handle_name.ROWID = message.handle_id`.
+    Temp tables live outside the main database, so this also works on
+    connections opened read-only.
+    """
+    messages_db.execute("DROP TABLE IF EXISTS temp.handle_name")
+    messages_db.execute("CREATE TEMP TABLE handle_name (ROWID INTEGER PRIMARY KEY, name TEXT)")
+    handles = messages_db.execute("SELECT ROWID, id FROM handle").fetchall()
+    messages_db.executemany(
+        "INSERT INTO temp.handle_name VALUES (?, ?)",
+        ((rowid, resolve(handle, index) or handle) for rowid, handle in handles),
+    )
+
+
+def _fingerprint(path):
+    digest = hashlib.sha1()
+    # The write-ahead log may hold changes not yet in the main file
+    for part in (path, path + '-wal'):
+        if os.path.exists(part):
+            with open(part, 'rb') as f:
+                for block in iter(lambda: f.read(1024 * 1024), b''):
+                    digest.update(block)
+    return digest.hexdigest()
@@ -0,0 +1,272 @@
+"""Helpers shared by the macOS and Windows iMessage exporters."""
+import json
+import os
+import sqlite3
+import time
+from urllib.request import pathname2url
+
+# Rows fetched from SQLite per round trip
+BATCH_SIZE = 5000
+# Print a progress line every this many exported messages
+PROGRESS_EVERY = 50000
+
+# Seconds from the Unix epoch to Apple's reference date, 2001-01-01 UTC
+APPLE_EPOCH_OFFSET = 978307200
+# Values for --timestamps: ISO 8601 strings or Unix epoch milliseconds
+TIMESTAMP_FORMATS = ('iso', 'epoch')
+
+EXPORT_FILE = 'imessage-001.json'
+STATE_FILE = 'export_state.json'
+CONTENT_MARKER = b',"content":['
+# Incremental runs in a row before a full export starts a new chain, so
+# readers never have to compose more than this many delta files
+MAX_DELTAS = 24
+# Pages copied per step when taking a backup snapshot
+BACKUP_PAGES = 16384
+
+
+def parse_args(argv):
+    """Split command line arguments into positional values and --flags.
+
+    Flags may appear anywhere, so the positional order the desktop app relies
+    on is unchanged. `--name=value` flags are returned as strings and bare
+    `--name` flags as True.
+    """
+    positional = []
+    flags = {}
+    for arg in argv:
+        if arg.startswith('--'):
+            name, _, value = arg[2:].partition('=')
+            flags[name.replace('-', '_')] = value or True
+        else:
+            positional.append(arg)
+    return positional, flags
+
+
+def timestamp_sql(column, timestamp_format='iso', localtime=False):
+    """SQL expression converting an Apple nanosecond timestamp column.
+
+    Doing the conversion in the query keeps it out of the per-row Python loop.
+    'iso' gives an ISO 8601 string with millisecond precision, in local time
+    when `localtime` is set. 'epoch' gives Unix epoch milliseconds as an
+    integer. Values SQLite can't convert come back as NULL.
+    """
+    if timestamp_format == 'epoch':
+        return f"(CAST({column} / 1000000 AS INTEGER) + {APPLE_EPOCH_OFFSET * 1000})"
+    modifiers = "'unixepoch', 'localtime'" if localtime else "'unixepoch'"
+    return f"strftime('%Y-%m-%dT%H:%M:%f', {column} / 1000000000.0 + {APPLE_EPOCH_OFFSET}, {modifiers})"
+
+
+def messages_query(timestamp_format='iso', localtime=False):
+    """The export query for messages with ROWID in (?, ?], newest first.
+
+    Rows are (id, text, timestamp, contact, is_from_me), with contact names
+    from the temp.handle_name table made by `create_handle_names`.
+    """
+    return f"""
+        SELECT
+            message.ROWID,
+            message.text,
+            {timestamp_sql('message.date', timestamp_format, localtime)} as timestamp,
+            COALESCE(handle_name.name, handle.id) as contact,
+            message.is_from_me
+        FROM message
+        LEFT JOIN handle ON message.handle_id = handle.ROWID
+        LEFT JOIN temp.handle_name ON message.handle_id = handle_name.ROWID
+        WHERE message.ROWID > ? AND message.ROWID <= ?
+        ORDER BY message.date DESC
+        """
+
+
+def content_span(export_path):
+    """Byte offsets (start, end) of the records in an export made by `write_export`.
+
+    Returns None when the file is missing or wasn't finished.
+    """
+    try:
+        size = os.path.getsize(export_path)
+        with open(export_path, 'rb') as f:
+            start = f.read(64 * 1024).find(CONTENT_MARKER)
+            f.seek(max(0, size - 2))
+            finished = f.read() == b']}'
+    except OSError:
+        return None
+    if start < 0 or not finished:
+        return None
+    return start + len(CONTENT_MARKER), size - 2
+
+
+def export_header(export_path):
+    """The header of a finished export made by `write_export`, or None."""
+    span = content_span(export_path)
+    if not span:
+        return None
+    with open(export_path, 'rb') as f:
+        prefix = f.read(span[0] - len(CONTENT_MARKER))
+    try:
+        return json.loads(prefix + b'}')
+    except ValueError:
+        return None
+
+
+def write_export(output_path, header, records, progress_every=PROGRESS_EVERY):
+    """Write the export JSON document incrementally, one record at a time.
+
+    The file has the same structure as a single json.dump of the header with a
+    'content' list, but memory stays bounded and records reach disk as they are
+    produced. Returns the number of records written.
+    """
+    count = 0
+    with open(output_path, 'w', encoding='utf-8') as f:
+        f.write(json.dumps(header, ensure_ascii=False, separators=(',', ':'))[:-1])
+        f.write(',"content":[')
+        for record in records:
+            if count:
+                f.write(',')
+            f.write(json.dumps(record, ensure_ascii=False, separators=(',', ':')))
+            count += 1
+            if count % progress_every == 0:
+                print(f"Exported {count} messages", flush=True)
+        f.write(']}')
+    return count
+
+
+def chain_is_complete(platform_dir, run_id, side_files=()):
+    """Whether a run's export, and those of the runs it builds on, are all finished.
+
+    Incremental runs only hold the messages added since the run named in
+    their header's 'previous_run', so readers need the whole chain.
+    """
+    while run_id:
+        run_dir = os.path.join(platform_dir, run_id)
+        header = export_header(os.path.join(run_dir, EXPORT_FILE))
+        if header is None or not all(os.path.exists(os.path.join(run_dir, name)) for name in side_files):
+            return False
+        run_id = header.get('previous_run')
+    return True
+
+
+def load_state(platform_dir, source):
+    """Return the saved incremental export state for a message database, if any."""
+    try:
+        with open(os.path.join(platform_dir, STATE_FILE), 'r', encoding='utf-8') as f:
+            return json.load(f).get(source)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+def save_state(platform_dir, source, last_rowid, run_id, options=None, messages=None, deltas=0):
+    """Record the highest message ROWID exported from a database by a run.
+
+    `options` are the export options that shape the run's files, `messages`
+    the number of messages up to and including the run, and `deltas` how
+    many incremental runs in a row led to it.
+    """
+    path = os.path.join(platform_dir, STATE_FILE)
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        state = {}
+
+    state[source] = {
+        'last_rowid': last_rowid,
+        'run_id': run_id,
+        'options': options or {},
+        'messages': messages,
+        'deltas': deltas,
+        'updated': int(time.time()),
+    }
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f)
+    os.replace(tmp_path, path)
+
+
+def rowid_range(messages_cursor, platform_dir, source, run_id, incremental, options=None, side_files=()):
+    """Pick the ROWID window for this run as (after_rowid, max_rowid, previous).
+
+    The upper bound is fixed before exporting so messages arriving mid-run are
+    picked up by the next run. Full exports start from 0. Incremental runs
+    start after the last run of the same database when its chain of exports,
+    and any `side_files`, are complete and were made with the same `options`.
+    `previous` is then the state of that run, which this run's delta builds
+    on, and None otherwise. Every `MAX_DELTAS` runs a full export is made.
+    """
+    messages_cursor.execute("SELECT COALESCE(MAX(ROWID), 0) FROM message")
+    max_rowid = messages_cursor.fetchone()[0]
+
+    if not incremental:
+        return 0, max_rowid, None
+
+    state = load_state(platform_dir, source)
+    if not state or state.get('run_id') == run_id:
+        return 0, max_rowid, None
+
+    reason = None
+    # A database with fewer rows than last time was replaced
+    if state['last_rowid'] > max_rowid:
+        reason = 'the Messages database was replaced'
+    elif state.get('options', {}) != (options or {}):
+        reason = 'the export options changed'
+    elif (state.get('deltas') or 0) >= MAX_DELTAS:
+        reason = f"the last {MAX_DELTAS} runs were incremental"
+    elif not chain_is_complete(platform_dir, state['run_id'], side_files):
+        reason = f"the exports {state['run_id']} builds on are incomplete"
+    if reason:
+        print(f"Exporting all messages, as {reason}", flush=True)
+        return 0, max_rowid, None
+
+    print(f"Incremental export of messages after ROWID {state['last_rowid']}", flush=True)
+    return state['last_rowid'], max_rowid, state
+
+
+def open_readonly(db_path):
+    """Open a SQLite database in place without write access.
+
+    Unlike `immutable=1`, `mode=ro` still reads the write-ahead log, so
+    messages not yet checkpointed into the main file are included.
+    """
+    return sqlite3.connect(f"file:{pathname2url(os.path.abspath(db_path))}?mode=ro", uri=True)
+
+
+def backup_snapshot(db_path, snapshot_path):
+    """Take a consistent copy of a live database with the SQLite backup API.
+
+    Pages are copied in steps so progress can be reported and the source is
+    never locked for the whole copy. Returns a connection to the snapshot.
+    """
+    reported = [-1]
+
+    def progress(status, remaining, total):
+        percent = (total - remaining) * 100 // total if total else 100
+        if percent // 10 > reported[0] // 10:
+            reported[0] = percent
+            print(f"Snapshot {percent}% of the Messages database", flush=True)
+
+    source = open_readonly(db_path)
+    snapshot = sqlite3.connect(snapshot_path)
+    try:
+        source.backup(snapshot, pages=BACKUP_PAGES, progress=progress)
+    finally:
+        source.close()
+    return snapshot
+
+
+def open_messages_db(db_path, snapshot_path, mode='readonly'):
+    """Open the Messages database for export as (connection, snapshot_path).
+
+    'readonly' reads the database in place and falls back to a backup snapshot
+    if it can't be opened that way. 'backup' always snapshots to
+    `snapshot_path`, which the caller removes afterwards. The returned path is
+    None when no snapshot was made.
+    """
+    if mode == 'readonly':
+        try:
+            conn = open_readonly(db_path)
+            conn.execute("SELECT 1 FROM message LIMIT 1").fetchall()
+            return conn, None
+        except sqlite3.OperationalError as e:
+            print(f"Couldn't read the Messages database in place ({e}), taking a snapshot instead", flush=True)
+
+    return backup_snapshot(db_path, snapshot_path), snapshot_path
@@ -1,10 +1,22 @@
 import sys
-import sqlite3
 import json
 import os
-from datetime import datetime
-import re
-
+from imessage_contacts import create_handle_names, load_index
+from imessage_rich import RICH_FILE, export_rich
+from imessage_export import BATCH_SIZE, EXPORT_FILE, PROGRESS_EVERY, TIMESTAMP_FORMATS, messages_query, open_messages_db, open_readonly, parse_args, rowid_range, save_state, write_export
+
+# Contacts with a name, one row per (name, phone, email) combination
+CONTACTS_QUERY = """
+    SELECT
+        TRIM(COALESCE(ZABCDRECORD.ZFIRSTNAME, '') || ' ' || COALESCE(ZABCDRECORD.ZLASTNAME, '')) as full_name,
+        ZABCDPHONENUMBER.ZFULLNUMBER as phone_number,
+        ZABCDEMAILADDRESS.ZADDRESS as email
+    FROM ZABCDRECORD
+    LEFT JOIN ZABCDPHONENUMBER ON ZABCDRECORD.Z_PK = ZABCDPHONENUMBER.ZOWNER
+    LEFT JOIN ZABCDEMAILADDRESS ON ZABCDRECORD.Z_PK = ZABCDEMAILADDRESS.ZOWNER
+    WHERE ZABCDRECORD.ZFIRSTNAME IS NOT NULL
+        OR ZABCDRECORD.ZLASTNAME IS NOT NULL
+"""
 
 def get_contacts_db_path(username):
     """Find the path to the macOS AddressBook SQLite database."""
@@ -25,21 +37,24 @@ def get_contacts_db_path(username):
 
     raise FileNotFoundError('No AddressBook database found in Sources.')
 
-def apple_time_to_iso(timestamp):
-    """Convert Apple's timestamp to ISO 8601 format."""
-    if timestamp is None:
-        return None
-    try:
-        unix_timestamp = timestamp / 1e9 + 978307200
-        dt = datetime.fromtimestamp(unix_timestamp)
-        return dt.isoformat()
-    except (ValueError, OverflowError) as e:
-        print(f"Warning: Invalid timestamp {timestamp}: {str(e)}")
-        return None
+def iter_messages(messages_cursor, batch_size=BATCH_SIZE):
+    """Yield exported message records, fetching rows in batches."""
+    while True:
+        rows = messages_cursor.fetchmany(batch_size)
+        if not rows:
+            break
+
+        for msg_id, text, timestamp, contact_name, is_from_me in rows:
+            if text is None:
+                continue
 
-def clean_phone_number(phone):
-    """Remove non-digit characters from phone number."""
-    return re.sub(r'\D', '', phone) if phone else ''
+            yield {
+                'id': msg_id,
+                'text': text,
+                'timestamp': timestamp,
+                'contact': contact_name,
+                'is_from_me': bool(is_from_me)
+            }
 
 def check_database_access(db_path):
     """Check if we have access to the Messages database."""
@@ -58,15 +73,24 @@ def check_database_access(db_path):
 def main():
     try:
         
-        if len(sys.argv) < 5:
+        args, flags = parse_args(sys.argv[1:])
+        if len(args) < 4:
             print("Error: Not enough arguments provided")
-            print("Usage: python imessage_mac.py <company> <name> <id> <app_data_path>")
+            print("Usage: python imessage_mac.py <company> <name> <id> <app_data_path> [--incremental] [--snapshot=readonly|backup] [--timestamps=iso|epoch] [--extended] [--copy-attachments]")
             sys.exit(1)
 
-        company = sys.argv[1]
-        platform_name = sys.argv[2]
-        run_id = sys.argv[3]
-        app_data_path = sys.argv[4]
+        company = args[0]
+        platform_name = args[1]
+        run_id = args[2]
+        app_data_path = args[3]
+        incremental = bool(flags.get('incremental'))
+        snapshot_mode = flags.get('snapshot', 'readonly')
+        timestamp_format = flags.get('timestamps', 'iso')
+        copy_attachments = bool(flags.get('copy_attachments'))
+        extended = bool(flags.get('extended')) or copy_attachments
+        if timestamp_format not in TIMESTAMP_FORMATS:
+            print(f"Error: --timestamps must be one of {', '.join(TIMESTAMP_FORMATS)}")
+            sys.exit(1)
 
         username = os.environ.get('USER')
         if not username:
@@ -79,7 +103,7 @@ def main():
             print("Error: iMessage database not found!")
             sys.exit(1)
 
-        # Check database access before attempting to copy
+        # Check database access before attempting to open it
         check_database_access(messages_db_path)
 
         # Fix the path to ensure use "Application Support" instead of just "Application" - A wierd electron quirk, ask Chat to learn more
@@ -88,113 +112,68 @@ def main():
         elif '/Library/Application/' in app_data_path:
             app_data_path = app_data_path.replace('/Library/Application/', '/Library/Application Support/')
             
-        output_dir = os.path.join(app_data_path, 'exported_data', company, platform_name, run_id)
+        platform_dir = os.path.join(app_data_path, 'exported_data', company, platform_name)
+        output_dir = os.path.join(platform_dir, run_id)
         os.makedirs(output_dir, exist_ok=True)
 
-        # Copy and connect to Messages database
-        temp_db_path = os.path.join(output_dir, 'chat.db')
-        os.system(f'cp "{messages_db_path}" "{temp_db_path}"')
-        
-        messages_db = sqlite3.connect(temp_db_path)
+        # Read the Messages database in place, or from a consistent snapshot
+        messages_db, temp_db_path = open_messages_db(
+            messages_db_path, os.path.join(output_dir, 'chat.db'), snapshot_mode
+        )
         messages_cursor = messages_db.cursor()
 
-        # Fetch messages
-        messages_query = """
-        SELECT 
-            message.ROWID as id,
-            message.text,
-            message.date,
-            handle.id as contact_id,
-            message.is_from_me
-        FROM message 
-        LEFT JOIN handle ON message.handle_id = handle.ROWID
-        ORDER BY message.date DESC
-        """
-        messages_cursor.execute(messages_query)
-        messages = messages_cursor.fetchall()
-
-        # Connect to and query contacts database
-        contacts_db = sqlite3.connect(get_contacts_db_path(username))
-        contacts_cursor = contacts_db.cursor()
-
-        contacts_query = """
-        SELECT 
-            ZABCDRECORD.ZFIRSTNAME as first_name,
-            ZABCDRECORD.ZLASTNAME as last_name,
-            ZABCDPHONENUMBER.ZFULLNUMBER as phone_number,
-            ZABCDEMAILADDRESS.ZADDRESS as email
-        FROM ZABCDRECORD
-        LEFT JOIN ZABCDPHONENUMBER ON ZABCDRECORD.Z_PK = ZABCDPHONENUMBER.ZOWNER
-        LEFT JOIN ZABCDEMAILADDRESS ON ZABCDRECORD.Z_PK = ZABCDEMAILADDRESS.ZOWNER
-        WHERE ZABCDRECORD.ZFIRSTNAME IS NOT NULL 
-            OR ZABCDRECORD.ZLASTNAME IS NOT NULL
-        """
-        contacts_cursor.execute(contacts_query)
-        contacts = contacts_cursor.fetchall()
-
-        # Create contact mapping
-        contact_dict = {}
-        for first_name, last_name, phone, email in contacts:
-            full_name = f"{first_name or ''} {last_name or ''}".strip()
-            if not full_name:
-                continue
-
-            if phone:
-                clean_phone = clean_phone_number(phone)
-                if clean_phone:
-                    contact_dict[f"+{clean_phone}"] = full_name
-                    contact_dict[clean_phone] = full_name
-                    contact_dict[f"+1{clean_phone}"] = full_name
-
-            if email:
-                contact_dict[email.lower()] = full_name
-
-        # Process messages
-        message_list = []
-        for msg_id, text, date, contact_id, is_from_me in messages:
-            if text is None:
-                continue
-
-            contact_name = contact_id
-            if contact_id:
-                if re.match(r'^\+?[\d-]+$', contact_id):
-                    clean_contact = clean_phone_number(contact_id)
-                    contact_name = (
-                        contact_dict.get(contact_id) or
-                        contact_dict.get(f"+{clean_contact}") or
-                        contact_dict.get(clean_contact) or
-                        contact_dict.get(f"+1{clean_contact}") or
-                        contact_id
-                    )
-                else:
-                    contact_name = contact_dict.get(contact_id.lower(), contact_id)
-
-            message_list.append({
-                'id': msg_id,
-                'text': text,
-                'timestamp': apple_time_to_iso(date),
-                'contact': contact_name,
-                'is_from_me': bool(is_from_me)
-            })
-
-        # Prepare output
-        output = {
+        # Fetch messages. Incremental runs only read rows added since the last
+        # run and export them as a delta on top of that run's export
+        options = {'timestamp_format': timestamp_format, 'extended': extended, 'copy_attachments': copy_attachments}
+        after_rowid, max_rowid, previous = rowid_range(
+            messages_cursor, platform_dir, messages_db_path, run_id, incremental, options,
+            side_files=(RICH_FILE,) if extended else (),
+        )
+        # Resolve every handle to a contact name once, in SQL. The index is
+        # cached in the platform folder until the AddressBook changes
+        contacts_db_path = get_contacts_db_path(username)
+        contacts_db = open_readonly(contacts_db_path)
+        contact_index = load_index(platform_dir, contacts_db_path, lambda: contacts_db.execute(CONTACTS_QUERY))
+        create_handle_names(messages_db, contact_index)
+
+        # Stream messages straight from the cursor into the export file
+        messages_cursor.execute(
+            messages_query(timestamp_format, localtime=True),
+            (after_rowid, max_rowid),
+        )
+        header = {
             'company': company,
             'name': platform_name,
             'runID': run_id,
             'timestamp': int(run_id.split('-')[-1]),
-            'content': message_list
         }
-
-        # Save to file
-        output_path = os.path.join(output_dir, 'imessage-001.json')
-        with open(output_path, 'w', encoding='utf-8') as f:
-            json.dump(output, f, indent=2, ensure_ascii=False)
+        if previous:
+            header['previous_run'] = previous['run_id']
+        if timestamp_format == 'epoch':
+            header['timestamp_format'] = 'epoch_ms'
+        output_path = os.path.join(output_dir, EXPORT_FILE)
+        count = write_export(
+            output_path, header, iter_messages(messages_cursor),
+        )
+        total = count + (previous.get('messages') or 0) if previous else count
+        deltas = (previous.get('deltas') or 0) + 1 if previous else 0
+        print(f"Exported {count} new messages, {total} in total" if previous else f"Exported {count} messages", flush=True)
+
+        # Chats, attachments and attributedBody-only text go to a side file
+        if extended:
+            rich_count = export_rich(
+                messages_db, platform_dir, output_dir, after_rowid, max_rowid,
+                resolve_path=os.path.expanduser, copy_attachments=copy_attachments,
+                progress_every=PROGRESS_EVERY,
+            )
+            print(f"Exported details of {rich_count} messages", flush=True)
+        save_state(platform_dir, messages_db_path, max_rowid, run_id, options, total, deltas)
 
         # Clean up
         messages_db.close()
         contacts_db.close()
-        os.remove(temp_db_path)
+        if temp_db_path:
+            os.remove(temp_db_path)
 
         # Print output directory for the TypeScript code to capture
         print(output_dir)
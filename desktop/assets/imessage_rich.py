@@ -0,0 +1,211 @@
+"""Extended iMessage export: chats, attachments and attributedBody text.
+
+Written as a newline-delimited side file next to the main export, so the main
+message stream keeps its shape and size. Attachments are hashed, and only
+copied when asked, into a content-addressed folder shared by all runs.
+"""
+import hashlib
+import json
+import os
+import shutil
+from itertools import groupby
+
+from imessage_export import BATCH_SIZE
+
+RICH_FILE = 'imessage-rich-001.ndjson'
+ATTACHMENTS_DIR = 'attachments'
+HASH_CACHE_FILE = 'attachment_hashes.ndjson'
+# chat.style for group conversations
+GROUP_CHAT_STYLE = 43
+
+
+def decode_attributed_body(blob):
+    """Extract the plain text from an NSAttributedString typedstream blob.
+
+    Messages sent from recent iOS and macOS versions often only store their
+    text here. Returns None when the blob holds no string.
+    """
+    if not blob:
+        return None
+    _, marker, rest = bytes(blob).partition(b'NSString')
+    if not marker:
+        return None
+    # Class version and type bytes, then '+' before the length-prefixed string
+    rest = rest[5:]
+    if not rest:
+        return None
+    if rest[0] == 0x81:
+        length, start = int.from_bytes(rest[1:3], 'little'), 3
+    elif rest[0] == 0x82:
+        length, start = int.from_bytes(rest[1:5], 'little'), 5
+    else:
+        length, start = rest[0], 1
+    return rest[start:start + length].decode('utf-8', errors='replace') or None
+
+
+def load_hash_cache(platform_dir):
+    """Map attachment path -> [size, mtime, sha256] from earlier runs."""
+    cache = {}
+    try:
+        with open(os.path.join(platform_dir, HASH_CACHE_FILE), 'r', encoding='utf-8') as f:
+            for line in f:
+                path, size, mtime, digest = json.loads(line)
+                cache[path] = [size, mtime, digest]
+    except (FileNotFoundError, json.JSONDecodeError, ValueError):
+        pass
+    return cache
+
+
+def save_hash_cache(platform_dir, cache):
+    path = os.path.join(platform_dir, HASH_CACHE_FILE)
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        for file_path, (size, mtime, digest) in cache.items():
+            f.write(json.dumps([file_path, size, mtime, digest], ensure_ascii=False) + '\n')
+    os.replace(path + '.tmp', path)
+
+
+def hash_file(path, cache):
+    """sha256 of a file, reused from the cache while its size and mtime match."""
+    stat = os.stat(path)
+    cached = cache.get(path)
+    if cached and cached[0] == stat.st_size and cached[1] == int(stat.st_mtime):
+        return cached[2]
+
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    cache[path] = [stat.st_size, int(stat.st_mtime), digest.hexdigest()]
+    return cache[path][2]
+
+
+def store_attachment(path, digest, store_dir):
+    """Copy an attachment into the content-addressed store unless it's already there."""
+    stored_path = os.path.join(store_dir, digest[:2], digest + os.path.splitext(path)[1].lower())
+    if not os.path.exists(stored_path):
+        os.makedirs(os.path.dirname(stored_path), exist_ok=True)
+        shutil.copyfile(path, stored_path + '.part')
+        os.replace(stored_path + '.part', stored_path)
+    return stored_path
+
+
+def _has_column(db, table, column):
+    return any(row[1] == column for row in db.execute(f"PRAGMA table_info({table})"))
+
+
+def iter_rich_records(messages_db, after_rowid, max_rowid, resolve_path=None, hash_cache=None,
+                      store_dir=None, batch_size=BATCH_SIZE):
+    """Yield chat records, then one record per message with its chat and attachments.
+
+    `resolve_path` maps an attachment's stored filename to a readable local
+    path, or None when the bytes aren't available. Readable attachments are
+    hashed with `hash_cache`, and copied into `store_dir` when it is given.
+    """
+    for chat_id, identifier, display_name, style in messages_db.execute(
+        "SELECT ROWID, chat_identifier, display_name, style FROM chat ORDER BY ROWID"
+    ):
+        yield {
+            'type': 'chat',
+            'id': chat_id,
+            'identifier': identifier,
+            'display_name': display_name or None,
+            'is_group': style == GROUP_CHAT_STYLE,
+        }
+
+    attributed_body = 'message.attributedBody' if _has_column(messages_db, 'message', 'attributedBody') else 'NULL'
+    cursor = messages_db.execute(f"""
+        SELECT
+            message.ROWID,
+            message.text IS NULL,
+            {attributed_body},
+            chat_message_join.chat_id,
+            attachment.ROWID,
+            attachment.filename,
+            attachment.mime_type,
+            attachment.transfer_name,
+            attachment.total_bytes
+        FROM message
+        LEFT JOIN chat_message_join ON chat_message_join.message_id = message.ROWID
+        LEFT JOIN message_attachment_join ON message_attachment_join.message_id = message.ROWID
+        LEFT JOIN attachment ON attachment.ROWID = message_attachment_join.attachment_id
+        WHERE message.ROWID > ? AND message.ROWID <= ?
+        ORDER BY message.ROWID
+    """, (after_rowid, max_rowid))
+
+    def rows():
+        while True:
+            batch = cursor.fetchmany(batch_size)
+            if not batch:
+                return
+            yield from batch
+
+    # A message has one row per attachment, and rows of a message are adjacent
+    for message_id, message_rows in groupby(rows(), key=lambda row: row[0]):
+        message_rows = list(message_rows)
+        _, text_missing, body, chat_id = message_rows[0][:4]
+        record = {'type': 'message', 'id': message_id, 'chat_id': chat_id}
+        if text_missing:
+            text = decode_attributed_body(body)
+            if text:
+                record['text'] = text
+
+        attachments = []
+        for row in message_rows:
+            if row[4] is None or any(a['id'] == row[4] for a in attachments):
+                continue
+            attachments.append(_attachment_record(row[4:], resolve_path, hash_cache, store_dir))
+        if attachments:
+            record['attachments'] = attachments
+
+        yield record
+
+
+def _attachment_record(row, resolve_path, hash_cache, store_dir):
+    attachment_id, filename, mime_type, transfer_name, total_bytes = row
+    attachment = {
+        'id': attachment_id,
+        'filename': filename,
+        'mime_type': mime_type,
+        'transfer_name': transfer_name,
+        'total_bytes': total_bytes,
+        'sha256': None,
+    }
+    path = resolve_path(filename) if resolve_path and filename else None
+    if path and os.path.isfile(path):
+        try:
+            attachment['sha256'] = hash_file(path, hash_cache if hash_cache is not None else {})
+            if store_dir:
+                attachment['stored_path'] = store_attachment(path, attachment['sha256'], store_dir)
+        except OSError as e:
+            print(f"Warning: Couldn't read attachment {filename}: {e}", flush=True)
+    return attachment
+
+
+def write_rich_export(output_path, records, progress_every=None):
+    """Write records as newline-delimited JSON and return the number of messages."""
+    count = 0
+    with open(output_path, 'w', encoding='utf-8') as f:
+        for record in records:
+            f.write(json.dumps(record, ensure_ascii=False, separators=(',', ':')))
+            f.write('\n')
+            if record['type'] == 'message':
+                count += 1
+                if progress_every and count % progress_every == 0:
+                    print(f"Exported details of {count} messages", flush=True)
+    return count
+
+
+def export_rich(messages_db, platform_dir, output_dir, after_rowid, max_rowid, resolve_path=None,
+                copy_attachments=False, progress_every=None):
+    """Write the extended side file for a run and return the number of messages in it.
+
+    Like the main export, the side file of an incremental run only has the
+    messages in its ROWID window, along with every chat.
+    """
+    hash_cache = load_hash_cache(platform_dir)
+    store_dir = os.path.join(platform_dir, ATTACHMENTS_DIR) if copy_attachments else None
+    records = iter_rich_records(messages_db, after_rowid, max_rowid, resolve_path, hash_cache, store_dir)
+    count = write_rich_export(os.path.join(output_dir, RICH_FILE), records, progress_every)
+    if hash_cache:
+        save_hash_cache(platform_dir, hash_cache)
+    return count
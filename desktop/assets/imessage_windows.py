@@ -2,169 +2,265 @@ import sys
 import sqlite3
 from iphone_backup_decrypt import EncryptedBackup, RelativePath, MatchFiles
 import os
-import sqlite3
 import json
-from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from imessage_contacts import create_handle_names, load_index
+from imessage_rich import RICH_FILE, export_rich
+from imessage_export import BATCH_SIZE, EXPORT_FILE, PROGRESS_EVERY, TIMESTAMP_FORMATS, messages_query, parse_args, rowid_range, save_state, write_export
 
-if len(sys.argv) < 7:
-    print("Error: Not enough arguments provided")
-    sys.exit(1)
+# Stages finished for a run are recorded here so a rerun of the same run skips
+# them. Not a .json file, which the desktop app would take for the export
+CHECKPOINT_FILE = '.pipeline_state'
+# Files needed from the backup, by the name they are extracted to
+BACKUP_FILES = {
+    'imessage.sqlite': RelativePath.TEXT_MESSAGES,
+    'contacts.sqlite': RelativePath.ADDRESS_BOOK,
+}
+MAX_EXTRACT_WORKERS = 4
 
-folder_path = sys.argv[1]
-company = sys.argv[2]
-platform_name = sys.argv[3]
-password = sys.argv[4]
-app_data_path = sys.argv[5]  # New argument for the app's data path
-id = sys.argv[6]
+def backup_fingerprint(folder_path):
+    """Identify a backup so checkpoints from a different backup are ignored."""
+    # Manifest.plist is rewritten every time the device is backed up again
+    manifest = os.stat(os.path.join(folder_path, 'Manifest.plist'))
+    return {
+        'backup': os.path.abspath(folder_path),
+        'manifest_size': manifest.st_size,
+        'manifest_mtime': int(manifest.st_mtime),
+    }
 
-def apple_time_to_iso(apple_timestamp):
-    # Convert Apple timestamp (nanoseconds) to seconds
-    seconds_since_reference = apple_timestamp / 1_000_000_000
+def load_checkpoint(output_dir, fingerprint):
+    """Return the stages already finished for this run and backup."""
+    try:
+        with open(os.path.join(output_dir, CHECKPOINT_FILE), 'r', encoding='utf-8') as f:
+            state = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+    return state.get('stages', {}) if state.get('fingerprint') == fingerprint else {}
 
-    # Apple's reference date is January 1, 2001
-    reference_date = datetime(2001, 1, 1)
+def save_checkpoint(output_dir, fingerprint, stages):
+    path = os.path.join(output_dir, CHECKPOINT_FILE)
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump({'fingerprint': fingerprint, 'stages': stages}, f)
+    os.replace(path + '.tmp', path)
 
-    # Calculate the actual date
-    actual_date = reference_date + timedelta(seconds=seconds_since_reference)
+def pending_files(output_dir, stages):
+    """Backup files not yet extracted, or whose extracted copy is incomplete."""
+    extracted = stages.get('extract', {})
+    pending = []
+    for name in BACKUP_FILES:
+        path = os.path.join(output_dir, name)
+        if name not in extracted or not os.path.exists(path) or os.path.getsize(path) != extracted[name]:
+            pending.append(name)
+    return pending
 
-    # Convert to ISO 8601 format
-    iso_string = actual_date.isoformat()
+def unlock_backup(folder_path, password):
+    """Derive the backup key once. Raises if the password is wrong."""
+    backup = EncryptedBackup(backup_directory=folder_path, passphrase=password)
+    backup.test_decryption()
+    return backup
 
-    return iso_string
+def extract_backup_file(backup, name, output_dir):
+    """Decrypt one backup file into the run folder and return its size.
 
-try: 
-    print('Decrypting backup')
-    backup = EncryptedBackup(backup_directory=folder_path, passphrase=password)
-    print('Backup decrypted successfully')
-    # Define the output directory using the provided app data path
-    output_dir = os.path.join(app_data_path, 'exported_data', company, platform_name, id)
- 
-    # Ensure the directory exists
-    os.makedirs(output_dir, exist_ok=True)
-
-    # Extract imessages 
-    backup.extract_file(relative_path=RelativePath.TEXT_MESSAGES, 
-                        output_filename=os.path.join(output_dir, "imessage.sqlite"))
-    print('Extracted imessages')
-    # Extract contacts
-    backup.extract_file(relative_path=RelativePath.ADDRESS_BOOK, 
-                        output_filename=os.path.join(output_dir, "contacts.sqlite"))
-    print(f"Backup decrypted and files extracted successfully to {output_dir}")
-
-    # Connect to the iMessage SQLite database
-    imessage_conn = sqlite3.connect(os.path.join(output_dir, "imessage.sqlite"))
-    imessage_cursor = imessage_conn.cursor()
-
-    # Connect to the contacts SQLite database
-    contacts_conn = sqlite3.connect(os.path.join(output_dir, "contacts.sqlite"))
-    contacts_cursor = contacts_conn.cursor()
-
-    # Query to fetch messages
-    message_query = """
-    SELECT 
-        message.ROWID,
-        message.text,
-        message.date,
-        handle.id as contact,
-        message.is_from_me
-    FROM 
-        message 
-    LEFT JOIN 
-        handle ON message.handle_id = handle.ROWID
-    ORDER BY 
-        message.date DESC
+    The file is written under a temporary name first, so an interrupted
+    extraction never looks finished.
     """
+    path = os.path.join(output_dir, name)
+    backup.extract_file(relative_path=BACKUP_FILES[name], output_filename=path + '.part')
+    os.replace(path + '.part', path)
+    return os.path.getsize(path)
 
-    # Query to fetch contacts
-    contact_query = """
-    SELECT 
-        CASE
-            WHEN c0First IS NOT NULL AND c1Last IS NOT NULL THEN c0First || ' ' || c1Last
-            WHEN c0First IS NOT NULL THEN c0First
-            ELSE "NO CONTACT"
-        END as full_name,
-        c16Phone
-    FROM 
-        ABPersonFullTextSearch_content
-    WHERE 
-        c16Phone IS NOT NULL AND c16Phone != ''
+def extract_backup_files(backup, folder_path, names, output_dir, on_extracted):
+    """Extract backup files concurrently, reusing the key and Manifest.db decrypted by `backup`.
+
+    Each worker opens its own EncryptedBackup from the derived key, which
+    skips the slow passphrase derivation, and reads the plaintext Manifest.db
+    `unlock_backup` already decrypted instead of decrypting it again.
     """
+    if len(names) == 1:
+        on_extracted(names[0], extract_backup_file(backup, names[0], output_dir))
+        return
+
+    key = backup.keybag.passphrase_key
+    manifest_path = backup._temp_decrypted_manifest_db_path
+
+    def extract(name):
+        worker_backup = EncryptedBackup(backup_directory=folder_path, passphrase_key=key)
+        # The library only decrypts Manifest.db when this file is missing, and then only reads it
+        worker_backup._temp_decrypted_manifest_db_path = manifest_path
+        return extract_backup_file(worker_backup, name, output_dir)
 
-    # Execute queries
-    imessage_cursor.execute(message_query)
-    contacts_cursor.execute(contact_query)
-
-    # Fetch all results
-    messages = imessage_cursor.fetchall()
-    contacts = contacts_cursor.fetchall()
-
-    # save contacts to a JSON!!
-    contacts_json_path = os.path.join(output_dir, 'my_contacts-001.json')
-    with open(contacts_json_path, 'w') as f:
-        json.dump(contacts, f, indent=2)
-
-    # Create a dictionary to map phone numbers to names
-    contact_dict = {}
-    for full_name, phone in contacts: 
-        # Remove any non-digit characters from the phone number
-        clean_phone = ''.join(filter(str.isdigit, phone))
-        # Store multiple versions of the phone number
-        if len(clean_phone) >= 10:
-            contact_dict[clean_phone[-10:]] = full_name.strip()  # Last 10 digits
-            contact_dict[clean_phone[-7:]] = full_name.strip()   # Last 7 digits
-            if len(clean_phone) > 10:
-                contact_dict[clean_phone[-11:]] = full_name.strip()  # Last 11 digits (with country code)
-
-    # Convert to list of dictionaries
-    message_list = []
-    for msg in messages:
-        contact = msg[3]
-        if contact:
-            # Remove any non-digit characters from the contact
-            clean_contact = ''.join(filter(str.isdigit, contact)) or contact
-            # Try to match with different lengths
-            if len(clean_contact) >= 10:
-                name = contact_dict.get(clean_contact[-10:], contact)
-            if len(clean_contact) >= 7:
-                name = contact_dict.get(clean_contact[-7:], name)
-            if len(clean_contact) > 10:
-                name = contact_dict.get(clean_contact[-11:], name)
-        
-        if msg[1] is not None:
-            message_list.append({
+    with ThreadPoolExecutor(max_workers=min(len(names), MAX_EXTRACT_WORKERS)) as pool:
+        futures = {pool.submit(extract, name): name for name in names}
+        for future in as_completed(futures):
+            on_extracted(futures[future], future.result())
+
+def iter_messages(imessage_cursor, batch_size=BATCH_SIZE):
+    """Yield exported message records, fetching rows in batches."""
+    while True:
+        msgs = imessage_cursor.fetchmany(batch_size)
+        if not msgs:
+            break
+
+        for msg in msgs:
+            if msg[1] is None:
+                continue
+
+            yield {
                 'id': msg[0],
                 'text': msg[1],
-                'timestamp': apple_time_to_iso(msg[2]) if msg[2] is not None else None,
-                'contact': name,
+                'timestamp': msg[2],
+                'contact': msg[3],
                 'is_from_me': True if msg[4] == 1 else False
-            })
-    # Close the database connections
-    imessage_conn.close()
-    contacts_conn.close()
-
-    imessages = {
-        "company": company,
-        "name": platform_name,
-        "runID": id,
-        "timestamp": int(id.split('-')[-1]),
-        "content": message_list
-    }
+            }
+
+def main():
+    args, flags = parse_args(sys.argv[1:])
+    if len(args) < 6:
+        print("Error: Not enough arguments provided")
+        sys.exit(1)
+
+    folder_path = args[0]
+    company = args[1]
+    platform_name = args[2]
+    password = args[3]
+    app_data_path = args[4]  # New argument for the app's data path
+    id = args[5]
+    incremental = bool(flags.get('incremental'))
+    timestamp_format = flags.get('timestamps', 'iso')
+    extended = bool(flags.get('extended'))
+    if timestamp_format not in TIMESTAMP_FORMATS:
+        print(f"Error: --timestamps must be one of {', '.join(TIMESTAMP_FORMATS)}")
+        sys.exit(1)
+
+    try:
+        # Define the output directory using the provided app data path
+        platform_dir = os.path.join(app_data_path, 'exported_data', company, platform_name)
+        output_dir = os.path.join(platform_dir, id)
+
+        # Ensure the directory exists
+        os.makedirs(output_dir, exist_ok=True)
+
+        # The password is checked even when every stage is already done, as
+        # the desktop app takes the success message to mean it is correct
+        print('Decrypting backup')
+        backup = unlock_backup(folder_path, password)
+        print('Backup decrypted successfully')
+
+        # Reruns of this run against the same backup skip finished stages
+        fingerprint = backup_fingerprint(folder_path)
+        stages = load_checkpoint(output_dir, fingerprint)
+        if stages.get('export') and os.path.exists(os.path.join(output_dir, EXPORT_FILE)):
+            print(f"Already exported {stages['export']['messages']} messages")
+            print(output_dir)
+            sys.exit(0)
+
+        pending = pending_files(output_dir, stages)
+        if pending:
+            def on_extracted(name, size):
+                stages.setdefault('extract', {})[name] = size
+                save_checkpoint(output_dir, fingerprint, stages)
+                print(f"Extracted {name}", flush=True)
+
+            extract_backup_files(backup, folder_path, pending, output_dir, on_extracted)
+            print(f"Backup decrypted and files extracted successfully to {output_dir}")
+        else:
+            print(f"Reusing files already extracted to {output_dir}")
+
+        # Connect to the iMessage SQLite database
+        imessage_conn = sqlite3.connect(os.path.join(output_dir, "imessage.sqlite"))
+        imessage_cursor = imessage_conn.cursor()
+
+        # Connect to the contacts SQLite database
+        contacts_conn = sqlite3.connect(os.path.join(output_dir, "contacts.sqlite"))
+        contacts_cursor = contacts_conn.cursor()
+
+        # Incremental runs only read rows added since the last run of this
+        # backup and export them as a delta on top of that run's export
+        options = {'timestamp_format': timestamp_format, 'extended': extended}
+        after_rowid, max_rowid, previous = rowid_range(
+            imessage_cursor, platform_dir, os.path.abspath(folder_path), id, incremental, options,
+            side_files=(RICH_FILE,) if extended else (),
+        )
+
+        # Query to fetch contacts
+        contact_query = """
+        SELECT
+            CASE
+                WHEN c0First IS NOT NULL AND c1Last IS NOT NULL THEN c0First || ' ' || c1Last
+                WHEN c0First IS NOT NULL THEN c0First
+                ELSE "NO CONTACT"
+            END as full_name,
+            c16Phone
+        FROM
+            ABPersonFullTextSearch_content
+        WHERE
+            c16Phone IS NOT NULL AND c16Phone != ''
+        """
+
+        contacts_cursor.execute(contact_query)
+        contacts = contacts_cursor.fetchall()
+
+        # save contacts to a JSON!!
+        contacts_json_path = os.path.join(output_dir, 'my_contacts-001.json')
+        with open(contacts_json_path, 'w') as f:
+            json.dump(contacts, f, separators=(',', ':'))
 
-    # Save to JSON file
-    imessage_json_path = os.path.join(output_dir, 'imessage-001.json')
-    with open(imessage_json_path, 'w') as f:
-        json.dump(imessages, f, indent=2)
+        # Resolve every handle to a contact name once, in SQL. The index is
+        # cached in the platform folder until the address book changes
+        contact_index = load_index(
+            platform_dir,
+            os.path.join(output_dir, "contacts.sqlite"),
+            lambda: ((name, phone, None) for name, phone in contacts if name != "NO CONTACT"),
+        )
+        create_handle_names(imessage_conn, contact_index)
 
-    print(output_dir)
+        # Stream messages straight from the cursor into the export file
+        imessage_cursor.execute(messages_query(timestamp_format), (after_rowid, max_rowid))
+        header = {
+            "company": company,
+            "name": platform_name,
+            "runID": id,
+            "timestamp": int(id.split('-')[-1]),
+        }
+        if previous:
+            header["previous_run"] = previous['run_id']
+        if timestamp_format == 'epoch':
+            header["timestamp_format"] = "epoch_ms"
+        imessage_json_path = os.path.join(output_dir, EXPORT_FILE)
+        count = write_export(
+            imessage_json_path, header, iter_messages(imessage_cursor),
+        )
+        total = count + (previous.get('messages') or 0) if previous else count
+        deltas = (previous.get('deltas') or 0) + 1 if previous else 0
+        print(f"Exported {count} new messages, {total} in total" if previous else f"Exported {count} messages", flush=True)
 
-    sys.exit(0)
-except Exception as e:
-    if "incorrect passphrase" in str(e):
-        print('INVALID_PASSWORD')
-    else:
-        print(f"ERROR: {str(e)}")
-    sys.exit(1)
+        # Chats, attachments and attributedBody-only text go to a side file.
+        # Attachment bytes stay in the encrypted backup, so only their
+        # metadata is exported
+        if extended:
+            rich_count = export_rich(
+                imessage_conn, platform_dir, output_dir, after_rowid, max_rowid,
+                progress_every=PROGRESS_EVERY,
+            )
+            print(f"Exported details of {rich_count} messages", flush=True)
 
+        # Close the database connections
+        imessage_conn.close()
+        contacts_conn.close()
+        save_state(platform_dir, os.path.abspath(folder_path), max_rowid, id, options, total, deltas)
+        stages['export'] = {'messages': total}
+        save_checkpoint(output_dir, fingerprint, stages)
 
+        print(output_dir)
 
+        sys.exit(0)
+    except Exception as e:
+        if "incorrect passphrase" in str(e):
+            print('INVALID_PASSWORD')
+        else:
+            print(f"ERROR: {str(e)}")
+        sys.exit(1)
 
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,33 @@
+import { EventEmitter } from 'events';
+import { PassThrough } from 'stream';
+import { drained } from '../main/helpers/encoding';
+
+describe('drained', () => {
+  it('resolves true once the body drains', async () => {
+    const body = new PassThrough();
+    const res = new EventEmitter();
+
+    const waiting = drained(body, res);
+    body.emit('drain');
+
+    await expect(waiting).resolves.toBe(true);
+    expect(res.listenerCount('close')).toBe(0);
+  });
+
+  it('resolves false when the client disconnects first', async () => {
+    const body = new PassThrough();
+    const res = new EventEmitter();
+
+    const waiting = drained(body, res);
+    res.emit('close');
+
+    await expect(waiting).resolves.toBe(false);
+    expect(body.listenerCount('drain')).toBe(0);
+  });
+
+  it('resolves false right away for a response already closed', async () => {
+    const res = Object.assign(new EventEmitter(), { destroyed: true });
+
+    await expect(drained(new PassThrough(), res)).resolves.toBe(false);
+  });
+});
@@ -0,0 +1,100 @@
+import fs from 'fs';
+import os from 'os';
+import path from 'path';
+import {
+  exportRecordLines,
+  readExport,
+  scanExportChain,
+} from '../main/helpers/exports';
+
+// Write runs into a platform folder, as the iMessage exporters do, or
+// indented like exports of other platforms
+const writeRuns = (runs: Record<string, any>, space?: number) => {
+  const platformDir = fs.mkdtempSync(path.join(os.tmpdir(), 'surfer-exports-'));
+  for (const [runID, data] of Object.entries(runs)) {
+    fs.mkdirSync(path.join(platformDir, runID));
+    fs.writeFileSync(
+      path.join(platformDir, runID, 'imessage-001.json'),
+      JSON.stringify({ runID, ...data }, null, space),
+    );
+  }
+  return (runID: string) => path.join(platformDir, runID, 'imessage-001.json');
+};
+
+describe('readExport', () => {
+  it('combines a delta run with the runs it builds on', () => {
+    const exportFile = writeRuns({
+      'imessage-001-1': { content: [{ id: 2 }, { id: 1 }] },
+      'imessage-001-2': { previous_run: 'imessage-001-1', content: [{ id: 3 }] },
+      'imessage-001-3': { previous_run: 'imessage-001-2', content: [{ id: 5 }, { id: 4 }] },
+    });
+
+    const data = readExport(exportFile('imessage-001-3'));
+
+    expect(data.runID).toEqual('imessage-001-3');
+    expect(data.previous_run).toBeUndefined();
+    expect(data.content.map((r: any) => r.id)).toEqual([5, 4, 3, 2, 1]);
+  });
+
+  it('fails when a run of the chain is missing', () => {
+    const exportFile = writeRuns({
+      'imessage-001-2': { previous_run: 'imessage-001-1', content: [{ id: 3 }] },
+    });
+
+    expect(() => readExport(exportFile('imessage-001-2'))).toThrow(
+      'imessage-001-2 builds on run imessage-001-1, whose export is missing',
+    );
+  });
+});
+
+describe('exportRecordLines', () => {
+  const records = [
+    {
+      id: 3,
+      text: 'Quotes " and \\ backslashes \\" in } text ]',
+      tags: [[1], {}],
+    },
+    { id: 2, text: 'Long '.repeat(300000), is_from_me: true, contact: null },
+    { id: 1, text: 'Ünïcödé 👋', timestamp: -1.5e-7 },
+  ];
+
+  it('copies every record of a chain from disk, one per line', () => {
+    const exportFile = writeRuns(
+      {
+        'imessage-001-1': { content: [records[2]] },
+        'imessage-001-2': {
+          previous_run: 'imessage-001-1',
+          content: records.slice(0, 2),
+        },
+      },
+      2,
+    );
+
+    const lines = [...exportRecordLines(exportFile('imessage-001-2'))].map(
+      (line) => line.toString('utf8'),
+    );
+
+    expect(
+      lines.every((line) => line.indexOf('\n') === line.length - 1),
+    ).toEqual(true);
+    expect(lines.map((line) => JSON.parse(line))).toEqual(
+      readExport(exportFile('imessage-001-2')).content,
+    );
+  });
+
+  it('reads metadata written after the content', () => {
+    const exportFile = writeRuns({
+      'imessage-001-1': { content: [{ id: 1 }], total: 1 },
+    });
+
+    const members = [...scanExportChain(exportFile('imessage-001-1'))].map(
+      ([key, raw]) => [key, JSON.parse(raw.toString('utf8'))],
+    );
+
+    expect(members).toEqual([
+      ['runID', 'imessage-001-1'],
+      [null, { id: 1 }],
+      ['total', 1],
+    ]);
+  });
+});
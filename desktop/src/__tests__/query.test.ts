@@ -0,0 +1,50 @@
+import { applyRecordQuery, isoTime } from '../main/helpers/query';
+
+const ids = (records: any[]) => records.map((r) => r.id);
+
+describe('applyRecordQuery timestamp bounds', () => {
+  const records = [
+    { id: 1, timestamp: '2024-11-01T09:59:59.999Z' },
+    { id: 2, timestamp: '2024-11-01T10:00:00.000Z' },
+    { id: 3, timestamp: '2024-11-01T10:00:00.500Z' },
+    { id: 4, timestamp: '2024-11-01T11:00:00.000Z' },
+  ];
+
+  it('compares bounds with another offset as instants', () => {
+    const where = {
+      timestamp: { gte: '2024-11-01T12:00:00+02:00', lt: '2024-11-01T12:00:00+01:00' },
+    };
+
+    expect(ids(applyRecordQuery(records, { where }))).toEqual([2, 3]);
+  });
+
+  it('compares microsecond bounds against millisecond timestamps', () => {
+    const where = { timestamp: { gt: '2024-11-01T10:00:00.000001+00:00' } };
+
+    expect(ids(applyRecordQuery(records, { where }))).toEqual([3, 4]);
+  });
+
+  it('bounds epoch millisecond exports with ISO dates', () => {
+    const epochRecords = records.map((r) => ({
+      id: r.id,
+      timestamp: Date.parse(r.timestamp),
+    }));
+    const where = { timestamp: { gte: '2024-11-01T10:00:00Z', lt: '2024-11-01T11:00:00Z' } };
+
+    expect(ids(applyRecordQuery(epochRecords, { where }))).toEqual([2, 3]);
+  });
+
+  it('reads plain dates and times without an offset as local time', () => {
+    expect(isoTime('2024-11-01')).toEqual(new Date(2024, 10, 1).getTime());
+    expect(isoTime('2024-11-01 10:00:00')).toEqual(
+      new Date(2024, 10, 1, 10).getTime(),
+    );
+  });
+
+  it('keeps comparing other strings as strings', () => {
+    const people = [{ id: 1, name: 'Ann' }, { id: 2, name: 'Bob' }, { id: 3, name: '2' }];
+
+    expect(ids(applyRecordQuery(people, { where: { name: { gte: 'B' } } }))).toEqual([2]);
+    expect(isoTime('1')).toBeNull();
+  });
+});
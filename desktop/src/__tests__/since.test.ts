@@ -0,0 +1,131 @@
+import {
+  cachedKeyReader,
+  cursorFor,
+  recordsSince,
+} from '../main/helpers/since';
+
+const email = (subject: string, addedToDb: string) => ({
+  accountID: '0',
+  from: 'ann@example.com',
+  subject,
+  timestamp: '2024-11-01T09:00:00.000Z',
+  body: `About ${subject}`,
+  added_to_db: addedToDb,
+});
+
+// Runs latest first, with their records in a lookup for the reader
+const makeRuns = (exports: Record<string, any[]>) => {
+  const runs = Object.keys(exports)
+    .reverse()
+    .map((id) => ({ id, exportPath: `/exports/${id}` }));
+  const readRecords = (run: any) => exports[run.id] ?? null;
+  return { runs, readRecords };
+};
+
+describe('recordsSince', () => {
+  it('diffs re-exports that stamp every record with a fresh added_to_db', () => {
+    const first = [
+      email('Lunch', '2024-11-01T10:00:00.000Z'),
+      email('Invoice', '2024-11-01T10:00:00.000Z'),
+    ];
+    const second = [
+      email('Lunch', '2024-11-02T10:00:00.000Z'),
+      email('Invoice', '2024-11-02T10:00:00.000Z'),
+      email('Flights', '2024-11-02T10:00:00.000Z'),
+    ];
+    const { runs, readRecords } = makeRuns({
+      'gmail-001-1': first,
+      'gmail-001-2': second,
+    });
+
+    const cursor = cursorFor('gmail-001-1', first);
+    const records = recordsSince(second, cursor, runs, readRecords);
+
+    expect(records.map((r) => r.subject)).toEqual(['Flights']);
+  });
+
+  it('includes records from runs between the cursor and the latest run', () => {
+    const { runs, readRecords } = makeRuns({
+      'imessage-001-1': [{ id: 1 }],
+      'imessage-001-2': [{ id: 1 }, { id: 2, text: 'old' }],
+      'imessage-001-3': [{ id: 1 }, { id: 2, text: 'edited' }, { id: 3 }],
+      'imessage-001-4': [{ id: 1 }, { id: 2, text: 'edited' }, { id: 4 }],
+    });
+    const latest = readRecords(runs[0])!;
+
+    const records = recordsSince(
+      latest,
+      { runID: 'imessage-001-1' },
+      runs,
+      readRecords,
+    );
+
+    expect(records).toEqual([{ id: 2, text: 'edited' }, { id: 3 }, { id: 4 }]);
+  });
+
+  it('uses added_to_db only while the cursor run is the latest', () => {
+    const records = [
+      email('Lunch', '2024-11-01T10:00:00.000Z'),
+      email('Flights', '2024-11-01T12:00:00.000Z'),
+    ];
+    const { runs, readRecords } = makeRuns({ 'gmail-001-1': records });
+
+    const cursor = {
+      runID: 'gmail-001-1',
+      addedToDb: '2024-11-01T11:00:00.000Z',
+    };
+
+    expect(
+      recordsSince(records, cursor, runs, readRecords).map((r) => r.subject),
+    ).toEqual(['Flights']);
+  });
+
+  it('falls back to numeric IDs when the cursor run is gone', () => {
+    const latest = [{ id: 1 }, { id: 2 }, { id: 3 }];
+    const { runs, readRecords } = makeRuns({ 'imessage-001-2': latest });
+
+    const records = recordsSince(
+      latest,
+      { runID: 'imessage-001-1', recordId: 2 },
+      runs,
+      readRecords,
+    );
+
+    expect(records).toEqual([{ id: 3 }]);
+  });
+});
+
+describe('cachedKeyReader', () => {
+  it('reads runs once, and their records only when the latest run lost some', () => {
+    const exports: Record<string, any[]> = {
+      'imessage-001-1': [{ id: 1 }],
+      'imessage-001-2': [{ id: 1 }, { id: 2 }],
+      'imessage-001-3': [{ id: 1 }, { id: 2 }, { id: 3 }],
+      'imessage-001-4': [{ id: 1 }, { id: 2 }, { id: 4 }],
+    };
+    const { runs } = makeRuns(exports);
+    const reads: string[] = [];
+    const readRecords = (run: any) => {
+      reads.push(run.id);
+      return exports[run.id] ?? null;
+    };
+    const readKeys = cachedKeyReader(readRecords, (run: any) => run.id);
+    const since = { runID: 'imessage-001-1' };
+
+    const latest = exports['imessage-001-4'];
+
+    const first = recordsSince(latest, since, runs, readRecords, readKeys);
+    const second = recordsSince(latest, since, runs, readRecords, readKeys);
+
+    expect(first).toEqual([{ id: 2 }, { id: 3 }, { id: 4 }]);
+    expect(second).toEqual(first);
+    // Keys of every run once, then the records of the run that added id 3
+    expect(reads).toEqual([
+      'imessage-001-1',
+      'imessage-001-2',
+      'imessage-001-3',
+      'imessage-001-3',
+      'imessage-001-3',
+    ]);
+  });
+});
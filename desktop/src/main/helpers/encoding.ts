@@ -0,0 +1,199 @@
+import { Writable } from 'stream';
+import zlib from 'zlib';
+
+// Responses smaller than this are sent uncompressed
+const MIN_COMPRESS_BYTES = 1024;
+
+// Minimal MessagePack encoder covering the JSON data model, so the API can
+// offer a compact binary format without another native dependency
+class MsgpackWriter {
+  private buffer = Buffer.allocUnsafe(64 * 1024);
+
+  private offset = 0;
+
+  private ensure(size: number) {
+    if (this.offset + size <= this.buffer.length) return;
+    let { length } = this.buffer;
+    while (length < this.offset + size) length *= 2;
+    const next = Buffer.allocUnsafe(length);
+    this.buffer.copy(next, 0, 0, this.offset);
+    this.buffer = next;
+  }
+
+  private byte(value: number) {
+    this.ensure(1);
+    this.buffer[this.offset++] = value;
+  }
+
+  private header(type: number, size: number, bytes: 1 | 2 | 4) {
+    this.ensure(1 + bytes);
+    this.buffer[this.offset++] = type;
+    if (bytes === 1) this.buffer.writeUInt8(size, this.offset);
+    else if (bytes === 2) this.buffer.writeUInt16BE(size, this.offset);
+    else this.buffer.writeUInt32BE(size, this.offset);
+    this.offset += bytes;
+  }
+
+  private fixed(type: number, size: number, write: (offset: number) => void) {
+    this.ensure(1 + size);
+    this.buffer[this.offset++] = type;
+    write(this.offset);
+    this.offset += size;
+  }
+
+  private number(value: number) {
+    if (!Number.isSafeInteger(value)) {
+      // JSON has no NaN or Infinity, encode them as nil like JSON.stringify
+      if (!Number.isFinite(value)) this.byte(0xc0);
+      else this.fixed(0xcb, 8, (o) => this.buffer.writeDoubleBE(value, o));
+    } else if (value >= 0) {
+      if (value < 0x80) this.byte(value);
+      else if (value <= 0xff) this.header(0xcc, value, 1);
+      else if (value <= 0xffff) this.header(0xcd, value, 2);
+      else if (value <= 0xffffffff) this.header(0xce, value, 4);
+      else
+        this.fixed(0xcf, 8, (o) =>
+          this.buffer.writeBigUInt64BE(BigInt(value), o),
+        );
+    } else if (value >= -32) this.byte(value & 0xff);
+    else if (value >= -0x80)
+      this.fixed(0xd0, 1, (o) => this.buffer.writeInt8(value, o));
+    else if (value >= -0x8000)
+      this.fixed(0xd1, 2, (o) => this.buffer.writeInt16BE(value, o));
+    else if (value >= -0x80000000)
+      this.fixed(0xd2, 4, (o) => this.buffer.writeInt32BE(value, o));
+    else
+      this.fixed(0xd3, 8, (o) =>
+        this.buffer.writeBigInt64BE(BigInt(value), o),
+      );
+  }
+
+  private string(value: string) {
+    const length = Buffer.byteLength(value);
+    if (length < 32) this.byte(0xa0 | length);
+    else if (length <= 0xff) this.header(0xd9, length, 1);
+    else if (length <= 0xffff) this.header(0xda, length, 2);
+    else this.header(0xdb, length, 4);
+    this.ensure(length);
+    this.offset += this.buffer.write(value, this.offset);
+  }
+
+  write(value: any) {
+    if (value === null || value === undefined) this.byte(0xc0);
+    else if (value === false) this.byte(0xc2);
+    else if (value === true) this.byte(0xc3);
+    else if (typeof value === 'number') this.number(value);
+    else if (typeof value === 'string') this.string(value);
+    else if (typeof value.toJSON === 'function') this.write(value.toJSON());
+    else if (Array.isArray(value)) {
+      if (value.length < 16) this.byte(0x90 | value.length);
+      else if (value.length <= 0xffff) this.header(0xdc, value.length, 2);
+      else this.header(0xdd, value.length, 4);
+      value.forEach((item) => this.write(item));
+    } else {
+      const keys = Object.keys(value).filter(
+        (key) => value[key] !== undefined && typeof value[key] !== 'function',
+      );
+      if (keys.length < 16) this.byte(0x80 | keys.length);
+      else if (keys.length <= 0xffff) this.header(0xde, keys.length, 2);
+      else this.header(0xdf, keys.length, 4);
+      keys.forEach((key) => {
+        this.string(key);
+        this.write(value[key]);
+      });
+    }
+  }
+
+  toBuffer() {
+    return this.buffer.subarray(0, this.offset);
+  }
+}
+
+export function encodeMsgpack(value: any): Buffer {
+  const writer = new MsgpackWriter();
+  writer.write(value);
+  return writer.toBuffer();
+}
+
+// Pick the best compression the client accepts
+function negotiateCompression(req: any): 'br' | 'gzip' | null {
+  const accepted = String(req.get('Accept-Encoding') || '');
+  if (/\bbr\b/.test(accepted)) return 'br';
+  if (/\bgzip\b/.test(accepted)) return 'gzip';
+  return null;
+}
+
+// Send an API payload as MessagePack or JSON depending on the Accept header,
+// compressed when the client supports it
+export async function sendPayload(req: any, res: any, payload: any) {
+  const useMsgpack =
+    req.accepts(['application/json', 'application/msgpack']) ===
+    'application/msgpack';
+  let body = useMsgpack
+    ? encodeMsgpack(payload)
+    : Buffer.from(JSON.stringify(payload));
+
+  res.set('Vary', 'Accept, Accept-Encoding');
+  res.type(useMsgpack ? 'application/msgpack' : 'application/json');
+
+  const compression =
+    body.length >= MIN_COMPRESS_BYTES ? negotiateCompression(req) : null;
+  if (compression === 'br') {
+    body = await new Promise<Buffer>((resolve, reject) => {
+      zlib.brotliCompress(
+        body,
+        { params: { [zlib.constants.BROTLI_PARAM_QUALITY]: 4 } },
+        (error, result) => (error ? reject(error) : resolve(result)),
+      );
+    });
+  } else if (compression === 'gzip') {
+    body = await new Promise<Buffer>((resolve, reject) => {
+      zlib.gzip(body, { level: 6 }, (error, result) =>
+        error ? reject(error) : resolve(result),
+      );
+    });
+  }
+  if (compression) {
+    res.set('Content-Encoding', compression);
+  }
+
+  res.send(body);
+}
+
+// Open a compressed body stream for a streamed response
+export function openResponseStream(req: any, res: any): Writable {
+  const compression = negotiateCompression(req);
+  res.set('Vary', 'Accept-Encoding');
+  if (!compression) {
+    return res;
+  }
+
+  res.set('Content-Encoding', compression);
+  const stream =
+    compression === 'br'
+      ? zlib.createBrotliCompress({
+          params: { [zlib.constants.BROTLI_PARAM_QUALITY]: 4 },
+        })
+      : zlib.createGzip({ level: 6 });
+  stream.pipe(res);
+  return stream;
+}
+
+// Wait for a body stream to drain. Resolves false instead when the client
+// disconnects or the stream fails first, since it would never drain then
+export function drained(body: Writable, res: any): Promise<boolean> {
+  if (res.destroyed || body.destroyed) return Promise.resolve(false);
+  return new Promise((resolve) => {
+    const settle = (ok: boolean) => () => {
+      body.off('drain', onDrain);
+      body.off('error', onGone);
+      res.off('close', onGone);
+      resolve(ok);
+    };
+    const onDrain = settle(true);
+    const onGone = settle(false);
+    body.once('drain', onDrain);
+    body.once('error', onGone);
+    res.once('close', onGone);
+  });
+}
@@ -0,0 +1,278 @@
+import fs from 'fs';
+import path from 'path';
+
+// Exports of incremental runs (see assets/imessage_export.py) only hold the
+// records added since an earlier run, named by `previous_run` in their
+// header. That run's folder sits next to theirs in the platform folder, and
+// may build on another run in turn.
+
+// The export file of a run folder
+export const findExportFile = (exportPath: string) => {
+  const jsonFile = fs
+    .readdirSync(exportPath)
+    .find((file: any) => file.endsWith('.json'));
+  return jsonFile ? path.join(exportPath, jsonFile) : null;
+};
+
+// The export file a run builds on, or an error when it is gone, since the
+// data would be incomplete without it
+export const previousExportFile = (filePath: string, previousRun: string) => {
+  const runDir = path.join(path.dirname(path.dirname(filePath)), previousRun);
+  const previousFile = fs.existsSync(runDir) ? findExportFile(runDir) : null;
+  if (!previousFile) {
+    throw new Error(
+      `${path.basename(path.dirname(filePath))} builds on run ${previousRun}, whose export is missing. Run a full export to fix this`,
+    );
+  }
+  return previousFile;
+};
+
+// Read an export as one complete document: the records of the run first,
+// then those of every run it builds on
+export const readExport = (filePath: string) => {
+  const {
+    content,
+    previous_run: previousRun,
+    ...metadata
+  } = JSON.parse(fs.readFileSync(filePath, 'utf8'));
+  const records = Array.isArray(content) ? content : [];
+
+  let previous = previousRun;
+  let currentFile = filePath;
+  while (previous) {
+    currentFile = previousExportFile(currentFile, previous);
+    const data = JSON.parse(fs.readFileSync(currentFile, 'utf8'));
+    if (Array.isArray(data.content)) {
+      for (const record of data.content) records.push(record);
+    }
+    previous = data.previous_run;
+  }
+
+  return { ...metadata, content: records };
+};
+
+// Exports streamed from disk are read in pieces of this size
+const READ_CHUNK_BYTES = 1024 * 1024;
+
+const QUOTE = 0x22;
+const BACKSLASH = 0x5c;
+const COMMA = 0x2c;
+const COLON = 0x3a;
+const OPEN_ARRAY = 0x5b;
+const CLOSE_ARRAY = 0x5d;
+const OPEN_OBJECT = 0x7b;
+const CLOSE_OBJECT = 0x7d;
+const NEWLINE = Buffer.from('\n');
+
+const isSpace = (byte: number) =>
+  byte === 0x20 || byte === 0x0a || byte === 0x0d || byte === 0x09;
+
+// Reads the JSON values of a file one at a time as raw bytes, without
+// parsing them. Only the value being read and the rest of the last piece
+// read are held in memory
+class ValueScanner {
+  private buffer = Buffer.alloc(0);
+
+  private pos = 0;
+
+  // Start of the value being read, kept when the next piece is read
+  private start = 0;
+
+  private done = false;
+
+  constructor(private fd: number) {}
+
+  private more() {
+    if (this.done) return false;
+    const chunk = Buffer.allocUnsafe(READ_CHUNK_BYTES);
+    const bytesRead = fs.readSync(this.fd, chunk, 0, chunk.length, null);
+    if (!bytesRead) {
+      this.done = true;
+      return false;
+    }
+    this.buffer = Buffer.concat([
+      this.buffer.subarray(this.start),
+      chunk.subarray(0, bytesRead),
+    ]);
+    this.pos -= this.start;
+    this.start = 0;
+    return true;
+  }
+
+  // The byte at the current position, or -1 at the end of the file
+  private peek() {
+    while (this.pos >= this.buffer.length) {
+      if (!this.more()) return -1;
+    }
+    return this.buffer[this.pos];
+  }
+
+  private skipSpace() {
+    this.start = this.pos;
+    while (isSpace(this.peek())) this.pos += 1;
+    this.start = this.pos;
+  }
+
+  // Skip past a byte, returning whether it was there
+  skip(byte: number) {
+    this.skipSpace();
+    if (this.peek() !== byte) return false;
+    this.pos += 1;
+    return true;
+  }
+
+  expect(byte: number) {
+    if (!this.skip(byte)) {
+      throw new Error(
+        `Invalid export, expected '${String.fromCharCode(byte)}' at byte ${this.pos}`,
+      );
+    }
+  }
+
+  private skipString() {
+    this.pos += 1;
+    for (;;) {
+      const quote = this.buffer.indexOf(QUOTE, this.pos);
+      if (quote === -1) {
+        this.pos = this.buffer.length;
+        if (!this.more()) throw new Error('Invalid export, unterminated string');
+      } else {
+        let escapes = 0;
+        while (this.buffer[quote - 1 - escapes] === BACKSLASH) escapes += 1;
+        this.pos = quote + 1;
+        if (escapes % 2 === 0) return;
+      }
+    }
+  }
+
+  // The raw JSON of the next value
+  value() {
+    this.skipSpace();
+    const first = this.peek();
+    if (first === QUOTE) {
+      this.skipString();
+    } else if (first === OPEN_OBJECT || first === OPEN_ARRAY) {
+      let depth = 0;
+      do {
+        const byte = this.peek();
+        if (byte === -1) throw new Error('Invalid export, unexpected end');
+        if (byte === QUOTE) {
+          this.skipString();
+        } else {
+          this.pos += 1;
+          if (byte === OPEN_OBJECT || byte === OPEN_ARRAY) depth += 1;
+          else if (byte === CLOSE_OBJECT || byte === CLOSE_ARRAY) depth -= 1;
+        }
+      } while (depth);
+    } else {
+      // Numbers, true, false and null run until the next delimiter
+      for (;;) {
+        const byte = this.peek();
+        if (
+          byte === -1 ||
+          byte === COMMA ||
+          byte === CLOSE_ARRAY ||
+          byte === CLOSE_OBJECT ||
+          isSpace(byte)
+        )
+          break;
+        this.pos += 1;
+      }
+      if (this.pos === this.start) {
+        throw new Error(`Invalid export, expected a value at byte ${this.pos}`);
+      }
+    }
+    return this.buffer.subarray(this.start, this.pos);
+  }
+}
+
+// The top-level members of an export file as [key, raw JSON], read from
+// disk a piece at a time. The records of its content come one by one as
+// [null, raw JSON] instead of as one member
+export function* scanExport(
+  filePath: string,
+): Generator<[string | null, Buffer]> {
+  const fd = fs.openSync(filePath, 'r');
+  try {
+    const scanner = new ValueScanner(fd);
+    scanner.expect(OPEN_OBJECT);
+    if (scanner.skip(CLOSE_OBJECT)) return;
+    do {
+      const key = JSON.parse(scanner.value().toString('utf8'));
+      scanner.expect(COLON);
+      if (key === 'content' && scanner.skip(OPEN_ARRAY)) {
+        if (!scanner.skip(CLOSE_ARRAY)) {
+          do {
+            yield [null, scanner.value()];
+          } while (scanner.skip(COMMA));
+          scanner.expect(CLOSE_ARRAY);
+        }
+      } else {
+        yield [key, scanner.value()];
+      }
+    } while (scanner.skip(COMMA));
+    scanner.expect(CLOSE_OBJECT);
+  } finally {
+    fs.closeSync(fd);
+  }
+}
+
+// scanExport over an export and every run it builds on, giving what
+// readExport reads, in the same order: the export's own metadata, without
+// `previous_run`, and the records of the whole chain
+export function* scanExportChain(
+  filePath: string,
+): Generator<[string | null, Buffer]> {
+  let currentFile: string | null = filePath;
+  while (currentFile) {
+    let previousRun = null;
+    for (const [key, raw] of scanExport(currentFile)) {
+      if (key === 'previous_run') {
+        previousRun = JSON.parse(raw.toString('utf8'));
+      } else if (
+        key === null ||
+        (currentFile === filePath && key !== 'content')
+      ) {
+        yield [key, raw];
+      }
+    }
+    currentFile = previousRun
+      ? previousExportFile(currentFile, previousRun)
+      : null;
+  }
+}
+
+// The records of an export chain as newline-delimited JSON, copied from
+// disk without being parsed. JSON strings can't hold raw line breaks, so
+// any in a record are whitespace and are dropped
+export function* exportRecordLines(filePath: string): Generator<Buffer> {
+  for (const [key, raw] of scanExportChain(filePath)) {
+    if (key === null) {
+      const line =
+        raw.includes(0x0a) || raw.includes(0x0d)
+          ? raw.filter((byte) => byte !== 0x0a && byte !== 0x0d)
+          : raw;
+      yield Buffer.concat([line, NEWLINE]);
+    }
+  }
+}
+
+// Written to a run's export folder once the run has succeeded, so readers
+// without the app's run list, like LocalSurferReader in the Python SDK, can
+// skip runs that failed, were stopped or are still being written
+export const RUN_COMPLETE_FILE = '.surfer-complete';
+
+export const markRunComplete = (folderPath: string) => {
+  try {
+    fs.writeFileSync(
+      path.join(folderPath, RUN_COMPLETE_FILE),
+      JSON.stringify({ completedAt: new Date().toISOString() }),
+    );
+  } catch (error) {
+    console.error('Error marking run complete:', error);
+  }
+};
+
+export const clearRunComplete = (folderPath: string) => {
+  fs.rmSync(path.join(folderPath, RUN_COMPLETE_FILE), { force: true });
+};
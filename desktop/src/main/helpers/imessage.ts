@@ -4,6 +4,7 @@ import fs from 'fs';
 import path from 'path';
 import { promisify } from 'util';
 import { mainWindow } from '../main';
+import { markRunComplete } from './exports';
 import { getTotalFolderSize } from './platforms';
 const execAsync = promisify(exec);
 
@@ -95,6 +96,37 @@ async function checkPythonAvailability(): Promise<string | null> {
   return null;
 }
 
+// Flags for the exporter scripts. Exports are incremental unless turned off
+// in export_options.json in the platform folder, which can also set:
+//   { "incremental": false, "timestamps": "epoch", "extended": true,
+//     "copyAttachments": true, "snapshot": "backup" }
+// Incremental runs only export new messages, as a delta on the previous run
+const getExportFlags = (platformPath: string): string[] => {
+  let options: any = {};
+  try {
+    options = JSON.parse(
+      fs.readFileSync(path.join(platformPath, 'export_options.json'), 'utf-8'),
+    );
+  } catch (error) {
+    options = {};
+  }
+
+  const flags: string[] = [];
+  if (options.incremental !== false) flags.push('--incremental');
+  if (['iso', 'epoch'].includes(options.timestamps)) {
+    flags.push(`--timestamps=${options.timestamps}`);
+  }
+  if (options.extended) flags.push('--extended');
+  // Attachments are only on disk on Mac, the snapshot mode only applies there
+  if (process.platform === 'darwin') {
+    if (options.copyAttachments) flags.push('--copy-attachments');
+    if (['readonly', 'backup'].includes(options.snapshot)) {
+      flags.push(`--snapshot=${options.snapshot}`);
+    }
+  }
+  return flags;
+};
+
 export async function getImessageData(
   event: any,
   company: string,
@@ -206,6 +238,7 @@ export async function getImessageData(
                 password,
                 app.getPath('userData'),
                 id,
+                ...getExportFlags(imessagePath),
               ],
               { shell: true },
             );
@@ -245,6 +278,7 @@ export async function getImessageData(
               id,
               'iMessage export complete!',
             );
+            markRunComplete(outputDir);
             mainWindow?.webContents.send(
               'export-complete',
               company,
@@ -282,6 +316,9 @@ export async function getImessageData(
 
       const scriptPath = getAssetPath('imessage_mac.py');
       const userDataPath = app.getPath('userData');
+      const flags = getExportFlags(
+        path.join(userDataPath, 'exported_data', company, name),
+      );
 
       // Quote paths that may contain spaces
       const quotedScriptPath = `"${scriptPath}"`;
@@ -290,7 +327,7 @@ export async function getImessageData(
       const output = await new Promise<string>((resolve, reject) => {
         const pythonProcess = spawn(
           pythonCommand,
-          [quotedScriptPath, company, name, id, quotedUserDataPath],
+          [quotedScriptPath, company, name, id, quotedUserDataPath, ...flags],
           {
             shell: true,
             windowsVerbatimArguments: process.platform === 'win32'
@@ -331,6 +368,7 @@ export async function getImessageData(
         id,
         'iMessage export complete!',
       );
+      markRunComplete(outputDir);
       mainWindow?.webContents.send(
         'export-complete',
         company,
@@ -52,7 +52,7 @@ export async function convertMboxToJson(
           data.content.push(jsonMessage);
         });
 
-        fs.writeFileSync(jsonOutputPath, JSON.stringify(data, null, 2));
+        fs.writeFileSync(jsonOutputPath, JSON.stringify(data));
         console.log('MBOX to JSON conversion completed');
         resolve();
       })
@@ -180,10 +180,7 @@ export async function processNotionExport(
     `${platformId}-${timestamp}.json`
   );
   
-  fs.writeFileSync(
-    jsonOutputPath,
-    JSON.stringify(exportData, null, 2)
-  );
+  fs.writeFileSync(jsonOutputPath, JSON.stringify(exportData));
 
   return { jsonOutputPath, exportData };
 }
@@ -247,7 +244,7 @@ export function parseChatGPTConversations(extractPath: string, platformId: strin
     runID: platformId,
     timestamp: timestamp,
     content: parsedConversations
-  }, null, 2));
+  }));
 
   return outputPath;
 }
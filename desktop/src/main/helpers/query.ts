@@ -0,0 +1,145 @@
+// Filters and field projection for /api/get, applied to the records of an
+// export before they are serialized, so clients only receive what they need.
+//
+// `where` maps a field to a value it must equal, or to a range or set:
+//   { contact: 'Ann', is_from_me: false, timestamp: { gte: '2024-01-01' } }
+// `fields` lists the fields to keep in each record.
+
+const OPERATORS = ['eq', 'ne', 'gt', 'gte', 'lt', 'lte', 'in'];
+
+export type RecordQuery = {
+  where?: Record<string, any>;
+  fields?: string[];
+};
+
+const isPlainObject = (value: any) =>
+  value !== null && typeof value === 'object' && !Array.isArray(value);
+
+// Check a request's where/fields, returning an error message if they are invalid
+export const validateRecordQuery = (query: RecordQuery): string | null => {
+  const { where, fields } = query;
+  if (where !== undefined && where !== null) {
+    if (!isPlainObject(where)) return '`where` must be an object';
+    for (const [field, condition] of Object.entries(where)) {
+      if (!isPlainObject(condition)) continue;
+      const unknown = Object.keys(condition).filter(
+        (op) => !OPERATORS.includes(op),
+      );
+      if (unknown.length) {
+        return `Unknown operator ${unknown.join(', ')} for ${field}, use one of ${OPERATORS.join(', ')}`;
+      }
+      if (condition.in !== undefined && !Array.isArray(condition.in)) {
+        return `\`in\` for ${field} must be a list`;
+      }
+    }
+  }
+  if (
+    fields !== undefined &&
+    fields !== null &&
+    (!Array.isArray(fields) || fields.some((f) => typeof f !== 'string'))
+  ) {
+    return '`fields` must be a list of field names';
+  }
+  return null;
+};
+
+export const hasRecordQuery = (query: RecordQuery) =>
+  Boolean(
+    (query.where && Object.keys(query.where).length) || query.fields?.length,
+  );
+
+// ISO 8601 dates and date-times, with or without an offset
+const ISO_DATE =
+  /^\d{4}-\d{2}-\d{2}(?:[T ]\d{2}:\d{2}(?::\d{2}(?:\.\d+)?)?(?:Z|[+-]\d{2}:?\d{2})?)?$/i;
+
+// Epoch milliseconds of an ISO 8601 string, or null for anything else.
+// Values without an offset are local time, as in the exports that write
+// them, and that includes plain dates, which Date.parse would read as UTC
+export const isoTime = (value: any): number | null => {
+  if (typeof value !== 'string') return null;
+  const text = value.trim();
+  if (!ISO_DATE.test(text)) return null;
+  const normalized = (text.length === 10 ? `${text}T00:00` : text)
+    .replace(' ', 'T')
+    .replace(/([+-]\d{2})(\d{2})$/, '$1:$2');
+  const time = Date.parse(normalized);
+  return Number.isNaN(time) ? null : time;
+};
+
+// Dates compare as instants: when either side is an ISO date, both are read
+// as epoch milliseconds, so offsets and fractions of a second don't change
+// the order, and ISO bounds work on epoch millisecond exports. Otherwise
+// numbers compare as numbers and strings as strings
+const compare = (value: any, bound: any): number | null => {
+  if (value === null || value === undefined) return null;
+  if (typeof value === 'number' && typeof bound === 'number') {
+    return value - bound;
+  }
+  const valueTime = isoTime(value);
+  const boundTime = isoTime(bound);
+  if (valueTime !== null || boundTime !== null) {
+    const a = valueTime ?? (typeof value === 'number' ? value : null);
+    const b = boundTime ?? (typeof bound === 'number' ? bound : null);
+    return a === null || b === null ? null : a - b;
+  }
+  if (typeof value === 'string' && typeof bound === 'string') {
+    if (value === bound) return 0;
+    return value < bound ? -1 : 1;
+  }
+  const a = typeof value === 'string' ? Date.parse(value) : Number(value);
+  const b = typeof bound === 'string' ? Date.parse(bound) : Number(bound);
+  if (Number.isNaN(a) || Number.isNaN(b)) return null;
+  return a - b;
+};
+
+const matchesCondition = (value: any, condition: any) => {
+  if (!isPlainObject(condition)) return value === condition;
+  return Object.entries(condition).every(([op, bound]: [string, any]) => {
+    if (op === 'eq') return value === bound;
+    if (op === 'ne') return value !== bound;
+    if (op === 'in') return bound.includes(value);
+    const order = compare(value, bound);
+    if (order === null) return false;
+    if (op === 'gt') return order > 0;
+    if (op === 'gte') return order >= 0;
+    if (op === 'lt') return order < 0;
+    return order <= 0;
+  });
+};
+
+// Build a predicate for the `where` conditions, or null when there are none
+const recordFilter = (where?: Record<string, any>) => {
+  const conditions = Object.entries(where || {});
+  if (!conditions.length) return null;
+  return (record: any) =>
+    conditions.every(([field, condition]) =>
+      matchesCondition(record?.[field], condition),
+    );
+};
+
+const projectRecord = (record: any, fields: string[]) => {
+  const projected: any = {};
+  for (const field of fields) {
+    if (record && field in record) projected[field] = record[field];
+  }
+  return projected;
+};
+
+// Filter and project records in a single pass
+export const applyRecordQuery = (records: any[], query: RecordQuery) =>
+  hasRecordQuery(query) ? selectRecords(records, query) : records;
+
+// The records matching a query, projected, as a new list. Takes any
+// iterable, so records read one at a time are never all held at once
+export const selectRecords = (records: Iterable<any>, query: RecordQuery) => {
+  const filter = recordFilter(query.where);
+  const fields = query.fields?.length ? query.fields : null;
+
+  const result = [];
+  for (const record of records) {
+    if (!filter || filter(record)) {
+      result.push(fields ? projectRecord(record, fields) : record);
+    }
+  }
+  return result;
+};
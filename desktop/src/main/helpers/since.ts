@@ -0,0 +1,154 @@
+// Cursors for /api/get `since` requests, so clients that poll a platform only
+// receive the records added after their previous call.
+//
+// A cursor names the run it was taken from, plus the newest added_to_db and
+// numeric record ID seen in it:
+//   { runID: 'gmail-001-1731366000000', addedToDb: '2024-11-11T23:11:15.032Z', recordId: null }
+
+import crypto from 'crypto';
+
+export type RecordCursor = {
+  runID?: string;
+  addedToDb?: string | null;
+  recordId?: number | null;
+};
+
+// Read the records of a run's export, or null when they are gone
+export type RunReader = (run: any) => any[] | null;
+
+// Read the keys of a run's records (see recordKey), or null when they are gone
+export type KeyReader = (run: any) => Set<string> | null;
+
+// Runs whose record keys cachedKeyReader keeps
+const MAX_CACHED_RUNS = 16;
+
+// Identify a record across runs. added_to_db is left out because exports
+// like the Gmail takeout stamp every record with the time of the conversion,
+// so the same email would look new in every run. Records without an ID are
+// identified by a digest of their contents, which keeps cached keys small
+export const recordKey = (record: any) => {
+  if (record?.id !== undefined) return String(record.id);
+  if (record === null || typeof record !== 'object') {
+    return JSON.stringify(record);
+  }
+  const { added_to_db: addedToDb, ...rest } = record;
+  return crypto.createHash('sha1').update(JSON.stringify(rest)).digest('base64');
+};
+
+const keysOf = (records: any[]) => new Set(records.map(recordKey));
+
+// Read the record keys of runs once, so clients polling with a cursor don't
+// have every run they are behind on parsed again on each call. `version(run)`
+// changes whenever the run's export does, and is null when it is gone
+export const cachedKeyReader = (
+  readRecords: RunReader,
+  version: (run: any) => string | null,
+  maxRuns = MAX_CACHED_RUNS,
+): KeyReader => {
+  const cache = new Map<string, Set<string>>();
+  return (run: any) => {
+    const cacheKey = version(run);
+    if (!cacheKey) return null;
+    let keys = cache.get(cacheKey);
+    if (keys) {
+      // Most recently used last
+      cache.delete(cacheKey);
+    } else {
+      const records = readRecords(run);
+      if (!records) return null;
+      keys = keysOf(records);
+    }
+    cache.set(cacheKey, keys);
+    if (cache.size > maxRuns) cache.delete(cache.keys().next().value!);
+    return keys;
+  };
+};
+
+// Keep only the records added after a cursor returned by a previous call.
+// `runs` are the platform's successful runs, latest first, and `records` the
+// latest run's records.
+//
+// Within the cursor's own run, records are compared on added_to_db. Once
+// there are newer runs, every run after the cursor's is diffed against it,
+// so records that only appeared in a run in between are returned too. Runs
+// in between are compared by their keys from `readKeys`, and only read when
+// they have records that neither the cursor's run nor the latest run has.
+// Without the cursor's run, records with a higher numeric ID are returned,
+// or everything when records have no numeric IDs.
+export const recordsSince = (
+  records: any[],
+  since: RecordCursor | null | undefined,
+  runs: any[],
+  readRecords: RunReader,
+  readKeys: KeyReader = (run: any) => {
+    const runRecords = readRecords(run);
+    return runRecords && keysOf(runRecords);
+  },
+) => {
+  if (!since) {
+    return records;
+  }
+
+  if (since.runID === runs[0]?.id) {
+    if (!since.addedToDb) return [];
+    return records.filter(
+      (r) => r?.added_to_db && r.added_to_db > since.addedToDb!,
+    );
+  }
+
+  const sinceIndex = runs.findIndex((r: any) => r.id === since.runID);
+  const seen = sinceIndex > 0 ? readKeys(runs[sinceIndex]) : null;
+  if (seen) {
+    const latestKeys = records.map(recordKey);
+    const latest = new Set(latestKeys);
+    const added = new Map<string, any>();
+    const addNew = (runRecords: any[], keys?: string[]) => {
+      runRecords.forEach((record, i) => {
+        const key = keys ? keys[i] : recordKey(record);
+        if (!seen.has(key)) added.set(key, record);
+      });
+    };
+    // Records a run added that were gone again by the latest run
+    const hasRemoved = (keys: Set<string>) => {
+      for (const key of keys) {
+        if (!seen.has(key) && !latest.has(key)) return true;
+      }
+      return false;
+    };
+    // Oldest first, so the latest version of a record wins
+    for (let i = sinceIndex - 1; i > 0; i -= 1) {
+      const keys = readKeys(runs[i]);
+      if (keys && hasRemoved(keys)) addNew(readRecords(runs[i]) || []);
+    }
+    addNew(records, latestKeys);
+    return [...added.values()];
+  }
+
+  if (since.recordId !== undefined && since.recordId !== null) {
+    return records.filter((r) => Number(r?.id) > Number(since.recordId));
+  }
+
+  return records;
+};
+
+// Build the cursor a client passes back as `since` to resume from this run
+export const cursorFor = (
+  runID: string,
+  records: Iterable<any>,
+): RecordCursor => {
+  let addedToDb = null;
+  let recordId = null;
+  for (const record of records) {
+    if (
+      record?.added_to_db &&
+      (!addedToDb || record.added_to_db > addedToDb)
+    ) {
+      addedToDb = record.added_to_db;
+    }
+    const id = Number(record?.id);
+    if (!Number.isNaN(id) && (recordId === null || id > recordId)) {
+      recordId = id;
+    }
+  }
+  return { runID, addedToDb, recordId };
+};
@@ -26,6 +26,22 @@ import {
   processNotionExport,
 } from './helpers/platforms';
 import { getImessageData } from './helpers/imessage';
+import { drained, openResponseStream, sendPayload } from './helpers/encoding';
+import {
+  applyRecordQuery,
+  hasRecordQuery,
+  selectRecords,
+  validateRecordQuery,
+} from './helpers/query';
+import { cachedKeyReader, cursorFor, recordsSince } from './helpers/since';
+import {
+  clearRunComplete,
+  exportRecordLines,
+  findExportFile,
+  markRunComplete,
+  readExport,
+  scanExportChain,
+} from './helpers/exports';
 import MenuBuilder from './helpers/menu';
 import {
   getLinkedinCredentials,
@@ -56,6 +72,9 @@ if (!gotTheLock) {
 
 const port = 2024;
 
+// Exports whose metadata, record count and cursor are kept for streaming
+const MAX_EXPORT_SUMMARIES = 16;
+
 // Add this function to check if server is running
 const isServerRunning = async (): Promise<boolean> => {
   try {
@@ -89,14 +108,17 @@ const setupExpressServer = async () => {
     res.json({ status: 'ok' });
   });
 
-  expressApp.post('/api/get', async (req, res) => {
-    console.log('GET REQUEST: ', req.body);
-    const { platformId } = req.body;
-
+  // Ask the renderer for the current list of runs
+  const getRuns = async (): Promise<any[]> => {
     mainWindow?.webContents.send('get-runs');
-    const runsResponse: any = await new Promise((resolve) => {
+    return new Promise((resolve) => {
       ipcMain.once('get-runs-response', (event, runs) => resolve(runs));
     });
+  };
+
+  // Return the successful runs for a platform, latest first
+  const getSuccessfulRuns = async (platformId: string) => {
+    const runsResponse = await getRuns();
 
     // Filter runs for this platform with successful status
     const successfulRuns = runsResponse.filter(
@@ -105,63 +127,317 @@ const setupExpressServer = async () => {
 
     console.log('successful runs: ', successfulRuns);
 
-    if (successfulRuns.length === 0) {
-      return res.status(404).json({
-        success: false,
-        error: 'No successful runs found for this platform, please export data first',
-      });
-    }
-
-    // Sort by startDate descending and get latest
-    const latestRun = successfulRuns.sort(
+    // Sort by startDate descending
+    return successfulRuns.sort(
       (a: any, b: any) =>
         new Date(b.endDate || b.startDate).getTime() -
         new Date(a.endDate || b.startDate).getTime(),
-    )[0];
+    );
+  };
 
+  // Records as lines of newline-delimited JSON
+  function* jsonLines(records: Iterable<any>) {
+    for (const record of records) yield `${JSON.stringify(record)}\n`;
+  }
 
+  // Write a header and then lines of newline-delimited JSON, waiting for the
+  // socket to drain so large exports are never buffered in full on either
+  // side. Stops as soon as the client disconnects, or the lines fail
+  const streamRecords = async (
+    req: any,
+    res: any,
+    header: any,
+    lines: Iterable<string | Buffer>,
+  ) => {
+    res.status(200).type('application/x-ndjson');
+    const body = openResponseStream(req, res);
+    body.on('error', (error) => console.error('Error streaming records:', error));
+    body.write(`${JSON.stringify(header)}\n`);
+    try {
+      for (const line of lines) {
+        const written = !res.destroyed && body.write(line);
+        if (!written && !(await drained(body, res))) {
+          console.log('Stopped streaming, the client disconnected');
+          body.destroy();
+          res.destroy();
+          return;
+        }
+      }
+    } catch (error) {
+      // Too late for an error status, cut the response short instead
+      console.error('Error streaming records:', error);
+      body.destroy();
+      res.destroy();
+      return;
+    }
+    body.end();
+  };
+
+  // Read an export chain from disk one record at a time for its metadata,
+  // record count and cursor, which streamed responses send ahead of the
+  // records. Kept per export version, so streaming a run again only copies
+  // its records
+  const exportSummaries = new Map<string, any>();
+  const summarizeExport = (
+    filePath: string,
+    runID: string,
+    version: string,
+  ) => {
+    let summary = exportSummaries.get(version);
+    if (summary) return summary;
+
+    const metadata: any = {};
+    let total = 0;
+    function* records() {
+      for (const [key, raw] of scanExportChain(filePath)) {
+        const value = JSON.parse(raw.toString('utf8'));
+        if (key === null) {
+          total += 1;
+          yield value;
+        } else {
+          metadata[key] = value;
+        }
+      }
+    }
+    const cursor = cursorFor(runID, records());
+    summary = { metadata, total, cursor };
+    exportSummaries.set(version, summary);
+    if (exportSummaries.size > MAX_EXPORT_SUMMARIES) {
+      exportSummaries.delete(exportSummaries.keys().next().value!);
+    }
+    return summary;
+  };
+
+  // Records of an export chain parsed one at a time
+  function* parseExportRecords(filePath: string) {
+    for (const [key, raw] of scanExportChain(filePath)) {
+      if (key === null) yield JSON.parse(raw.toString('utf8'));
+    }
+  }
+
+  // Records of a run's export, for diffing newer runs against it
+  const readRunRecords = (run: any) => {
+    const filePath = fs.existsSync(run.exportPath)
+      ? findExportFile(run.exportPath)
+      : null;
+    if (!filePath) return null;
+    try {
+      return readExport(filePath).content;
+    } catch (error) {
+      console.error('Error reading export:', error);
+      return null;
+    }
+  };
+
+  // Record keys of runs' exports, kept across `since` requests. Keyed by the
+  // export's size and mtime, so a rewritten export is read again
+  const readRunKeys = cachedKeyReader(readRunRecords, (run: any) => {
+    const filePath = fs.existsSync(run.exportPath)
+      ? findExportFile(run.exportPath)
+      : null;
+    if (!filePath) return null;
+    const stats = fs.statSync(filePath);
+    return `${filePath}-${stats.size}-${Math.floor(stats.mtimeMs)}`;
+  });
+
+  expressApp.post('/api/get', async (req, res) => {
+    console.log('GET REQUEST: ', req.body);
+    const { platformId, stream, since, where, fields } = req.body;
+    const query = { where, fields };
+
+    const queryError = validateRecordQuery(query);
+    if (queryError) {
+      return res.status(400).json({ success: false, error: queryError });
+    }
+    const filtered = hasRecordQuery(query);
+
+    const runs = await getSuccessfulRuns(platformId);
+    const latestRun = runs[0];
+
+    if (!latestRun) {
+      return res.status(404).json({
+        success: false,
+        error: 'No successful runs found for this platform, please export data first',
+      });
+    }
 
     console.log('latest run: ', latestRun.id);
-    const exportPath = fs.readdirSync(latestRun.exportPath);
-    const jsonFile = exportPath.find((file: any) => file.endsWith('.json'));
+    const filePath = findExportFile(latestRun.exportPath);
 
-    if (!jsonFile) {
+    if (!filePath) {
       return res
         .status(404)
         .json({ success: false, error: 'No JSON file found in export path' });
     }
 
-    const filePath = path.join(latestRun.exportPath, jsonFile);
-    const fileData = JSON.parse(fs.readFileSync(filePath, 'utf8'));
-    res.json({ success: true, data: fileData });
+    // Full responses are identified by run and file version so SDK caches
+    // can revalidate without the export being read or sent again. Streams
+    // are a different representation of the run, so they get their own tag
+    const stats = fs.statSync(filePath);
+    const version = `${latestRun.id}-${stats.size}-${Math.floor(stats.mtimeMs)}`;
+    let etag: string | undefined;
+    if (!since && !filtered) {
+      etag = stream ? `"${version}-ndjson"` : `"${version}"`;
+      res.set('ETag', etag);
+      if (req.get('If-None-Match') === etag) {
+        return res.status(304).end();
+      }
+    }
+
+    // Streams without `since` read the export from disk a record at a time,
+    // copying records as they are unless a query has to look inside them
+    if (stream && !since) {
+      let summary;
+      let records;
+      try {
+        summary = summarizeExport(filePath, latestRun.id, version);
+        records = filtered
+          ? selectRecords(parseExportRecords(filePath), query)
+          : null;
+      } catch (error) {
+        console.error('Error reading export:', error);
+        return res.status(500).json({ success: false, error: error.message });
+      }
+      return streamRecords(
+        req,
+        res,
+        {
+          success: true,
+          ...summary.metadata,
+          total: records ? records.length : summary.total,
+          cursor: summary.cursor,
+          exportPath: latestRun.exportPath,
+          etag,
+        },
+        records ? jsonLines(records) : exportRecordLines(filePath),
+      );
+    }
+
+    let fileData;
+    try {
+      fileData = readExport(filePath);
+    } catch (error) {
+      console.error('Error reading export:', error);
+      return res.status(500).json({ success: false, error: error.message });
+    }
+    const { content: allRecords, ...metadata } = fileData;
+    // Filters and projection run before serializing, so only matching
+    // records and the requested fields are sent
+    const records = applyRecordQuery(
+      recordsSince(allRecords, since, runs, readRunRecords, readRunKeys),
+      query,
+    );
+    const cursor = cursorFor(latestRun.id, allRecords);
+
+    if (stream) {
+      return streamRecords(
+        req,
+        res,
+        {
+          success: true,
+          ...metadata,
+          total: records.length,
+          cursor,
+          exportPath: latestRun.exportPath,
+          etag,
+        },
+        jsonLines(records),
+      );
+    }
+
+    if (since || filtered) {
+      return sendPayload(req, res, {
+        success: true,
+        data: { ...metadata, content: records },
+        cursor,
+      });
+    }
+
+    return sendPayload(req, res, { success: true, data: fileData, cursor });
   });
 
+  const finishedStatuses = ['success', 'error', 'stopped'];
+
+  // Wait for the renderer to start a run for this platform. Several API
+  // exports can be starting at once, so runs for other platforms are ignored.
+  const waitForRunStart = (platformId: string, timeoutMs = 30000) =>
+    new Promise<any>((resolve, reject) => {
+      const onRunStarted = (event: any, run: any) => {
+        if (run?.platformId === platformId) {
+          clearTimeout(timeout);
+          ipcMain.removeListener('run-started', onRunStarted);
+          resolve(run);
+        }
+      };
+      const timeout = setTimeout(() => {
+        ipcMain.removeListener('run-started', onRunStarted);
+        reject(new Error('Export did not start, is the platform connected?'));
+      }, timeoutMs);
+      ipcMain.on('run-started', onRunStarted);
+    });
+
+  // Snapshot of a run for export job handles
+  const describeRun = (run: any) => {
+    const steps = (run.tasks || []).flatMap((task: any) => task.steps || []);
+    const completedSteps = steps.filter(
+      (step: any) => step.status === 'success',
+    );
+    const runPath = path.join(
+      app.getPath('userData'),
+      'exported_data',
+      run.company,
+      run.name,
+      run.id,
+    );
+    return {
+      success: true,
+      runID: run.id,
+      platformId: run.platformId,
+      status: run.status,
+      done: finishedStatuses.includes(run.status),
+      startDate: run.startDate,
+      endDate: run.endDate || null,
+      exportPath: run.exportPath || null,
+      progress: {
+        currentStep: run.currentStep || null,
+        completedSteps: completedSteps.length,
+        totalSteps: steps.length,
+        bytesWritten:
+          run.exportSize ||
+          (fs.existsSync(runPath) ? getTotalFolderSize(runPath) : 0),
+        elapsedMs:
+          new Date(run.endDate || Date.now()).getTime() -
+          new Date(run.startDate).getTime(),
+      },
+    };
+  };
+
   expressApp.post('/api/export', async (req, res) => {
     console.log('Export request: ', req.body);
-    const { platformId } = req.body;
+    const { platformId, wait = true } = req.body;
 
     try {
+      const runStarted = waitForRunStart(platformId);
       mainWindow?.webContents.send('api-export', platformId);
 
-      // Get initial run with timeout
-      const currentRun: any = await new Promise((resolve) => {
-        ipcMain.once('run-started', (event, run) => resolve(run));
-      });
+      const currentRun: any = await runStarted;
 
       console.log('Found current run:', currentRun.id);
 
-      // Monitor run status with timeout
-      const finalRun = await new Promise((resolve) => {
+      // Return a job handle straight away, the client polls /api/export/:runId
+      if (!wait) {
+        return res.status(202).json(describeRun(currentRun));
+      }
+
+      // Monitor run status until it finishes
+      const finalRun: any = await new Promise((resolve) => {
         const checkRunStatus = async () => {
-          mainWindow?.webContents.send('get-runs');
-          const runsResponse: any = await new Promise((resolve) => {
-            ipcMain.once('get-runs-response', (event, runs) => resolve(runs));
-          });
+          const runsResponse = await getRuns();
 
           const finalRun = runsResponse.find(
             (r: any) => r.id === currentRun.id,
           );
-          if (finalRun?.status === 'success') {
+          if (finishedStatuses.includes(finalRun?.status)) {
             clearInterval(statusInterval);
             resolve(finalRun);
           }
@@ -171,22 +447,24 @@ const setupExpressServer = async () => {
       });
 
       console.log('final run status: ', finalRun.status);
+      if (finalRun.status !== 'success') {
+        throw new Error(`Export ${finalRun.status}`);
+      }
+
       // Process results
       const latestRunPath = finalRun.exportPath;
       if (!fs.existsSync(latestRunPath)) {
         throw new Error('Export path not found');
       }
 
-      const files = fs.readdirSync(latestRunPath);
-      const jsonFile = files.find((file) => file.endsWith('.json'));
-      if (!jsonFile) {
+      const filePath = findExportFile(latestRunPath);
+      if (!filePath) {
         throw new Error('No JSON file found in export folder');
       }
 
-      const filePath = path.join(latestRunPath, jsonFile);
-      const fileData = JSON.parse(fs.readFileSync(filePath, 'utf8'));
+      const fileData = readExport(filePath);
 
-      res.json({
+      await sendPayload(req, res, {
         success: true,
         data: fileData,
         exportPath: path.dirname(filePath),
@@ -201,6 +479,25 @@ const setupExpressServer = async () => {
     }
   });
 
+  expressApp.get('/api/export/:runId', async (req, res) => {
+    const run = (await getRuns()).find((r: any) => r.id === req.params.runId);
+    if (!run) {
+      return res.status(404).json({ success: false, error: 'Run not found' });
+    }
+    res.json(describeRun(run));
+  });
+
+  expressApp.post('/api/export/:runId/cancel', async (req, res) => {
+    const run = (await getRuns()).find((r: any) => r.id === req.params.runId);
+    if (!run) {
+      return res.status(404).json({ success: false, error: 'Run not found' });
+    }
+    if (!finishedStatuses.includes(run.status)) {
+      mainWindow?.webContents.send('api-stop-run', run.id);
+    }
+    res.json({ success: true, runID: run.id });
+  });
+
   expressApp
     .listen(port, () => {
       console.log(`Server is running on port ${port}`);
@@ -661,6 +958,7 @@ export const createWindow = async (visible: boolean = true) => {
                     );
                     console.log('MBOX converted to JSON:', jsonOutputPath);
 
+                    markRunComplete(extractPath);
                     mainWindow?.webContents.send(
                       'export-complete',
                       'Google',
@@ -691,6 +989,7 @@ export const createWindow = async (visible: boolean = true) => {
                       timestamp,
                     );
 
+                  markRunComplete(extractPath);
                   mainWindow?.webContents.send(
                     'export-complete',
                     'Notion',
@@ -720,6 +1019,7 @@ export const createWindow = async (visible: boolean = true) => {
                     platformId,
                     timestamp,
                   );
+                  markRunComplete(extractPath);
                   mainWindow?.webContents.send(
                     'export-complete',
                     'OpenAI',
@@ -756,6 +1056,7 @@ export const createWindow = async (visible: boolean = true) => {
             }
           } else {
             console.log('Non-zip file. No extraction needed.');
+            markRunComplete(idPath);
             mainWindow?.webContents.send(
               'export-complete',
               path.basename(companyPath),
@@ -838,6 +1139,8 @@ ipcMain.on(
           platformId,
           `${platformId}.json`,
         );
+    // The file is being rewritten, readers shouldn't pick it up until it's done
+    clearRunComplete(path.dirname(filePath));
 
     let existingData;
     if (fs.existsSync(filePath)) {
@@ -871,7 +1174,7 @@ ipcMain.on(
         timestamp: Date.now(),
         content: [],
       };
-      fs.writeFileSync(filePath, JSON.stringify(existingData, null, 2));
+      fs.writeFileSync(filePath, JSON.stringify(existingData));
     }
 
     let parsedData = JSON.parse(data);
@@ -883,7 +1186,7 @@ ipcMain.on(
     existingData.content.push(parsedData);
 
     // Write the updated data
-    fs.writeFileSync(filePath, JSON.stringify(existingData, null, 2));
+    fs.writeFileSync(filePath, JSON.stringify(existingData));
   },
 );
 
@@ -923,6 +1226,7 @@ ipcMain.on(
 
     if (fs.existsSync(filePath)) {
       // here folder path is sent, but could we send filepath?
+      markRunComplete(folderPath);
       mainWindow?.webContents.send(
         'export-complete',
         company,
@@ -952,23 +1256,20 @@ ipcMain.on(
 
     const filePath = path.join(exportPath, `${platformId}_${Date.now()}.json`);
 
-    // Write data
+    // Write data compactly, exports are read by the API rather than by hand
     fs.writeFileSync(
       filePath,
-      JSON.stringify(
-        {
-          company,
-          name,
-          runID,
-          timestamp: Date.now(),
-          content: Array.isArray(content) ? content : [content],
-        },
-        null,
-        2,
-      ),
+      JSON.stringify({
+        company,
+        name,
+        runID,
+        timestamp: Date.now(),
+        content: Array.isArray(content) ? content : [content],
+      }),
     );
 
     // Notify completion
+    markRunComplete(exportPath);
     mainWindow?.webContents.send(
       'export-complete',
       company,
@@ -1,6 +1,6 @@
 import React, { useEffect, useState, useCallback, useRef } from 'react';
 import { useDispatch, useSelector } from 'react-redux';
-import { startRun, toggleRunVisibility, setExportRunning, updateExportStatus, addRun } from '../state/actions';
+import { startRun, stopRun, toggleRunVisibility, setExportRunning, updateExportStatus, addRun } from '../state/actions';
 import { Table, TableBody, TableCell, TableHead, TableHeader, TableRow } from "./ui/table";
 import { Button } from "./ui/button";
 import { ArrowUpRight, Check, X, Link, Search, ChevronLeft, ChevronRight, Eye } from 'lucide-react';
@@ -67,6 +67,16 @@ useEffect(() => {
     };
 }, [runs]); // Add runs as dependency
 
+useEffect(() => {
+    // Cancel a single run when requested through the API
+    const handleAPIStopRun = (runId) => {
+        dispatch(stopRun(runId));
+    };
+
+    // on() returns its own unsubscribe function
+    return window.electron.ipcRenderer.on('api-stop-run', handleAPIStopRun);
+}, [dispatch]);
+
   const getLatestRun = (platformId) => {
     const platformRuns = runs.filter(run => run.platformId === platformId);
     if (platformRuns.length === 0) return null;
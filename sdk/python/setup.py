@@ -10,6 +10,11 @@ setup(
     install_requires=[
         "requests>=2.25.1",
     ],
+    extras_require={
+        "async": ["aiohttp>=3.8"],
+        "table": ["pyarrow>=10", "pandas>=1.0"],
+        "speedups": ["orjson>=3.6", "msgpack>=1.0", "brotli>=1.0"],
+    },
     python_requires=">=3.7",
     url="https://github.com/Surfer-Org/Protocol/tree/main/sdk/python",
     license="MIT",
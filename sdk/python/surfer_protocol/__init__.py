@@ -1,3 +1,9 @@
 from .client import SurferClient
+from .async_client import AsyncSurferClient
+from .cache import ResponseCache
+from .jobs import ExportJob, wait_all
+from .metrics import CallMetrics, MetricsAggregator
+from .search import SearchIndex
+from .local import LocalSurferReader
 
-__all__ = ['SurferClient']
+__all__ = ['SurferClient', 'AsyncSurferClient', 'ResponseCache', 'ExportJob', 'wait_all', 'CallMetrics', 'MetricsAggregator', 'SearchIndex', 'LocalSurferReader']
\ No newline at end of file
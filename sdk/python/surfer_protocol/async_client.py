@@ -0,0 +1,136 @@
+import asyncio
+from typing import Dict, Iterable, Optional
+
+from .encoding import ACCEPT, decode
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+
+class AsyncSurferClient:
+    """asyncio counterpart of `SurferClient` for fetching many platforms concurrently.
+
+    Requests share one pooled connection and at most `max_concurrency` of them
+    are in flight at a time. The connection check runs on first use instead of
+    in the constructor, so the client can be created outside a running loop.
+
+    Usage:
+        async with AsyncSurferClient() as client:
+            results = await client.gather_platforms(["bookmarks-001", "gmail-001"])
+    """
+
+    def __init__(self, host: str = "localhost", port: int = 2024, max_concurrency: int = 8):
+        if aiohttp is None:
+            raise ImportError("AsyncSurferClient requires aiohttp. Install it with: pip install surfer-protocol[async]")
+
+        self.base_url = f"http://{host}:{port}/api"
+        self.max_concurrency = max_concurrency
+        self.session: Optional["aiohttp.ClientSession"] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._connect_lock: Optional[asyncio.Lock] = None
+
+    async def __aenter__(self) -> "AsyncSurferClient":
+        await self.connect()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def connect(self):
+        """Open the connection pool and check that the desktop app is running.
+
+        Raises:
+            ConnectionError: If connection to desktop app fails
+        """
+        if self._connect_lock is None:
+            self._connect_lock = asyncio.Lock()
+
+        async with self._connect_lock:
+            if self.session is not None:
+                return
+
+            # No overall timeout, matching SurferClient: exports can run for minutes
+            session = aiohttp.ClientSession(
+                headers={"Accept": ACCEPT},
+                connector=aiohttp.TCPConnector(limit=self.max_concurrency),
+                timeout=aiohttp.ClientTimeout(total=None),
+            )
+            try:
+                async with session.get(f"{self.base_url}/health") as response:
+                    response.raise_for_status()
+            except aiohttp.ClientError as e:
+                await session.close()
+                raise ConnectionError("Couldn't connect to the Surfer Desktop app. Is it running?") from e
+
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self.session = session
+
+    async def get(self, platform_id: str) -> dict:
+        """Get the most recent run for a specific platform.
+
+        Raises:
+            ConnectionError: If connection to desktop app fails
+            ValueError: If no successful runs are found for the platform
+        """
+        try:
+            data = await self._post("get", platform_id)
+            if not data.get('success'):
+                raise ValueError(data.get('error', 'Unknown error occurred'))
+
+            return data
+
+        except aiohttp.ClientError as e:
+            raise ConnectionError(f"Failed to get most recent run: {str(e)}") from e
+
+    async def export(self, platform_id: str) -> dict:
+        """Trigger an export for a specific platform.
+
+        Raises:
+            ConnectionError: If connection to desktop app fails
+            ValueError: If platform is not connected or export fails
+        """
+        try:
+            data = await self._post("export", platform_id)
+            if not data.get('success'):
+                raise ValueError(data.get('error', 'Export failed'))
+
+            return data
+
+        except aiohttp.ClientError as e:
+            raise ConnectionError(f"Failed to trigger export: {str(e)}") from e
+
+    async def gather_platforms(
+        self, platform_ids: Iterable[str], return_exceptions: bool = False
+    ) -> Dict[str, object]:
+        """Get the most recent run for several platforms concurrently.
+
+        Returns a dict of platform ID to response. With `return_exceptions`, a
+        platform that fails maps to its exception instead of failing the call.
+        """
+        platform_ids = list(platform_ids)
+        results = await asyncio.gather(
+            *(self.get(platform_id) for platform_id in platform_ids),
+            return_exceptions=return_exceptions,
+        )
+        return dict(zip(platform_ids, results))
+
+    async def close(self):
+        """Close the connection pool."""
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    async def _post(self, endpoint: str, platform_id: str) -> dict:
+        await self.connect()
+        async with self._semaphore:
+            async with self.session.post(f"{self.base_url}/{endpoint}", json={"platformId": platform_id}) as response:
+                # Handle 404 status codes specifically
+                if response.status == 404:
+                    error_data = await response.json()
+                    raise ValueError(error_data['error'])
+
+                # Handle other HTTP errors
+                response.raise_for_status()
+                return decode(response.headers.get("Content-Type", ""), await response.read())
@@ -0,0 +1,131 @@
+import json
+import os
+import time
+from typing import Any, Optional
+
+from .encoding import dumps, loads
+
+# Responses are stored as JSON. Files from versions that pickled them are
+# never loaded, since unpickling runs whatever code the file asks for
+CACHE_SUFFIX = ".json"
+
+
+class ResponseCache:
+    """Persistent on-disk cache of `get()` responses, keyed by platform ID and run ID.
+
+    Each platform keeps only its most recent run, stored as compact JSON and
+    decoded with orjson when it is installed. The total size on disk is bounded and the
+    least recently used entries are evicted first.
+    """
+
+    def __init__(self, directory: str = "~/.surfer/cache", max_bytes: int = 1024 ** 3, max_age: float = 0):
+        """
+        Args:
+            directory: Folder the cache files are stored in
+            max_bytes: Total size on disk before least recently used entries are evicted
+            max_age: Seconds an entry is trusted without revalidating against the
+                desktop app. With the default of 0 every read is revalidated.
+        """
+        self.directory = os.path.expanduser(directory)
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self._index_path = os.path.join(self.directory, "index.json")
+        os.makedirs(self.directory, exist_ok=True)
+
+    def lookup(self, platform_id: str) -> Optional[dict]:
+        """Return the index entry for a platform, or None if it isn't cached."""
+        entry = self._read_index().get(platform_id)
+        if entry and entry["file"].endswith(CACHE_SUFFIX) and os.path.exists(self._path(entry)):
+            return entry
+        return None
+
+    def is_fresh(self, entry: dict) -> bool:
+        """Whether an entry can be served without revalidating."""
+        return time.time() - entry["stored_at"] < self.max_age
+
+    def load(self, entry: dict) -> Any:
+        """Load a cached response and mark it as recently used."""
+        path = self._path(entry)
+        with open(path, "rb") as f:
+            data = loads(f.read())
+        os.utime(path)
+        return data
+
+    def store(self, platform_id: str, run_id: str, etag: Optional[str], data: Any):
+        """Cache the response for a platform's run, replacing any older run."""
+        index = self._read_index()
+        previous = index.get(platform_id)
+
+        entry = {
+            "run_id": run_id,
+            "etag": etag,
+            "file": f"{_safe_name(platform_id)}-{_safe_name(run_id)}{CACHE_SUFFIX}",
+            "stored_at": time.time(),
+        }
+        tmp_path = self._path(entry) + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(dumps(data))
+        os.replace(tmp_path, self._path(entry))
+
+        if previous and previous["file"] != entry["file"]:
+            self._remove(previous)
+
+        index[platform_id] = entry
+        self._evict(index)
+        self._write_index(index)
+
+    def touch(self, platform_id: str):
+        """Reset the age of an entry after the desktop app confirmed it is current."""
+        index = self._read_index()
+        if platform_id in index:
+            index[platform_id]["stored_at"] = time.time()
+            self._write_index(index)
+
+    def clear(self):
+        """Remove every cached response."""
+        for entry in self._read_index().values():
+            self._remove(entry)
+        self._write_index({})
+
+    def _evict(self, index: dict):
+        sizes = {}
+        for platform_id, entry in index.items():
+            try:
+                stat = os.stat(self._path(entry))
+                sizes[platform_id] = (stat.st_mtime, stat.st_size)
+            except FileNotFoundError:
+                continue
+
+        total = sum(size for _, size in sizes.values())
+        # Least recently used first
+        for platform_id, (_, size) in sorted(sizes.items(), key=lambda item: item[1][0]):
+            if total <= self.max_bytes:
+                break
+            self._remove(index.pop(platform_id))
+            total -= size
+
+    def _path(self, entry: dict) -> str:
+        return os.path.join(self.directory, entry["file"])
+
+    def _remove(self, entry: dict):
+        try:
+            os.remove(self._path(entry))
+        except FileNotFoundError:
+            pass
+
+    def _read_index(self) -> dict:
+        try:
+            with open(self._index_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def _write_index(self, index: dict):
+        tmp_path = self._index_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(index, f)
+        os.replace(tmp_path, self._index_path)
+
+
+def _safe_name(value: str) -> str:
+    return "".join(c if c.isalnum() or c in "-_." else "_" for c in str(value))
@@ -1,9 +1,85 @@
+import logging
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Iterable, Iterator, List, Optional, Union
+
 import requests
 
+from .cache import ResponseCache
+from .encoding import ACCEPT, decode, loads
+from .jobs import ExportJob
+from .metrics import CallMetrics, MetricsHook, TimedHTTPAdapter, connect_time, reset_connect_time
+from .search import SearchIndex, parse_since
+from . import table
+
+logger = logging.getLogger(__name__)
+
+Timestamp = Union[datetime, str, int]
+
+def _timestamp_bound(value: Timestamp) -> Union[str, int]:
+    """A start or end bound in the forms exports use.
+
+    Aware datetimes become UTC with milliseconds and a Z, and naive ones
+    stay local time, like the iMessage exports. The desktop app compares
+    dates as instants anyway, so this only keeps requests tidy.
+    """
+    if not isinstance(value, datetime):
+        return value
+    if value.tzinfo is not None:
+        return value.astimezone(timezone.utc).isoformat(timespec="milliseconds").replace("+00:00", "Z")
+    return value.isoformat(timespec="milliseconds")
+
+
+def _record_query(
+    where: Optional[dict] = None,
+    fields: Optional[List[str]] = None,
+    start: Optional[Timestamp] = None,
+    end: Optional[Timestamp] = None,
+) -> dict:
+    """Request parameters for filtering and projecting records on the desktop side."""
+    where = dict(where or {})
+    if start is not None or end is not None:
+        bounds = dict(where.get("timestamp") or {})
+        if start is not None:
+            bounds["gte"] = _timestamp_bound(start)
+        if end is not None:
+            bounds["lt"] = _timestamp_bound(end)
+        where["timestamp"] = bounds
+
+    query = {}
+    if where:
+        query["where"] = where
+    if fields:
+        query["fields"] = list(fields)
+    return query
+
 class SurferClient:
-    def __init__(self, host: str = "localhost", port: int = 2024):
+    def __init__(
+        self,
+        host: str = "localhost",
+        port: int = 2024,
+        cache: Optional[ResponseCache] = None,
+        metrics_hooks: Optional[Iterable[MetricsHook]] = None,
+        search_index: Optional[SearchIndex] = None,
+    ):
+        """
+        Args:
+            host: Host the Surfer Desktop app is listening on
+            port: Port of the Surfer Desktop app's API
+            cache: Optional `ResponseCache` for `get()` responses
+            metrics_hooks: Callables given a `CallMetrics` with the timings of
+                every call once it finishes, for example a `MetricsAggregator`.
+                More can be appended to `client.metrics_hooks` later.
+            search_index: `SearchIndex` used by `search()`. One at
+                ~/.surfer/search.db is created on first search if not given.
+        """
         self.base_url = f"http://{host}:{port}/api"
         self.session = requests.Session()
+        self.session.headers["Accept"] = ACCEPT
+        self.session.mount("http://", TimedHTTPAdapter())
+        self.cache = cache
+        self.metrics_hooks: List[MetricsHook] = list(metrics_hooks or [])
+        self.search_index = search_index
         self._check_connection()
 
     def _check_connection(self):
@@ -15,33 +91,299 @@ class SurferClient:
             raise ConnectionError("Couldn't connect to the Surfer Desktop app. Is it running?") from e
 
 
-    def get(self, platform_id: str) -> dict:
+    def get(
+        self,
+        platform_id: str,
+        where: Optional[dict] = None,
+        fields: Optional[List[str]] = None,
+        start: Optional[Timestamp] = None,
+        end: Optional[Timestamp] = None,
+    ) -> dict:
         """Get the most recent run for a specific platform.
 
+        Records can be filtered and trimmed by the desktop app before they are
+        sent, so only what's needed crosses the wire:
+        - `where`: field values records must have, e.g. `{"contact": "Ann", "is_from_me": False}`.
+          A value can also be a condition such as `{"gte": 10, "lt": 20}` or `{"in": [...]}`,
+          using the operators eq, ne, gt, gte, lt, lte and in
+        - `fields`: the only fields to keep in each record
+        - `start`, `end`: keep records whose `timestamp` is at or after `start`
+          and before `end`, given as datetimes, ISO strings or epoch milliseconds
+
+        If the client was created with a `cache`, a cached copy is served when it
+        is still fresh, or after the desktop app confirms it is current. Filtered
+        responses are not cached.
+
         Raises:
             ConnectionError: If connection to desktop app fails
-            ValueError: If no successful runs are found for the platform
+            ValueError: If no successful runs are found for the platform, or the filters are invalid
         """
+        with self._measure("get", platform_id) as metrics:
+            return self._get(platform_id, metrics, _record_query(where, fields, start, end))
+
+    def _get(self, platform_id: str, metrics: CallMetrics, query: dict) -> dict:
+        entry = self.cache.lookup(platform_id) if self.cache and not query else None
+        if entry and self.cache.is_fresh(entry):
+            metrics.cache = "hit"
+            with metrics.decoding():
+                return self.cache.load(entry)
+
+        headers = {"If-None-Match": entry["etag"]} if entry and entry["etag"] else {}
+
         try:
-            response = self.session.post(f"{self.base_url}/get", json={"platformId": platform_id})
-            
-            # Handle 404 status codes specifically
-            if response.status_code == 404:
-                error_data = response.json()
-                raise ValueError(error_data['error'])
-            
-            # Handle other HTTP errors
-            response.raise_for_status()
+            response = self._send(metrics, "POST", f"{self.base_url}/get", json={"platformId": platform_id, **query}, headers=headers)
+            if response.status_code == 304:
+                metrics.cache = "not_modified"
+                response.close()
+                self.cache.touch(platform_id)
+                with metrics.decoding():
+                    return self.cache.load(entry)
+
+            self._raise_for_status(response)
             
-            data = response.json()
+            data = self._decode(response, metrics)
             if not data.get('success'):
                 raise ValueError(data.get('error', 'Unknown error occurred'))
+
+            if self.cache and not query:
+                self.cache.store(platform_id, data['data'].get('runID'), response.headers.get('ETag'), data)
                 
             return data
             
         except requests.exceptions.RequestException as e:
             raise ConnectionError(f"Failed to get most recent run: {str(e)}") from e
 
+    def get_since(self, platform_id: str, cursor: Optional[dict] = None) -> dict:
+        """Get only the records added to a platform since a previous call.
+
+        Pass the `cursor` from the previous response to resume from it; with no
+        cursor the full most recent run is returned. The response has the same
+        shape as `get()` plus a new `cursor` to resume from next time.
+
+        Raises:
+            ConnectionError: If connection to desktop app fails
+            ValueError: If no successful runs are found for the platform
+        """
+        try:
+            with self._measure("get_since", platform_id) as metrics:
+                response = self._send(
+                    metrics,
+                    "POST",
+                    f"{self.base_url}/get",
+                    json={"platformId": platform_id, "since": cursor or {}},
+                )
+                self._raise_for_status(response)
+
+                data = self._decode(response, metrics)
+                if not data.get('success'):
+                    raise ValueError(data.get('error', 'Unknown error occurred'))
+
+                return data
+
+        except requests.exceptions.RequestException as e:
+            raise ConnectionError(f"Failed to get new records: {str(e)}") from e
+
+    def iter_records(
+        self,
+        platform_id: str,
+        chunk_size: int = 64 * 1024,
+        where: Optional[dict] = None,
+        fields: Optional[List[str]] = None,
+        start: Optional[Timestamp] = None,
+        end: Optional[Timestamp] = None,
+    ) -> Iterator[dict]:
+        """Stream the content records of the most recent run for a specific platform.
+
+        Records are read from an NDJSON response one line at a time, so memory
+        use stays flat no matter how large the export is. `where`, `fields`,
+        `start` and `end` filter and trim records on the desktop side, as in `get()`.
+
+        Raises:
+            ConnectionError: If connection to desktop app fails
+            ValueError: If no successful runs are found for the platform, or the filters are invalid
+        """
+        metrics = CallMetrics("iter_records", platform_id)
+        lines = self._stream_lines(platform_id, chunk_size, metrics, **_record_query(where, fields, start, end))
+        try:
+            next(lines, None)  # Skip the run metadata header
+            for line in lines:
+                with metrics.decoding():
+                    record = loads(line)
+                yield record
+        finally:
+            # Report the metrics now, even when the caller stops early or decoding fails
+            lines.close()
+
+    def get_table(
+        self,
+        platform_id: str,
+        columns: Optional[List[str]] = None,
+        as_pandas: bool = False,
+        table_dir: str = "~/.surfer/tables",
+    ):
+        """Get the most recent run for a platform as a columnar table.
+
+        The first call streams the run into a Parquet file in `table_dir`.
+        Later calls revalidate it with the desktop app, which answers without
+        sending any records while the run is unchanged, and only read the
+        requested `columns` from the file. Returns a pyarrow Table, or a
+        pandas DataFrame with `as_pandas`.
+
+        Raises:
+            ConnectionError: If connection to desktop app fails
+            ValueError: If no successful runs are found for the platform
+            ImportError: If pyarrow, or pandas with `as_pandas`, is not installed
+        """
+        table.require_pyarrow()
+
+        path = table.parquet_path(platform_id, table_dir)
+        source = table.source_of(path) or {}
+        headers = {"If-None-Match": source["etag"]} if source.get("etag") else None
+        lines = self._stream_lines(platform_id, 64 * 1024, CallMetrics("get_table", platform_id), headers=headers)
+        try:
+            line = next(lines, None)
+            # No header when the desktop app answered 304 Not Modified
+            if line is not None:
+                header = loads(line)
+                run_id = header['cursor']['runID']
+                # Desktop versions that don't tag streams: rebuild once the run changes
+                if header.get('etag') or run_id != source.get('run_id'):
+                    table.write_parquet(
+                        (loads(line) for line in lines),
+                        path,
+                        {"run_id": run_id, "etag": header.get('etag')},
+                    )
+        finally:
+            lines.close()
+
+        result = table.read_parquet(path, columns)
+        return result.to_pandas() if as_pandas else result
+
+    def search(
+        self,
+        query: str,
+        platforms: Optional[Iterable[str]] = None,
+        since: Union[datetime, float, str, None] = None,
+        limit: int = 20,
+        refresh: bool = True,
+        raw: bool = False,
+    ) -> List[dict]:
+        """Full-text search over exported records, best matches first.
+
+        Records are looked up in a local SQLite FTS5 index, without
+        downloading any export. With `refresh`, each platform searched is
+        first brought up to date with the records added since its last
+        update, at most once per the index's `refresh_interval`. The first
+        search of a platform indexes its whole most recent run. Without
+        `platforms`, every platform already in the index is searched.
+
+        Every word of `query` must match. With `raw`, it is passed to FTS5
+        as is. `since` keeps records dated at or after a datetime, ISO
+        string or epoch time.
+
+        Returns a list of hits with `platform_id`, `record_id`, `score`,
+        `timestamp`, `snippet` and the full `record`.
+
+        Raises:
+            ConnectionError: If connection to desktop app fails
+            ValueError: If a platform has no successful runs, or `since` can't be read as a date
+        """
+        parse_since(since)
+        if self.search_index is None:
+            self.search_index = SearchIndex()
+        index = self.search_index
+
+        platforms = list(platforms) if platforms is not None else None
+        if refresh:
+            for platform_id in platforms if platforms is not None else index.platforms():
+                if not index.is_fresh(platform_id):
+                    index.update(self, platform_id)
+
+        return index.search(query, platforms, since, limit, raw)
+
+    def _stream_lines(
+        self,
+        platform_id: str,
+        chunk_size: int,
+        metrics: CallMetrics,
+        headers: Optional[dict] = None,
+        **params,
+    ) -> Iterator[bytes]:
+        """Yield the raw NDJSON lines of a streamed `/api/get` response, header first.
+
+        Yields nothing when `headers` carry an If-None-Match the run still
+        matches. `metrics` is reported once the stream is exhausted or closed.
+        """
+        try:
+            with self._measure(metrics=metrics), self._send(
+                metrics,
+                "POST",
+                f"{self.base_url}/get",
+                json={"platformId": platform_id, "stream": True, **params},
+                headers=headers,
+            ) as response:
+                if response.status_code == 304:
+                    metrics.cache = "not_modified"
+                    return
+                self._raise_for_status(response)
+                size = 0
+                for line in response.iter_lines(chunk_size=chunk_size):
+                    size += len(line) + 1
+                    if line:
+                        yield line
+                metrics.body_received(size, response.raw.tell())
+        except requests.exceptions.RequestException as e:
+            raise ConnectionError(f"Failed to stream most recent run: {str(e)}") from e
+
+    def _send(self, metrics: CallMetrics, method: str, url: str, **kwargs) -> requests.Response:
+        """Send a request and record the connect time and time to first byte.
+
+        The body is read later, by `_decode` or by iterating the response,
+        so the transfer is timed separately.
+        """
+        reset_connect_time()
+        response = self.session.request(method, url, stream=True, **kwargs)
+        metrics.headers_received(response.status_code, connect_time())
+        return response
+
+    def _decode(self, response: requests.Response, metrics: Optional[CallMetrics] = None):
+        content = response.content
+        if metrics is None:
+            return decode(response.headers.get("Content-Type", ""), content)
+
+        metrics.body_received(len(content), response.raw.tell())
+        with metrics.decoding():
+            return decode(response.headers.get("Content-Type", ""), content)
+
+    @contextmanager
+    def _measure(self, call: Optional[str] = None, platform_id: Optional[str] = None, metrics: Optional[CallMetrics] = None):
+        """Time a call and pass its metrics to the hooks when it finishes, even if it fails."""
+        metrics = metrics or CallMetrics(call, platform_id)
+        try:
+            yield metrics
+        except GeneratorExit:
+            # A stream closed early by the caller isn't an error
+            raise
+        except BaseException as e:
+            metrics.error = e
+            raise
+        finally:
+            metrics.finish()
+            for hook in self.metrics_hooks:
+                try:
+                    hook(metrics)
+                except Exception:
+                    logger.exception("Metrics hook %r failed", hook)
+
+    def _raise_for_status(self, response: requests.Response):
+        # Handle 404 status codes and rejected filters specifically
+        if response.status_code in (400, 404):
+            error_data = response.json()
+            raise ValueError(error_data['error'])
+        
+        # Handle other HTTP errors
+        response.raise_for_status()
+
     def export(self, platform_id: str) -> dict:
         """Trigger an export for a specific platform.
         
@@ -50,17 +392,47 @@ class SurferClient:
             ValueError: If platform is not connected or export fails
         """
         try:
-            response = self.session.post(f"{self.base_url}/export", json={"platformId": platform_id})
-            response.raise_for_status()
-            data = response.json()
-            
-            if not data.get('success'):
-                raise ValueError(data.get('error', 'Export failed'))
+            with self._measure("export", platform_id) as metrics:
+                response = self._send(metrics, "POST", f"{self.base_url}/export", json={"platformId": platform_id})
+                response.raise_for_status()
+                data = self._decode(response, metrics)
                 
-            return data
+                if not data.get('success'):
+                    raise ValueError(data.get('error', 'Export failed'))
+                    
+                return data
         except requests.exceptions.RequestException as e:
             raise ConnectionError(f"Failed to trigger export: {str(e)}") from e
 
+    def start_export(self, platform_id: str) -> ExportJob:
+        """Start an export for a specific platform without waiting for it to finish.
+
+        Returns an `ExportJob` to poll, wait on or cancel.
+
+        Raises:
+            ConnectionError: If connection to desktop app fails
+            ValueError: If platform is not connected or the export doesn't start
+        """
+        try:
+            with self._measure("start_export", platform_id) as metrics:
+                response = self._send(metrics, "POST", f"{self.base_url}/export", json={"platformId": platform_id, "wait": False})
+                response.raise_for_status()
+                data = self._decode(response, metrics)
+
+                if not data.get('success'):
+                    raise ValueError(data.get('error', 'Export failed to start'))
+
+                return ExportJob(self, platform_id, data['runID'], data)
+        except requests.exceptions.RequestException as e:
+            raise ConnectionError(f"Failed to start export: {str(e)}") from e
+
+    def export_many(self, platform_ids: Iterable[str]) -> List[ExportJob]:
+        """Start exports for several platforms and return their job handles.
+
+        Use `surfer_protocol.wait_all(jobs)` to wait for all of them.
+        """
+        return [self.start_export(platform_id) for platform_id in platform_ids]
+
     def __del__(self):
         """Cleanup the session when the client is destroyed."""
         self.session.close()
\ No newline at end of file
@@ -0,0 +1,44 @@
+import json
+from typing import Any, Union
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+# Prefer MessagePack when it can be decoded, otherwise ask for JSON. Compression
+# (gzip, or brotli when installed) is negotiated by the HTTP library itself.
+ACCEPT = "application/msgpack, application/json;q=0.9" if msgpack else "application/json"
+
+
+def loads(data: Union[bytes, bytearray, memoryview, str]) -> Any:
+    """Decode JSON with orjson when available, falling back to the stdlib."""
+    if orjson is not None:
+        return orjson.loads(data)
+    if isinstance(data, memoryview):
+        # The stdlib only reads str, bytes and bytearray
+        data = data.tobytes()
+    return json.loads(data)
+
+
+def dumps(data: Any) -> bytes:
+    """Encode JSON with orjson when available, falling back to the stdlib."""
+    if orjson is not None:
+        try:
+            return orjson.dumps(data)
+        except TypeError:
+            # Integers wider than 64 bits, which the stdlib can still write
+            pass
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def decode(content_type: str, body: bytes) -> Any:
+    """Decode an API response body according to its Content-Type."""
+    if msgpack is not None and content_type.startswith("application/msgpack"):
+        return msgpack.unpackb(body, raw=False)
+    return loads(body)
@@ -0,0 +1,98 @@
+import time
+from typing import TYPE_CHECKING, Iterable, List, Optional
+
+import requests
+
+if TYPE_CHECKING:
+    from .client import SurferClient
+
+
+class ExportJob:
+    """Handle to an export running in the Surfer Desktop app.
+
+    Returned by `SurferClient.start_export()`. The export keeps running in the
+    desktop app while the handle is polled, so no request is held open.
+    """
+
+    def __init__(self, client: "SurferClient", platform_id: str, run_id: str, last_status: Optional[dict] = None):
+        self.client = client
+        self.platform_id = platform_id
+        self.run_id = run_id
+        self.last_status = last_status or {}
+
+    def __repr__(self) -> str:
+        return f"ExportJob(platform_id={self.platform_id!r}, run_id={self.run_id!r}, status={self.last_status.get('status')!r})"
+
+    def status(self) -> dict:
+        """Fetch the current status of the export.
+
+        Raises:
+            ConnectionError: If connection to desktop app fails
+            ValueError: If the run no longer exists
+        """
+        try:
+            response = self.client.session.get(f"{self.client.base_url}/export/{self.run_id}")
+            self.client._raise_for_status(response)
+            self.last_status = response.json()
+            return self.last_status
+        except requests.exceptions.RequestException as e:
+            raise ConnectionError(f"Failed to get export status: {str(e)}") from e
+
+    @property
+    def progress(self) -> dict:
+        """Progress counters from the most recent status: steps, bytes written and elapsed time."""
+        return self.last_status.get('progress', {})
+
+    def done(self) -> bool:
+        """Whether the export has finished, successfully or not."""
+        return bool(self.status().get('done'))
+
+    def wait(self, timeout: Optional[float] = None, poll_interval: float = 1.0) -> dict:
+        """Block until the export finishes and return its final status.
+
+        Raises:
+            TimeoutError: If the export is still running after `timeout` seconds
+            ValueError: If the export failed or was cancelled
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not self.done():
+            if deadline is not None and time.monotonic() >= deadline:
+                raise TimeoutError(f"Export {self.run_id} still running after {timeout} seconds")
+            time.sleep(poll_interval)
+
+        if self.last_status.get('status') != 'success':
+            raise ValueError(f"Export {self.run_id} finished with status '{self.last_status.get('status')}'")
+        return self.last_status
+
+    def cancel(self):
+        """Ask the desktop app to stop the export.
+
+        Raises:
+            ConnectionError: If connection to desktop app fails
+        """
+        try:
+            response = self.client.session.post(f"{self.client.base_url}/export/{self.run_id}/cancel")
+            self.client._raise_for_status(response)
+        except requests.exceptions.RequestException as e:
+            raise ConnectionError(f"Failed to cancel export: {str(e)}") from e
+
+
+def wait_all(jobs: Iterable[ExportJob], timeout: Optional[float] = None, poll_interval: float = 1.0) -> List[dict]:
+    """Wait for several export jobs and return their final statuses in order.
+
+    All jobs share a single deadline. A job that failed or was cancelled is
+    reported through its status instead of raising.
+
+    Raises:
+        TimeoutError: If any export is still running after `timeout` seconds
+    """
+    jobs = list(jobs)
+    deadline = None if timeout is None else time.monotonic() + timeout
+    pending = list(jobs)
+    while True:
+        pending = [job for job in pending if not job.done()]
+        if not pending:
+            return [job.last_status for job in jobs]
+        if deadline is not None and time.monotonic() >= deadline:
+            raise TimeoutError(f"{len(pending)} exports still running after {timeout} seconds")
+        time.sleep(poll_interval)
@@ -0,0 +1,305 @@
+import glob
+import mmap
+import os
+import re
+import sys
+from typing import Iterator, List, Optional, Tuple
+
+from .encoding import loads
+
+# A JSON string, or a bracket outside of one
+_TOKEN = re.compile(rb'"[^"\\]*(?:\\.[^"\\]*)*"|[\[\]{}]')
+# Everything up to and including the next bracket outside of a string. Strings
+# are skipped inside the regex engine, so finding where a record ends costs
+# one match per bracket rather than one per token
+_NEXT_BRACKET = re.compile(rb'(?:[^"\[\]{}]|"[^"\\]*(?:\\.[^"\\]*)*")*[\[\]{}]')
+# A whole JSON string, and a number or literal up to what ends it
+_STRING = re.compile(rb'"[^"\\]*(?:\\.[^"\\]*)*"')
+_SCALAR = re.compile(rb'[^,\]\s]+')
+_SPACE = re.compile(rb'\s*')
+_OPEN = (ord("{"), ord("["))
+_QUOTE = ord('"')
+_END = ord("]")
+_COMMA = ord(",")
+
+# Written by the desktop app to a run's export folder once the run succeeded
+RUN_COMPLETE_FILE = ".surfer-complete"
+
+
+def default_data_dir() -> str:
+    """The Surfer Desktop app's data folder on this machine.
+
+    `SURFER_DATA_DIR` overrides it, for example when the app runs under
+    another user or from a development build.
+    """
+    if os.environ.get("SURFER_DATA_DIR"):
+        return os.environ["SURFER_DATA_DIR"]
+    if sys.platform == "darwin":
+        base = os.path.expanduser("~/Library/Application Support")
+    elif sys.platform == "win32":
+        base = os.environ.get("APPDATA") or os.path.expanduser("~/AppData/Roaming")
+    else:
+        base = os.environ.get("XDG_CONFIG_HOME") or os.path.expanduser("~/.config")
+    return os.path.join(base, "Surfer")
+
+
+def find_export_file(run_dir: str) -> Optional[str]:
+    """The run's export file, the same one the desktop app's `/api/get` serves."""
+    try:
+        names = sorted(os.listdir(run_dir))
+    except OSError:
+        return None
+    for name in names:
+        if name.endswith(".json"):
+            return os.path.join(run_dir, name)
+    return None
+
+
+def is_marked_complete(run_dir: str) -> bool:
+    """Whether the desktop app marked the run as successful."""
+    return os.path.exists(os.path.join(run_dir, RUN_COMPLETE_FILE))
+
+
+def _run_timestamp(run_dir: str) -> int:
+    # Run folders are named <platform ID>-<start time in ms>
+    suffix = os.path.basename(run_dir).rsplit("-", 1)[-1]
+    return int(suffix) if suffix.isdigit() else -1
+
+
+class LocalExport:
+    """A memory-mapped export file from one run.
+
+    `load()` decodes the whole document straight from the mapping. `records()`
+    finds record boundaries with a byte scan and decodes one record at a
+    time, so only the current record is ever materialized. Use it as a
+    context manager, or call `close()`, to release the mapping.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.run_id = os.path.basename(os.path.dirname(path))
+        self._file = open(path, "rb")
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # Empty files can't be mapped
+            self._file.close()
+            raise ValueError(f"Export file is empty: {path}")
+        self._content: Optional[Tuple[int, int]] = None
+
+    def __enter__(self) -> "LocalExport":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __repr__(self) -> str:
+        return f"LocalExport(path={self.path!r})"
+
+    def is_complete(self) -> bool:
+        """Whether the file ends like a whole JSON document, not one still being written."""
+        tail = self._map[max(0, len(self._map) - 64):].rstrip()
+        return self._map[:1] == b"{" and tail.endswith(b"}")
+
+    def load(self) -> dict:
+        """Decode the whole export document."""
+        # Release the view before returning, or the mapping can't be closed
+        with memoryview(self._map) as view:
+            return loads(view)
+
+    def header(self) -> dict:
+        """The export's metadata (company, name, runID, ...) without its records."""
+        key_start, items_start = self._content_start()
+        content_end = self._closing(items_start - 1)
+        return loads(self._map[:key_start] + b'"content":[]' + self._map[content_end:])
+
+    def spans(self) -> Iterator[Tuple[int, int]]:
+        """Byte offsets (start, end) of each value in the `content` list, records or not."""
+        _, position = self._content_start()
+        size = len(self._map)
+        while True:
+            position = _SPACE.match(self._map, position).end()
+            if position >= size or self._map[position] == _END:
+                return
+            token = self._map[position]
+            if token in _OPEN:
+                end = self._closing(position)
+            else:
+                match = (_STRING if token == _QUOTE else _SCALAR).match(self._map, position)
+                if match is None:
+                    raise ValueError(f"Malformed value at byte {position} of {self.path}")
+                end = match.end()
+            yield position, end
+            position = _SPACE.match(self._map, end).end()
+            if position < size and self._map[position] == _COMMA:
+                position += 1
+
+    def records(self) -> Iterator[dict]:
+        """Decode the values of the `content` list lazily, one at a time."""
+        for start, end in self.spans():
+            yield loads(self._map[start:end])
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+    def _closing(self, start: int) -> int:
+        """The offset just past the bracket closing the one at `start`."""
+        depth = 0
+        position = start
+        while True:
+            match = _NEXT_BRACKET.match(self._map, position)
+            if match is None:
+                raise ValueError(f"Unbalanced brackets in {self.path}")
+            position = match.end()
+            depth += 1 if self._map[position - 1] in _OPEN else -1
+            if depth == 0:
+                return position
+
+    def _content_start(self) -> Tuple[int, int]:
+        """Where the top level "content" key starts, and where its list's items start."""
+        if self._content is not None:
+            return self._content
+
+        # Walk the keys and values of the top level object, skipping nested values whole
+        position = self._map.find(b"{") + 1
+        key_start = None
+        while position:
+            match = _TOKEN.search(self._map, position)
+            if match is None:
+                break
+            token = self._map[match.start()]
+            if token == _QUOTE:
+                position = match.end()
+                is_key = self._map[position:position + 8].lstrip().startswith(b":")
+                key_start = match.start() if is_key and match.group() == b'"content"' else None
+            elif token in _OPEN:
+                if key_start is not None and token == ord("["):
+                    self._content = (key_start, match.end())
+                    return self._content
+                position = self._closing(match.start())
+                key_start = None
+            else:
+                # The end of the top level object
+                break
+
+        raise ValueError(f"No 'content' list found in {self.path}")
+
+
+class LocalSurferReader:
+    """Read exports straight from the desktop app's data folder on this machine.
+
+    Skips the HTTP API entirely: the most recent complete run of a platform
+    is found under `exported_data/<company>/<name>/<run ID>`, memory-mapped
+    and decoded directly, with orjson when it is installed
+    (`pip install surfer-protocol[speedups]`). The desktop app doesn't need
+    to be running.
+
+    Usage:
+        reader = LocalSurferReader()
+        data = reader.get("imessage-001")
+        for message in reader.iter_records("imessage-001"):
+            ...
+    """
+
+    def __init__(self, data_dir: Optional[str] = None):
+        """
+        Args:
+            data_dir: The desktop app's data folder. Defaults to the app's
+                standard location for this OS, or `SURFER_DATA_DIR` when set.
+        """
+        self.data_dir = os.path.expanduser(data_dir or default_data_dir())
+        self.exports_dir = os.path.join(self.data_dir, "exported_data")
+
+    def runs(self, platform_id: str) -> List[str]:
+        """Folders of a platform's runs that have an export file, most recent first."""
+        pattern = os.path.join(glob.escape(self.exports_dir), "*", "*", f"{glob.escape(platform_id)}-*")
+        run_dirs = [
+            path for path in glob.glob(pattern)
+            if os.path.isdir(path) and find_export_file(path)
+        ]
+        return sorted(run_dirs, key=_run_timestamp, reverse=True)
+
+    def open(self, platform_id: str) -> LocalExport:
+        """Memory-map the export of the most recent successful run of a platform.
+
+        The desktop app marks a run's folder once the run has succeeded, so
+        runs that failed, were stopped or are still being written are
+        skipped. Data exported by app versions that didn't mark runs is only
+        used when none of the platform's runs are marked, and then only runs
+        whose export file is complete.
+
+        Raises:
+            ValueError: If no complete export is found for the platform
+        """
+        run_dirs = self.runs(platform_id)
+        marked = [run_dir for run_dir in run_dirs if is_marked_complete(run_dir)]
+        for run_dir in marked or run_dirs:
+            try:
+                export = LocalExport(find_export_file(run_dir))
+            except (OSError, ValueError):
+                continue
+            if export.is_complete():
+                return export
+            export.close()
+        raise ValueError(f"No exported data found for {platform_id} in {self.exports_dir}")
+
+    def chain(self, export: LocalExport) -> List[LocalExport]:
+        """An export followed by those of the runs it builds on.
+
+        Incremental runs only export the records added since the run named
+        in their header's `previous_run`, so all of them together make up the
+        run's data. The exports after the first are opened here, and closed
+        along with it by the caller.
+
+        Raises:
+            ValueError: If the export of a run in the chain is missing
+        """
+        chain = [export]
+        try:
+            previous = export.header().get("previous_run")
+            while previous:
+                run_dir = os.path.join(os.path.dirname(os.path.dirname(chain[-1].path)), previous)
+                path = find_export_file(run_dir)
+                if path is None:
+                    raise ValueError(f"{chain[-1].run_id} builds on run {previous}, whose export is missing")
+                chain.append(LocalExport(path))
+                previous = chain[-1].header().get("previous_run")
+        except BaseException:
+            for opened in chain[1:]:
+                opened.close()
+            raise
+        return chain
+
+    def get(self, platform_id: str) -> dict:
+        """Get the most recent run for a platform, in the same shape as `SurferClient.get()`.
+
+        Raises:
+            ValueError: If no complete export is found for the platform
+        """
+        with self.open(platform_id) as export:
+            chain = self.chain(export)
+            try:
+                data = export.load()
+                data.pop("previous_run", None)
+                for previous in chain[1:]:
+                    data["content"].extend(previous.load()["content"])
+            finally:
+                for previous in chain[1:]:
+                    previous.close()
+            return {"success": True, "data": data}
+
+    def iter_records(self, platform_id: str) -> Iterator[dict]:
+        """Yield the records of the most recent run one at a time, decoding each only when reached.
+
+        Raises:
+            ValueError: If no complete export is found for the platform
+        """
+        with self.open(platform_id) as export:
+            chain = self.chain(export)
+            try:
+                for part in chain:
+                    yield from part.records()
+            finally:
+                for previous in chain[1:]:
+                    previous.close()
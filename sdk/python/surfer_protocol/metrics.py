@@ -0,0 +1,203 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection
+from urllib3.connectionpool import HTTPConnectionPool
+
+# Upper bounds, in seconds, of the latency histogram buckets
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+PHASES = ("connect", "ttfb", "transfer", "decode", "total")
+
+
+class CallMetrics:
+    """Timings of one `SurferClient` call, passed to every metrics hook when it finishes.
+
+    Times are in seconds, and None for phases the call didn't go through:
+    - `connect`: opening a new connection to the desktop app, 0 when a pooled one was reused
+    - `ttfb`: from sending the request to receiving the response headers, including `connect`
+    - `transfer`: reading the response body. For streamed calls this includes
+      the time the caller spends between records
+    - `decode`: turning the body, or a cached copy, into Python objects
+    - `total`: the whole call
+
+    `bytes` is the size of the response body and `wire_bytes` what was read
+    from the socket, smaller when the response was compressed. `cache` is
+    "hit" when a cached response was served without asking the desktop app
+    and "not_modified" when the app confirmed the cached copy is current.
+    `error` is the exception the call raised, if any.
+    """
+
+    def __init__(self, call: str, platform_id: Optional[str] = None):
+        self.call = call
+        self.platform_id = platform_id
+        self.status: Optional[int] = None
+        self.connect: Optional[float] = None
+        self.ttfb: Optional[float] = None
+        self.transfer: Optional[float] = None
+        self.decode: Optional[float] = None
+        self.total: Optional[float] = None
+        self.bytes = 0
+        self.wire_bytes: Optional[int] = None
+        self.cache: Optional[str] = None
+        self.error: Optional[BaseException] = None
+        self._start = time.perf_counter()
+        self._headers_at: Optional[float] = None
+
+    def __repr__(self) -> str:
+        phases = ", ".join(f"{name}={getattr(self, name):.4f}" for name in PHASES if getattr(self, name) is not None)
+        return f"CallMetrics(call={self.call!r}, platform_id={self.platform_id!r}, status={self.status}, bytes={self.bytes}, {phases})"
+
+    def headers_received(self, status: int, connect: float):
+        self._headers_at = time.perf_counter()
+        self.status = status
+        self.connect = connect
+        self.ttfb = self._headers_at - self._start
+
+    def body_received(self, size: int, wire_bytes: Optional[int] = None):
+        self.transfer = time.perf_counter() - (self._headers_at or self._start)
+        self.bytes = size
+        self.wire_bytes = wire_bytes
+
+    @contextmanager
+    def decoding(self):
+        """Add the time spent in the block to `decode`, recording any error it raises."""
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception as e:
+            self.error = e
+            raise
+        finally:
+            self.decode = (self.decode or 0.0) + time.perf_counter() - start
+
+    def finish(self):
+        self.total = time.perf_counter() - self._start
+
+
+class Histogram:
+    """Counts of observed values per bucket, plus their count, sum, min and max."""
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        # One count per bucket, plus one for values above the largest bound
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.min: Optional[float] = None
+        self.max: Optional[float] = None
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def to_dict(self) -> dict:
+        """Cumulative bucket counts keyed by upper bound, Prometheus style."""
+        cumulative = 0
+        buckets = {}
+        for bound, count in zip(list(self.buckets) + [float("inf")], self.counts):
+            cumulative += count
+            buckets[bound] = cumulative
+        return {"count": self.count, "sum": self.sum, "min": self.min, "max": self.max, "buckets": buckets}
+
+
+class MetricsAggregator:
+    """Metrics hook that keeps counters and latency histograms per call and platform.
+
+    Pass it to `SurferClient(metrics_hooks=[aggregator])`, then read
+    `snapshot()` whenever metrics are exported. Safe to share between
+    clients and threads.
+    """
+
+    COUNTERS = ("calls", "errors", "bytes", "wire_bytes", "cache_hits", "not_modified")
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self._series: Dict[Tuple[str, Optional[str]], dict] = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, metrics: CallMetrics):
+        with self._lock:
+            key = (metrics.call, metrics.platform_id)
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = {
+                    "counters": dict.fromkeys(self.COUNTERS, 0),
+                    "histograms": {phase: Histogram(self.buckets) for phase in PHASES},
+                }
+
+            counters = series["counters"]
+            counters["calls"] += 1
+            counters["errors"] += metrics.error is not None
+            counters["bytes"] += metrics.bytes
+            counters["wire_bytes"] += metrics.wire_bytes or 0
+            counters["cache_hits"] += metrics.cache == "hit"
+            counters["not_modified"] += metrics.cache == "not_modified"
+            for phase in PHASES:
+                value = getattr(metrics, phase)
+                if value is not None:
+                    series["histograms"][phase].observe(value)
+
+    def snapshot(self) -> List[dict]:
+        """One entry per call and platform, with its counters and a histogram per phase."""
+        with self._lock:
+            return [
+                {
+                    "call": call,
+                    "platform_id": platform_id,
+                    **series["counters"],
+                    **{phase: histogram.to_dict() for phase, histogram in series["histograms"].items()},
+                }
+                for (call, platform_id), series in self._series.items()
+            ]
+
+    def reset(self):
+        with self._lock:
+            self._series.clear()
+
+
+MetricsHook = Callable[[CallMetrics], None]
+
+
+# Time spent opening connections on this thread since the last reset. Requests
+# doesn't report it, so the connection class used by the client records it
+_connect_time = threading.local()
+
+
+def reset_connect_time():
+    _connect_time.seconds = 0.0
+
+
+def connect_time() -> float:
+    return getattr(_connect_time, "seconds", 0.0)
+
+
+class _TimedHTTPConnection(HTTPConnection):
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            super().connect()
+        finally:
+            _connect_time.seconds = connect_time() + time.perf_counter() - start
+
+
+class _TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _TimedHTTPConnection
+
+
+class TimedHTTPAdapter(HTTPAdapter):
+    """HTTP adapter whose connections record how long they took to open."""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            **self.poolmanager.pool_classes_by_scheme,
+            "http": _TimedHTTPConnectionPool,
+        }
@@ -0,0 +1,271 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+from typing import TYPE_CHECKING, Any, Iterable, List, Optional, Union
+
+if TYPE_CHECKING:
+    from .client import SurferClient
+
+# Fields that identify or date a record rather than hold its text
+NON_TEXT_FIELDS = {"id", "timestamp", "date", "created_at", "updated_at", "added_to_db", "url", "link", "is_from_me"}
+# Fields exporters set to the time of each export, not part of a record's identity
+VOLATILE_FIELDS = {"added_to_db"}
+
+SCHEMA = """
+PRAGMA journal_mode = WAL;
+CREATE TABLE IF NOT EXISTS records (
+    rowid INTEGER PRIMARY KEY,
+    platform_id TEXT NOT NULL,
+    record_id TEXT NOT NULL,
+    timestamp REAL,
+    text TEXT NOT NULL,
+    data TEXT NOT NULL,
+    UNIQUE (platform_id, record_id)
+);
+CREATE INDEX IF NOT EXISTS records_timestamp ON records (platform_id, timestamp);
+CREATE VIRTUAL TABLE IF NOT EXISTS records_fts USING fts5(
+    text, content='records', content_rowid='rowid', tokenize='porter unicode61'
+);
+CREATE TRIGGER IF NOT EXISTS records_ai AFTER INSERT ON records BEGIN
+    INSERT INTO records_fts (rowid, text) VALUES (new.rowid, new.text);
+END;
+CREATE TRIGGER IF NOT EXISTS records_ad AFTER DELETE ON records BEGIN
+    INSERT INTO records_fts (records_fts, rowid, text) VALUES ('delete', old.rowid, old.text);
+END;
+CREATE TRIGGER IF NOT EXISTS records_au AFTER UPDATE ON records BEGIN
+    INSERT INTO records_fts (records_fts, rowid, text) VALUES ('delete', old.rowid, old.text);
+    INSERT INTO records_fts (rowid, text) VALUES (new.rowid, new.text);
+END;
+CREATE TABLE IF NOT EXISTS cursors (
+    platform_id TEXT PRIMARY KEY,
+    cursor TEXT,
+    updated_at REAL NOT NULL
+);
+"""
+
+
+def record_text(value: Any, key: Optional[str] = None) -> str:
+    """All the searchable text in a record, including nested messages and lists."""
+    if key in NON_TEXT_FIELDS:
+        return ""
+    if isinstance(value, str):
+        return value
+    if isinstance(value, dict):
+        return "\n".join(filter(None, (record_text(item, field) for field, item in value.items())))
+    if isinstance(value, list):
+        return "\n".join(filter(None, (record_text(item) for item in value)))
+    return ""
+
+
+def record_id(record: dict) -> str:
+    """The record's own ID, or a hash of its content when it has none.
+
+    Like recordKey in the desktop app, the hash leaves out `added_to_db`,
+    which exporters set to the time of each export, so a re-exported record
+    keeps its ID.
+    """
+    if record.get("id") is not None:
+        return str(record["id"])
+    stable = {key: value for key, value in record.items() if key not in VOLATILE_FIELDS}
+    return hashlib.sha256(json.dumps(stable, sort_keys=True, default=str).encode("utf-8")).hexdigest()[:32]
+
+
+def to_epoch(value: Any) -> Optional[float]:
+    """Seconds since the Unix epoch from an ISO 8601 string, epoch seconds or milliseconds, or a datetime."""
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, datetime):
+        return value.timestamp()
+    if isinstance(value, (int, float)):
+        # Exports with --timestamps=epoch use milliseconds
+        return value / 1000 if value > 1e11 else float(value)
+    if isinstance(value, str):
+        try:
+            parsed = datetime.fromisoformat(value.strip().replace("Z", "+00:00"))
+        except ValueError:
+            return None
+        if parsed.tzinfo is None:
+            # Exports without an offset are in local time
+            return parsed.timestamp()
+        return parsed.astimezone(timezone.utc).timestamp()
+    return None
+
+
+def parse_since(since: Union[datetime, float, str, None]) -> Optional[float]:
+    """`to_epoch()` for a `since` filter, which has to be a date when given.
+
+    Raises:
+        ValueError: If `since` can't be read as a date
+    """
+    if since is None:
+        return None
+    epoch = to_epoch(since)
+    if epoch is None:
+        raise ValueError(f"since must be a datetime, ISO 8601 string or epoch time, got {since!r}")
+    return epoch
+
+
+def match_expression(query: str) -> str:
+    """An FTS5 query matching records that contain every word, however it is punctuated."""
+    return " ".join('"' + word.replace('"', '""') + '"' for word in query.split())
+
+
+class SearchIndex:
+    """Local SQLite FTS5 index of exported records, kept current with `get_since()`.
+
+    Each platform is indexed by pulling only the records added since the
+    last update, so after the first sync a refresh costs one small request
+    and searches never download an export.
+    """
+
+    def __init__(self, path: str = "~/.surfer/search.db", refresh_interval: float = 60):
+        """
+        Args:
+            path: SQLite file the index is stored in
+            refresh_interval: Seconds after an update during which `search()`
+                doesn't ask the desktop app for new records again
+        """
+        self.path = os.path.expanduser(path)
+        self.refresh_interval = refresh_interval
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        try:
+            self.conn.executescript(SCHEMA)
+        except sqlite3.OperationalError as e:
+            self.conn.close()
+            raise RuntimeError(f"SearchIndex needs SQLite with the FTS5 extension: {str(e)}") from e
+
+    def add(self, platform_id: str, records: Iterable[dict]) -> int:
+        """Index records, replacing earlier versions of the same records. Returns how many were indexed."""
+        rows = (
+            (
+                platform_id,
+                record_id(record),
+                to_epoch(record.get("timestamp")),
+                record_text(record),
+                json.dumps(record, ensure_ascii=False, default=str),
+            )
+            for record in records
+        )
+        with self._lock, self.conn:
+            cursor = self.conn.executemany(
+                """
+                INSERT INTO records (platform_id, record_id, timestamp, text, data) VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (platform_id, record_id) DO UPDATE SET
+                    timestamp = excluded.timestamp, text = excluded.text, data = excluded.data
+                WHERE records.data != excluded.data
+                """,
+                rows,
+            )
+            # Unchanged records are skipped by the WHERE clause and not counted
+            return cursor.rowcount
+
+    def cursor(self, platform_id: str) -> Optional[dict]:
+        """The saved `get_since()` cursor of a platform and when it was saved, or None."""
+        with self._lock:
+            row = self.conn.execute("SELECT cursor, updated_at FROM cursors WHERE platform_id = ?", (platform_id,)).fetchone()
+        return {"cursor": json.loads(row[0]) if row[0] else None, "updated_at": row[1]} if row else None
+
+    def platforms(self) -> List[str]:
+        """Platforms that have been indexed."""
+        with self._lock:
+            return [row[0] for row in self.conn.execute("SELECT platform_id FROM cursors ORDER BY platform_id")]
+
+    def update(self, client: "SurferClient", platform_id: str) -> int:
+        """Index the records added to a platform since its last update. Returns how many were new or changed.
+
+        Raises:
+            ConnectionError: If connection to desktop app fails
+            ValueError: If no successful runs are found for the platform
+        """
+        state = self.cursor(platform_id)
+        response = client.get_since(platform_id, state["cursor"] if state else None)
+        count = self.add(platform_id, response["data"].get("content") or [])
+        with self._lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO cursors (platform_id, cursor, updated_at) VALUES (?, ?, ?)",
+                (platform_id, json.dumps(response.get("cursor")), time.time()),
+            )
+        return count
+
+    def is_fresh(self, platform_id: str) -> bool:
+        state = self.cursor(platform_id)
+        return bool(state) and time.time() - state["updated_at"] < self.refresh_interval
+
+    def search(
+        self,
+        query: str,
+        platforms: Optional[Iterable[str]] = None,
+        since: Union[datetime, float, str, None] = None,
+        limit: int = 20,
+        raw: bool = False,
+    ) -> List[dict]:
+        """Ranked records matching a query, best first.
+
+        Every word must appear in a record for it to match. With `raw`, the
+        query is passed to FTS5 as is, for phrases, prefixes (`draft*`) and
+        `OR`/`NOT`. `since` keeps records dated at or after a datetime, ISO
+        string or epoch time.
+
+        Raises:
+            ValueError: If `since` can't be read as a date
+        """
+        since_epoch = parse_since(since)
+
+        expression = query if raw else match_expression(query)
+        if not expression:
+            return []
+
+        sql = """
+            SELECT records.platform_id, records.record_id, records.timestamp, records.data,
+                   bm25(records_fts) AS rank,
+                   snippet(records_fts, 0, '[', ']', '…', 12)
+            FROM records_fts
+            JOIN records ON records.rowid = records_fts.rowid
+            WHERE records_fts MATCH ?
+        """
+        params: list = [expression]
+        if platforms is not None:
+            platforms = list(platforms)
+            sql += f" AND records.platform_id IN ({','.join('?' * len(platforms))})"
+            params.extend(platforms)
+        if since_epoch is not None:
+            sql += " AND records.timestamp >= ?"
+            params.append(since_epoch)
+        sql += " ORDER BY rank LIMIT ?"
+        params.append(limit)
+
+        with self._lock:
+            rows = self.conn.execute(sql, params).fetchall()
+        return [
+            {
+                "platform_id": platform_id,
+                "record_id": record_id,
+                # bm25() is lower for better matches, flip it so higher is better
+                "score": -rank,
+                "timestamp": timestamp,
+                "snippet": snippet,
+                "record": json.loads(data),
+            }
+            for platform_id, record_id, timestamp, data, rank, snippet in rows
+        ]
+
+    def clear(self, platform_id: Optional[str] = None):
+        """Remove a platform from the index, or everything when no platform is given."""
+        with self._lock, self.conn:
+            if platform_id is None:
+                self.conn.execute("DELETE FROM records")
+                self.conn.execute("DELETE FROM cursors")
+            else:
+                self.conn.execute("DELETE FROM records WHERE platform_id = ?", (platform_id,))
+                self.conn.execute("DELETE FROM cursors WHERE platform_id = ?", (platform_id,))
+
+    def close(self):
+        self.conn.close()
@@ -0,0 +1,213 @@
+import glob
+import json
+import os
+from typing import Iterable, List, Optional
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+
+# Schema metadata key holding the run and ETag a Parquet copy was made from
+METADATA_KEY = b"surfer"
+
+
+def require_pyarrow():
+    if pa is None:
+        raise ImportError("get_table() requires pyarrow. Install it with: pip install surfer-protocol[table]")
+
+
+def parquet_path(platform_id: str, table_dir: str) -> str:
+    """Where the Parquet copy of a platform's most recent run lives."""
+    return os.path.join(os.path.expanduser(table_dir), f"{platform_id}.parquet")
+
+
+def source_of(path: str) -> Optional[dict]:
+    """The `run_id` and `etag` a Parquet copy was made from, or None if there is no usable copy."""
+    try:
+        metadata = pq.read_schema(path).metadata or {}
+    except (OSError, pa.ArrowInvalid):
+        return None
+    try:
+        return json.loads(metadata[METADATA_KEY])
+    except (KeyError, ValueError):
+        return None
+
+
+def write_parquet(records: Iterable[dict], path: str, source: Optional[dict] = None, batch_size: int = 10000):
+    """Write records to a Parquet file one row group per batch.
+
+    Nested values are stored as JSON strings. Column types are inferred from
+    every batch: a column first seen in a later batch is added, and one whose
+    values stop fitting its type is widened, to float64 for mixed numbers and
+    to strings otherwise. Rows already written are then rewritten with the
+    new schema, so no column or value is dropped. `source` is stored in the
+    file's metadata, see `source_of()`.
+    """
+    require_pyarrow()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    metadata = {METADATA_KEY: json.dumps(source or {}).encode("utf-8")}
+
+    writer = None
+    schema = None
+    try:
+        for batch in _batches(records, batch_size):
+            merged = _merge_schemas(schema, _infer_schema(batch)).with_metadata(metadata)
+            if writer is None:
+                writer = pq.ParquetWriter(tmp_path, merged)
+            elif not merged.equals(schema):
+                writer.close()
+                writer = None
+                writer = _rewrite(tmp_path, merged)
+            schema = merged
+            writer.write_table(_to_table(batch, schema))
+    except BaseException:
+        if writer is not None:
+            writer.close()
+        for leftover in (tmp_path, tmp_path + ".rewrite"):
+            if os.path.exists(leftover):
+                os.remove(leftover)
+        raise
+    if writer is not None:
+        writer.close()
+
+    if schema is None:
+        # Empty export, still leave a readable file behind
+        pq.write_table(pa.table({}).replace_schema_metadata(metadata), tmp_path)
+    os.replace(tmp_path, path)
+
+    # Copies from older versions were named after the run
+    for stale in glob.glob(glob.escape(path[:-len(".parquet")]) + "-*.parquet"):
+        os.remove(stale)
+
+
+def read_parquet(path: str, columns: Optional[List[str]] = None):
+    """Read a Parquet copy, decoding only the requested columns."""
+    require_pyarrow()
+    return pq.read_table(path, columns=columns)
+
+
+def _rewrite(path: str, schema):
+    """Rewrite the rows written to `path` so far with a wider schema.
+
+    Parquet files can't be appended to once closed, so the rows go to a new
+    file, returned open for the next batches, that replaces `path` when closed.
+    """
+    rewritten_path = path + ".rewrite"
+    writer = pq.ParquetWriter(rewritten_path, schema)
+    for batch in pq.ParquetFile(path).iter_batches():
+        columns = [
+            batch.column(field.name).cast(field.type) if field.name in batch.schema.names
+            else pa.nulls(batch.num_rows, field.type)
+            for field in schema
+        ]
+        writer.write_table(pa.Table.from_arrays(columns, schema=schema))
+    return _Renaming(writer, rewritten_path, path)
+
+
+class _Renaming:
+    """A ParquetWriter whose file replaces `target` once closed."""
+
+    def __init__(self, writer, path: str, target: str):
+        self._writer = writer
+        self._path = path
+        self._target = target
+
+    def write_table(self, table):
+        self._writer.write_table(table)
+
+    def close(self):
+        self._writer.close()
+        os.replace(self._path, self._target)
+
+
+def _batches(records: Iterable[dict], batch_size: int):
+    batch = []
+    for record in records:
+        batch.append(_flatten(record))
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _flatten(record: dict) -> dict:
+    return {
+        key: json.dumps(value, ensure_ascii=False) if isinstance(value, (dict, list)) else value
+        for key, value in record.items()
+    }
+
+
+def _column_type(values: list):
+    try:
+        arrow_type = pa.array(values).type
+    except (pa.ArrowInvalid, pa.ArrowTypeError, OverflowError):
+        # Mixed types within the batch
+        return pa.string()
+    # Columns that are all null so far are most often text
+    return pa.string() if pa.types.is_null(arrow_type) else arrow_type
+
+
+def _infer_schema(batch: List[dict]):
+    """The type of every field of every record in a batch, in order of first appearance."""
+    names = {}
+    for record in batch:
+        names.update(dict.fromkeys(record))
+    return pa.schema([
+        pa.field(name, _column_type([record.get(name) for record in batch]))
+        for name in names
+    ])
+
+
+def _merge_types(current, new):
+    if current.equals(new):
+        return current
+    if _is_number(current) and _is_number(new):
+        return pa.float64()
+    return pa.string()
+
+
+def _is_number(arrow_type) -> bool:
+    return pa.types.is_integer(arrow_type) or pa.types.is_floating(arrow_type)
+
+
+def _merge_schemas(current, new):
+    if current is None:
+        return new
+    fields = [
+        pa.field(field.name, _merge_types(field.type, new.field(field.name).type))
+        if field.name in new.names else field
+        for field in current
+    ]
+    fields.extend(field for field in new if field.name not in current.names)
+    return pa.schema(fields)
+
+
+def _to_table(batch: List[dict], schema):
+    columns = []
+    for field in schema:
+        values = [record.get(field.name) for record in batch]
+        try:
+            columns.append(pa.array(values, type=field.type))
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            columns.append(pa.array([_coerce(value, field.type) for value in values], type=field.type))
+    return pa.Table.from_arrays(columns, schema=schema)
+
+
+def _coerce(value, arrow_type):
+    """A value converted to a widened column's type."""
+    if value is None:
+        return None
+    if pa.types.is_string(arrow_type):
+        if isinstance(value, str):
+            return value
+        if isinstance(value, bool):
+            # The same text a cast of the rows already written gives
+            return "true" if value else "false"
+        return str(value)
+    return float(value)